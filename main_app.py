@@ -8,32 +8,19 @@ import smtplib
 from email.mime.text import MIMEText
 
 # Import services
-from services.database_service import init_db
-from services.billing_service import init_invoice_db
+from services.bootstrap import bootstrap_databases
 from services.auth_service import verify_user, add_user, get_user_role 
 
 # Import utility functions
 from utils.session_manager import load_session_state_manual, save_session_state_manual
 from utils.styles import apply_custom_styles
 
-# Import page functions
-from pages.dashboard_page import show_dashboard_page
-from pages.quick_drug_search_page import show_quick_drug_search_page
-from pages.add_drug_page import show_add_drug_page
-from pages.add_diagnostic_page import show_add_diagnostic_page
-from pages.delete_record_page import show_delete_record_page
-from pages.patient_summary_page import show_patient_summary_page
-from pages.inventory_insights_page import show_inventory_insights_page
-from pages.custom_report_page import show_custom_report_page
-from pages.natural_language_query_page import show_natural_language_query_page
-from pages.chatbot_page import show_chatbot_page
-from pages.image_analysis_page import show_image_analysis_page
-from pages.billing_invoice_page import show_billing_page
-
-
-# Initialize DB
-init_db()
-init_invoice_db()
+# Page modules are imported lazily through the registry (only the active page is loaded)
+from utils.page_registry import DEFAULT_PAGE, get_sidebar_pages, can_access_page, load_page
+
+
+# Initialize DB (schema setup, seeding and migrations run once per process, not on every rerun)
+bootstrap_databases()
 
 # Streamlit config
 st.set_page_config(page_title="Rajesh's | Pharmacy & Diagnostics SQL Assistant", page_icon="⚕️", layout="wide")
@@ -250,55 +237,10 @@ with st.sidebar:
 
     role = st.session_state.user_role
 
-    # Admin and Doctor can see Dashboard
-    if role in ["Admin", "Doctor"]:
-        if st.button("Dashboard", key="nav_dashboard"):
-            st.session_state.current_page = "dashboard"
-            st.rerun()
-
-    # Admin and Pharmacist roles for drug/inventory related pages
-    if role in ["Admin", "Pharmacist"]:
-        if st.button("Quick Drug Search", key="nav_quick_drug_search"):
-            st.session_state.current_page = "quick_drug_search"
-            st.rerun()
-        if st.button("Add New Drug", key="nav_add_drug"):
-            st.session_state.current_page = "add_drug"
-            st.rerun()
-        if st.button("Inventory Insights", key="nav_inventory_insights"):
-            st.session_state.current_page = "inventory_insights"
-            st.rerun()
-        if st.button("Checkout / Billing"):
-            st.session_state.current_page = "billing"
-            st.rerun()
-
-    # Admin and Doctor roles for diagnostic, patient summary, AI chatbot, image analysis
-    if role in ["Admin", "Doctor"]:
-        if st.button("Add Diagnostic Record", key="nav_add_diagnostic_record"):
-            st.session_state.current_page = "add_diagnostic_record"
-            st.rerun()
-        if st.button("Patient Summary", key="nav_patient_summary"):
-            st.session_state.current_page = "patient_summary"
-            st.rerun()
-        if st.button("AI Chatbot", key="nav_chatbot"):
-            st.session_state.current_page = "chatbot"
-            st.rerun()
-        if st.button("Medical Image Analysis", key="nav_image_analysis"):
-            st.session_state.current_page = "image_analysis"
-            st.rerun()
-        if st.button("Custom Data Report", key="nav_custom_report"):
-            st.session_state.current_page = "custom_report"
-            st.rerun()
-
-    # Admin and Doctor for Delete Record
-    if role in ["Admin", "Doctor"]:
-        if st.button("Delete Record", key="nav_delete_record"):
-            st.session_state.current_page = "delete_record"
-            st.rerun()
-
-    # All roles for Natural Language Query
-    if role in ["Admin", "Pharmacist", "Doctor"]:
-        if st.button("Natural Language Query", key="nav_natural_language_query"):
-            st.session_state.current_page = "natural_language_query"
+    # One button per page the role may open, in registry order
+    for nav_page in get_sidebar_pages(role):
+        if st.button(nav_page["label"], key=f"nav_{nav_page['key']}"):
+            st.session_state.current_page = nav_page["key"]
             st.rerun()
 
     # Logout button, always visible when logged in
@@ -330,33 +272,10 @@ with st.sidebar:
 
 # Render Pages based on current_page session state
 page = st.session_state.current_page
-if page == "dashboard":
-    show_dashboard_page()
-elif page == "quick_drug_search":
-    show_quick_drug_search_page()
-elif page == "add_drug":
-    show_add_drug_page()
-elif page == "add_diagnostic_record":
-    show_add_diagnostic_page()
-elif page == "delete_record":
-    show_delete_record_page()
-elif page == "patient_summary":
-    show_patient_summary_page()
-elif page == "inventory_insights":
-    show_inventory_insights_page()
-elif page == "custom_report":
-    show_custom_report_page()
-# Note: Natural Language Query is only if it's not a sensitive admin feature
-elif page == "natural_language_query":
-    show_natural_language_query_page()
-elif page == "chatbot":
-    show_chatbot_page()
-elif page == "image_analysis":
-    show_image_analysis_page()
-elif page == "billing":
-    show_billing_page()
+if can_access_page(page, st.session_state.user_role):
+    load_page(page)()
 else:
-    # Fallback for unexpected current_page values when logged in
+    # Fallback for unexpected or unauthorized current_page values when logged in
     # This ensures a valid page is always shown after login.
-    st.session_state.current_page = "dashboard"
-    st.rerun() # Rerun to show the dashboard if it was an invalid page
\ No newline at end of file
+    st.session_state.current_page = DEFAULT_PAGE
+    st.rerun() # Rerun to show the dashboard if it was an invalid page
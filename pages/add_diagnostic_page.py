@@ -1,7 +1,7 @@
 # pages/add_diagnostic_page.py
 import streamlit as st
 from datetime import date
-from services.database_service import execute_sql_query, get_all_drugs_for_select # Import from new path
+from services.database_service import run_named_query, get_all_drugs_for_select # Import from new path
 
 def show_add_diagnostic_page():
     st.header("Add New Diagnostic Record")
@@ -22,7 +22,7 @@ def show_add_diagnostic_page():
             options=drug_names_for_select,
             key="form_drug_prescribed_select"
         )
-        drug_id_prescribed = drug_options.get(selected_drug_name_for_prescribed) if selected_drug_name_for_prescribed != "(None - No Drug Prescribed)" else 'NULL'
+        drug_id_prescribed = drug_options.get(selected_drug_name_for_prescribed) if selected_drug_name_for_prescribed != "(None - No Drug Prescribed)" else None
 
 
         submitted_diag = st.form_submit_button("Add Record")
@@ -31,12 +31,15 @@ def show_add_diagnostic_page():
             if not patient_name or not diagnosis:
                 st.error("Patient Name and Diagnosis are required.")
             else:
-                insert_query_diag = f"""
-                INSERT INTO DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE, TEST_RESULTS, DRUG_ID_PRESCRIBED)
-                VALUES ('{patient_name}', '{diagnosis}', '{diagnosis_date.strftime('%Y-%m-%d')}', '{test_results}', {drug_id_prescribed});
-                """
-                status_msg_diag, _ = execute_sql_query(insert_query_diag)
-                if status_msg_diag:
+                status_msg_diag, _ = run_named_query(
+                    "insert_diagnostic",
+                    patient_name=patient_name,
+                    diagnosis=diagnosis,
+                    diagnosis_date=diagnosis_date.strftime('%Y-%m-%d'),
+                    test_results=test_results,
+                    drug_id_prescribed=drug_id_prescribed
+                )
+                if status_msg_diag.startswith("Query executed successfully"):
                     st.success(f"Diagnostic record for '{patient_name}' added successfully!")
                 else:
                     st.error("Failed to add diagnostic record. Please check details and try again.")
@@ -1,7 +1,7 @@
 # pages/add_drug_page.py
 import streamlit as st
 from datetime import date
-from services.database_service import execute_sql_query # Import from new path
+from services.database_service import run_named_query # Import from new path
 
 def show_add_drug_page():
     st.header("Add New Drug to Inventory")
@@ -24,12 +24,19 @@ def show_add_drug_page():
             if not drug_name:
                 st.error("Drug Name is required.")
             else:
-                insert_query = f"""
-                INSERT INTO PHARMACY_INVENTORY (DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, PACK_SIZE, PRICE_PER_PACK, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER)
-                VALUES ('{drug_name}', {'NULL' if not generic_name else f"'{generic_name}'"}, '{formulation}', '{dosage}', '{pack_size}', {price_per_pack}, {stock_quantity}, '{expiry_date.strftime('%Y-%m-%d')}', '{supplier}');
-                """
-                status_msg, _ = execute_sql_query(insert_query)
-                if status_msg:
+                status_msg, _ = run_named_query(
+                    "insert_drug",
+                    drug_name=drug_name,
+                    generic_name=generic_name or None,
+                    formulation=formulation,
+                    dosage=dosage,
+                    pack_size=pack_size,
+                    price_per_pack=price_per_pack,
+                    stock_quantity=int(stock_quantity),
+                    expiry_date=expiry_date.strftime('%Y-%m-%d'),
+                    supplier=supplier
+                )
+                if status_msg.startswith("Query executed successfully"):
                     st.success(f"Drug '{drug_name}' added successfully! You can now query it using natural language.")
                 else:
                     st.error("Failed to add drug. Please check details and try again.")
@@ -1,16 +1,15 @@
 # pages/billing_invoice_page.py
 import streamlit as st
-from services.database_service import execute_sql_query
+from services.query_cache import cached_select
+from services.database_service import NAMED_QUERIES
+from services.checkout_service import checkout, GST_RATE
 import sqlite3
 import os
 from fpdf import FPDF
 from datetime import datetime
 from io import BytesIO
-import json
 
 # --- Configuration ---
-GST_RATE = 0.18
-DATABASE_FILE = os.path.join("data", "pharmacy_db.db")
 FONT_PATH = os.path.join(os.path.dirname(__file__), '../fonts/DejaVuSans.ttf')
 # --- Helper Functions ---
 def format_currency(amount):
@@ -19,34 +18,13 @@ def format_currency(amount):
 
 # --- Database Functions ---
 def get_all_drugs():
-    rows, _ = execute_sql_query("SELECT DRUG_ID, DRUG_NAME, PRICE_PER_PACK FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME;")
+    try:
+        rows, _ = cached_select(NAMED_QUERIES["drug_price_list"])
+    except sqlite3.Error as e:
+        st.error(f"Database Error: {e}")
+        return []
     return rows or []
 
-def get_next_invoice_id_and_prepare_db(customer_name, payment_method, invoice_items_json, subtotal, gst_amount, grand_total):
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS INVOICES (
-            invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            invoice_date TEXT NOT NULL,
-            customer_name TEXT NOT NULL,
-            payment_method TEXT NOT NULL,
-            invoice_items_json TEXT NOT NULL,
-            subtotal REAL NOT NULL,
-            gst_amount REAL NOT NULL,
-            grand_total REAL NOT NULL
-        )
-    """)
-    invoice_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("""
-        INSERT INTO INVOICES (invoice_date, customer_name, payment_method, invoice_items_json, subtotal, gst_amount, grand_total)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (invoice_date, customer_name, payment_method, invoice_items_json, subtotal, gst_amount, grand_total))
-    conn.commit()
-    invoice_id = cursor.lastrowid
-    conn.close()
-    return invoice_id
-
 # --- PDF Generation Function ---
 def create_invoice_pdf(invoice_id, customer_name, payment_method, items, subtotal, gst, grand_total):
     date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -201,21 +179,17 @@ def show_billing_page():
         elif not customer_name_final:
             st.warning("Please enter customer name for the invoice.")
         else:
-            final_subtotal = sum(item['quantity'] * item['price_per_pack'] for item in st.session_state.current_invoice_items)
-            final_gst = final_subtotal * GST_RATE
-            final_grand_total = final_subtotal + final_gst
-
-            invoice_items_json_str = json.dumps(st.session_state.current_invoice_items)
-
-            invoice_id = get_next_invoice_id_and_prepare_db(
-                customer_name_final, payment_method_final, invoice_items_json_str,
-                final_subtotal, final_gst, final_grand_total
+            # Stock for every line is decremented and the invoice saved in one transaction, or nothing is
+            invoice, checkout_error = checkout(
+                customer_name_final, payment_method_final, st.session_state.current_invoice_items
             )
 
-            if invoice_id is None:
-                st.error("Could not generate invoice ID or save invoice to database.")
+            if invoice is None:
+                st.error(checkout_error)
                 # No rerun here, let user see error
                 return
+            invoice_id = invoice["invoice_id"]
+            final_subtotal, final_gst, final_grand_total = invoice["subtotal"], invoice["gst_amount"], invoice["grand_total"]
 
             pdf_data = create_invoice_pdf(
                 invoice_id,
@@ -0,0 +1,52 @@
+# pages/bulk_import_page.py
+import os
+import streamlit as st
+from services.bulk_import import import_file, detect_format, IMPORT_TABLES
+
+def show_bulk_import_page():
+    st.header("Bulk Import")
+    st.markdown("Load a supplier catalogue or diagnostic history from a CSV, JSONL or JSON file. "
+                "Rows that fail validation are skipped and collected in a reject file you can download and fix.")
+
+    table = st.selectbox("Import into:", list(IMPORT_TABLES.keys()), key="bulk_import_table")
+    expected_columns = ", ".join(f"`{column}`" + (" (required)" if required else "") for column, _, required in IMPORT_TABLES[table])
+    st.caption(f"Expected columns (case-insensitive): {expected_columns}")
+
+    uploaded_file = st.file_uploader("Upload file", type=["csv", "jsonl", "ndjson", "json"], key="bulk_import_file")
+    defer_indexes = st.checkbox(
+        "Rebuild indexes after the load (fastest for large files; lookups on this table are slower while it runs)",
+        value=True, key="bulk_import_defer_indexes"
+    )
+
+    if st.button("Start Import", key="bulk_import_btn"):
+        if uploaded_file is None:
+            st.warning("Please upload a file to import.")
+            return
+
+        progress_text = st.empty()
+
+        def report(rows_read, rows_imported, rows_rejected):
+            progress_text.info(f"Read {rows_read:,} rows · imported {rows_imported:,} · rejected {rows_rejected:,}")
+
+        try:
+            with st.spinner(f"Importing {uploaded_file.name} into {table}..."):
+                summary = import_file(
+                    uploaded_file, table, detect_format(uploaded_file.name),
+                    progress_callback=report, defer_indexes=defer_indexes
+                )
+        except Exception as e:
+            st.error(f"Import failed: {e}. Chunks committed before the error were kept.")
+            return
+
+        st.success(f"Imported {summary['rows_imported']:,} rows into {table} in {summary['elapsed_s']:.1f}s "
+                   f"({summary['rows_per_second']:,.0f} rows/s).")
+        if summary["reject_file"]:
+            st.warning(f"{summary['rows_rejected']:,} rows were rejected.")
+            with open(summary["reject_file"], "rb") as reject_file:
+                st.download_button(
+                    label="📥 Download rejected rows",
+                    data=reject_file.read(),
+                    file_name=os.path.basename(summary["reject_file"]),
+                    mime="text/csv"
+                )
+    st.markdown("---")
@@ -1,6 +1,6 @@
 # pages/chatbot_page.py
 import streamlit as st
-from services.gemini_service import get_chatbot_response # Import from new path
+from services.gemini_service import stream_chatbot_response # Import from new path
 from prompts import LLM_CHATBOT_INFO_PROMPT # Import from new path
 
 def show_chatbot_page():
@@ -18,20 +18,23 @@ def show_chatbot_page():
             st.markdown(prompt)
 
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                full_chat_history_for_llm = []
-                for msg in st.session_state.chatbot_history:
-                    full_chat_history_for_llm.append({
-                        "role": "user" if msg["role"] == "user" else "model",
-                        "content": msg["content"]
-                    })
+            full_chat_history_for_llm = []
+            for msg in st.session_state.chatbot_history:
+                full_chat_history_for_llm.append({
+                    "role": "user" if msg["role"] == "user" else "model",
+                    "content": msg["content"]
+                })
 
-                ai_response = get_chatbot_response(
-                    user_query=prompt,
-                    chatbot_prompt_template=LLM_CHATBOT_INFO_PROMPT,
-                    chat_history=full_chat_history_for_llm
-                )
-                
+            # The answer is written as it arrives; an interrupted answer keeps what was received
+            outcome = {}
+            ai_response = st.write_stream(stream_chatbot_response(
+                user_query=prompt,
+                chatbot_prompt_template=LLM_CHATBOT_INFO_PROMPT,
+                chat_history=full_chat_history_for_llm,
+                outcome=outcome
+            ))
+            if not outcome["text"]:
+                ai_response = outcome["error"]
                 st.markdown(ai_response)
         st.session_state.chatbot_history.append({"role": "assistant", "content": ai_response})
 
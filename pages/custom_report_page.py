@@ -1,8 +1,17 @@
 # pages/custom_report_page.py
 import streamlit as st
-from services.database_service import execute_sql_query # Import from new path
-from services.gemini_service import generate_sql_query_from_prompt, get_llm_analysis_from_data # Import from new path
+from services.database_service import execute_sql_query, is_select_query, fetch_capped_rows # Import from new path
+from services.gemini_service import stream_llm_analysis_from_data # Import from new path
+from services.sql_cache import get_sql_for_question, discard_sql
 from prompts import LLM_SQL_GENERATION_PROMPT, LLM_REPORT_GENERATION_PROMPT # Import from new path
+from services.query_guard import guard_query
+from services.query_limits import get_query_budget_ms, QUERY_CANCELLED_PREFIX
+from utils.result_pager import start_paged_result, render_paged_result
+from utils.query_guard_view import show_guarded_sql, show_sql_source
+from utils.query_runner import run_cancellable, show_cancelled_status
+
+REPORT_RESULT_STATE_KEY = "custom_report_paged_result"
+REPORT_TEXT_STATE_KEY = "custom_report_text"
 
 def show_custom_report_page():
     st.header("Custom Data Report Generation")
@@ -13,34 +22,81 @@ def show_custom_report_page():
         key="report_request_input"
     )
 
+    report_streamed = False
     if st.button("Generate Custom Report", key="generate_custom_report_btn"):
         if report_request.strip():
-            with st.spinner("Generating SQL and report..."):
-                sql_query_for_report = generate_sql_query_from_prompt(report_request, LLM_SQL_GENERATION_PROMPT)
+            report_data_df = None
+            with st.spinner("Generating SQL and fetching report data..."):
+                sql_query_for_report, sql_source = get_sql_for_question(report_request, LLM_SQL_GENERATION_PROMPT)
 
                 if sql_query_for_report and not sql_query_for_report.startswith("Error:"):
-                    st.subheader("Generated SQL Query for Report:")
-                    st.code(sql_query_for_report, language="sql")
-
-                    report_data_raw, report_cols = execute_sql_query(sql_query_for_report)
+                    guard = guard_query(sql_query_for_report, st.session_state.get("user_role", ""))
+                    show_guarded_sql(guard, "Generated SQL Query for Report:")
+                    show_sql_source(sql_source)
+                    sql_query_for_report = guard["query"]
+                    query_budget_ms = get_query_budget_ms(st.session_state.get("user_role", ""))
 
-                    if report_data_raw:
-                        report_data_df = [dict(zip(report_cols, row)) for row in report_data_raw]
-                        
-                        llm_report = get_llm_analysis_from_data(
-                            report_data_df,
-                            LLM_REPORT_GENERATION_PROMPT,
-                            original_request=report_request
+                    st.session_state[REPORT_TEXT_STATE_KEY] = ""
+                    if guard["action"] == "refuse":
+                        st.session_state[REPORT_RESULT_STATE_KEY] = None
+                        report_data_raw, report_cols = [], None
+                        discard_sql(report_request, LLM_SQL_GENERATION_PROMPT)
+                    elif is_select_query(sql_query_for_report):
+                        # Rows for the AI report are read in batches up to the hard cap; the
+                        # on-screen table is paged separately below. Both read from the analytics
+                        # snapshot when it is enabled, away from checkout traffic.
+                        report_data_raw, report_cols = run_cancellable(
+                            REPORT_RESULT_STATE_KEY, fetch_capped_rows, sql_query_for_report, timeout_ms=query_budget_ms,
+                            analytics=True
                         )
-                        if llm_report and not llm_report.startswith("Error:"):
-                            st.subheader("AI-Generated Custom Report:")
-                            st.write(llm_report)
-                        else:
-                            st.error(llm_report)
+                        if not isinstance(report_data_raw, str):
+                            start_paged_result(
+                                REPORT_RESULT_STATE_KEY, sql_query_for_report, timeout_ms=query_budget_ms, cancellable=True,
+                                analytics=True
+                            )
                     else:
+                        st.session_state[REPORT_RESULT_STATE_KEY] = None
+                        report_data_raw, report_cols = run_cancellable(
+                            REPORT_RESULT_STATE_KEY, execute_sql_query, sql_query_for_report, timeout_ms=query_budget_ms
+                        )
+
+                    if isinstance(report_data_raw, str):
+                        if report_data_raw.startswith(QUERY_CANCELLED_PREFIX):
+                            st.warning(report_data_raw)
+                        elif report_data_raw.startswith(("Database Error", "An unexpected error")):
+                            st.error(report_data_raw)
+                            discard_sql(report_request, LLM_SQL_GENERATION_PROMPT)
+                        else:
+                            st.info(report_data_raw)
+                    elif report_data_raw:
+                        report_data_df = [dict(zip(report_cols, row)) for row in report_data_raw]
+                    elif guard["action"] != "refuse":
                         st.info("No data found for the specified report criteria. The generated SQL might need adjustment or the database is empty for this query.")
                 else:
                     st.error(sql_query_for_report)
+
+            if report_data_df:
+                # The report is written as it arrives; an interrupted report keeps what was received
+                st.subheader("AI-Generated Custom Report:")
+                outcome = {}
+                st.write_stream(stream_llm_analysis_from_data(
+                    report_data_df,
+                    LLM_REPORT_GENERATION_PROMPT,
+                    original_request=report_request,
+                    outcome=outcome
+                ))
+                st.session_state[REPORT_TEXT_STATE_KEY] = outcome["text"]
+                report_streamed = True
         else:
             st.warning("Please describe the report you want to generate.")
+
+    show_cancelled_status(REPORT_RESULT_STATE_KEY)
+
+    # Kept in session state so paging through the report data doesn't discard the report
+    if st.session_state.get(REPORT_TEXT_STATE_KEY) and not report_streamed:
+        st.subheader("AI-Generated Custom Report:")
+        st.write(st.session_state[REPORT_TEXT_STATE_KEY])
+    if st.session_state.get(REPORT_RESULT_STATE_KEY):
+        st.subheader("Report Data:")
+        render_paged_result(REPORT_RESULT_STATE_KEY)
     st.markdown("---")
\ No newline at end of file
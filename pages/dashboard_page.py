@@ -1,5 +1,9 @@
 # pages/dashboard_page.py
 import streamlit as st
+from services.query_cache import get_query_cache_stats, clear_query_cache
+from services.query_limits import read_cancelled_queries, QUERY_TIME_BUDGETS_MS
+from services.db_snapshot import get_snapshot_info, refresh_snapshot, snapshot_available
+from services.inventory_alerts import get_inventory_alert_counts
 
 def show_dashboard_page():
     role = st.session_state.get("user_role", "Guest") 
@@ -17,9 +21,11 @@ def show_dashboard_page():
         * **💬 Natural Language Query (Advanced):** Directly ask questions or issue commands (e.g., "sell 5 packs of Lipitor") in plain English to interact with the database.
         * **🤖 AI Chatbot:** Ask general questions about the database structure and what kind of data is stored.
         """)
+        show_inventory_alert_summary()
     elif role == "Doctor":
         st.markdown("""
         * **🧑‍⚕️ Patient History Summarizer:** Get AI-generated summaries of patient health journeys.
+        * **🩺 Diagnostic Notes Search:** Search diagnoses and test results by keyword, ranked by relevance, within a date range.
         * **✍️ Custom Data Report:** Describe the report you need in natural language, and AI will generate it for you.
         * **💬 Natural Language Query (Advanced):** Directly ask questions or issue commands (e.g., "add a diagnostic record for John Doe") in plain English to interact with the database.
         * **🤖 AI Chatbot:** Ask general questions about the database structure and what kind of data is stored.
@@ -30,13 +36,17 @@ def show_dashboard_page():
         * **💊 Quick Drug Search:** Instantly find drug details by name.
         * **➕ Add Records:** Easily add new drugs to inventory or new diagnostic patient records.
         * **🗑️ Delete Records:** Remove specific records by ID.
+        * **📥 Bulk Import:** Load supplier catalogues or diagnostic history from CSV/JSONL files.
         * **🧑‍⚕️ Patient History Summarizer:** Get AI-generated summaries of patient health journeys.
+        * **🩺 Diagnostic Notes Search:** Search diagnoses and test results by keyword, ranked by relevance, within a date range.
         * **📊 Inventory Insights:** Receive AI-driven recommendations for stock management (low stock, expiring drugs).
         * **✍️ Custom Data Report:** Describe the report you need in natural language, and AI will generate it for you.
         * **💬 Natural Language Query (Advanced):** Directly ask questions or issue commands (e.g., "sell 5 packs of Lipitor") in plain English to interact with the database.
         * **🤖 AI Chatbot:** Ask general questions about the database structure and what kind of data is stored.
         * **🖼️ Medical Image Analysis:** Upload medical images and get AI-powered descriptions and insights.
         """)
+        show_inventory_alert_summary()
+        show_admin_system_panel()
     else:
         st.markdown("""
         * **💊 You should be either pharmacist, doctor or Admin to use this app
@@ -71,4 +81,83 @@ def show_dashboard_page():
     #         st.rerun()
 
     # st.markdown("---")
-    st.info("Use the navigation menu on the left to access all features.")
\ No newline at end of file
+    st.info("Use the navigation menu on the left to access all features.")
+
+
+def show_inventory_alert_summary():
+    """Low-stock / expiring counts from the trigger-maintained alert tables (no catalogue scan)."""
+    counts = get_inventory_alert_counts()
+    if not counts:
+        return
+    st.subheader("Inventory alerts:")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Low stock", counts["LOW_STOCK"])
+    col2.metric("Expiring soon", counts["EXPIRING_SOON"])
+    col3.metric("Already expired", counts["EXPIRED"])
+    if any(counts.values()):
+        st.caption("Open Inventory Insights for the list and AI recommendations.")
+
+
+def show_admin_system_panel():
+    """Admin-only view of process-wide caches."""
+    # sql_cache pulls in the Gemini client; only admins see this panel, so other roles never load it
+    from services.sql_cache import get_sql_cache_stats, purge_sql_cache, reset_sql_cache_counters
+
+    with st.expander("⚙️ System: Query Result Cache"):
+        stats = get_query_cache_stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Hit rate", f"{stats['hit_rate']:.1%}", help=f"{stats['hits']} hits / {stats['misses']} misses")
+        col2.metric("Entries", f"{stats['entries']} / {stats['max_entries']}")
+        col3.metric("Memory", f"{stats['bytes'] / 1024:.0f} KB", help=f"Limit {stats['max_bytes'] / (1024 * 1024):.0f} MB")
+        st.caption(f"Invalidated by writes: {stats['invalidations']} · Evicted (LRU): {stats['evictions']}")
+        if st.button("Clear query cache", key="admin_clear_query_cache"):
+            clear_query_cache()
+            st.success("Query cache cleared.")
+
+    with st.expander("🧠 System: Question → SQL Cache"):
+        stats = get_sql_cache_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Exact hit rate", f"{stats['hit_rate']:.1%}", help=f"{stats['hits']} hits / {stats['misses']} misses")
+        col2.metric("Model calls saved", f"{stats['model_calls_saved_rate']:.1%}",
+                    help=f"Exact hits plus {stats['template_hits']} answers filled in from learned templates")
+        col3.metric("Entries", f"{stats['entries']} / {stats['max_entries']}", help=f"{stats['templates']} learned templates")
+        col4.metric("TTL", f"{stats['ttl_s'] / 86400:g} days")
+        st.caption(f"Expired: {stats['expired']} · Evicted (LRU): {stats['evictions']} · "
+                   f"Discarded after refusal or error: {stats['discarded']} · Templates learned: {stats['templates_learned']}")
+        if stats["top_questions"]:
+            st.dataframe(stats["top_questions"], use_container_width=True, hide_index=True)
+        if stats["top_templates"]:
+            st.dataframe(stats["top_templates"], use_container_width=True, hide_index=True)
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Purge expired", key="admin_purge_expired_sql_cache"):
+            st.success(f"Removed {purge_sql_cache(expired_only=True)} expired entries.")
+        if col2.button("Clear all", key="admin_clear_sql_cache"):
+            st.success(f"Removed {purge_sql_cache()} entries.")
+        if col3.button("Reset counters", key="admin_reset_sql_cache_counters"):
+            reset_sql_cache_counters()
+            st.success("Counters reset.")
+
+    with st.expander("⏱️ System: Cancelled Queries"):
+        budgets = " · ".join(f"{role}: {budget_ms / 1000:g}s" for role, budget_ms in QUERY_TIME_BUDGETS_MS.items())
+        st.caption(f"Query time budgets: {budgets}. Recurring entries here are candidates for a new index.")
+        cancelled = read_cancelled_queries()
+        if cancelled:
+            st.dataframe(cancelled, use_container_width=True, hide_index=True)
+        else:
+            st.info("No queries have been cancelled.")
+
+    with st.expander("📸 System: Analytics Snapshot"):
+        if not snapshot_available():
+            st.caption("Custom reports read from the read-only connection pool. "
+                       "Set ANALYTICS_SNAPSHOT=1 to serve them from an in-memory copy instead.")
+        else:
+            info = get_snapshot_info()
+            if info:
+                col1, col2 = st.columns(2)
+                col1.metric("Snapshot age", f"{info['age_s'] / 60:.1f} min", help=f"Refreshed every {info['refresh_seconds']} s")
+                col2.metric("Snapshot size", f"{info['bytes'] / (1024 * 1024):.1f} MB", help=f"Built in {info['build_ms']:.0f} ms")
+            else:
+                st.caption("No snapshot yet; the first custom report builds it.")
+            if st.button("Refresh snapshot now", key="admin_refresh_snapshot"):
+                refresh_snapshot()
+                st.success("Analytics snapshot refreshed.")
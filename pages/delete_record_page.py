@@ -1,6 +1,6 @@
 # pages/delete_record_page.py
 import streamlit as st
-from services.database_service import execute_sql_query # Import from new path
+from services.database_service import run_named_query # Import from new path
 
 def show_delete_record_page():
     st.header("Delete Record by ID")
@@ -13,9 +13,9 @@ def show_delete_record_page():
         if delete_id:
             st.info(f"Attempting to delete record with ID {delete_id} from {delete_table}...")
 
-            delete_query = f"DELETE FROM {delete_table} WHERE {'DRUG_ID' if delete_table == 'PHARMACY_INVENTORY' else 'PATIENT_ID'} = {delete_id};"
-            status_msg, _ = execute_sql_query(delete_query)
-            if status_msg:
+            delete_query_name = "delete_drug" if delete_table == 'PHARMACY_INVENTORY' else "delete_diagnostic"
+            status_msg, _ = run_named_query(delete_query_name, record_id=int(delete_id))
+            if status_msg.startswith("Query executed successfully"):
                 st.success(f"Record with ID {delete_id} from {delete_table} deleted successfully! Please re-query to verify.")
             else:
                 st.error("Failed to delete record. It might not exist or a database error occurred.")
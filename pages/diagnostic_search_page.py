@@ -0,0 +1,44 @@
+# pages/diagnostic_search_page.py
+import time
+from datetime import date
+
+import streamlit as st
+from services.diagnostic_search import search_diagnostic_notes, DIAGNOSTIC_SEARCH_LIMIT
+
+def show_diagnostic_search_page():
+    st.markdown("### 🩺 Diagnostic Notes Search")
+
+    search_text = st.text_input(
+        "Search diagnoses and test results",
+        placeholder='e.g. elevated hba1c, "chest pain", wheez',
+        key="diagnostic_search_text"
+    )
+    filter_dates = st.checkbox("Only diagnoses in a date range", key="diagnostic_search_filter_dates")
+    date_from = date_to = None
+    if filter_dates:
+        col1, col2 = st.columns(2)
+        date_from = col1.date_input("From", value=date(date.today().year, 1, 1), key="diagnostic_search_from")
+        date_to = col2.date_input("To", value=date.today(), key="diagnostic_search_to")
+
+    if not search_text.strip():
+        st.caption('All words must match; the last one may be partial. Put "exact phrases" in quotes.')
+        return
+
+    start = time.perf_counter()
+    results, _ = search_diagnostic_notes(search_text, date_from, date_to, limit=DIAGNOSTIC_SEARCH_LIMIT)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if isinstance(results, str):
+        st.error(results)
+        return
+    if not results:
+        st.warning("No diagnostic records match that search.")
+        return
+
+    st.caption(f"Top {len(results)} records by relevance in {elapsed_ms:.1f} ms")
+    for patient_id, patient_name, diagnosis_date, diagnosis, test_results, drug_id in results:
+        st.markdown(f"**#{patient_id} {patient_name}** · {diagnosis_date} · {diagnosis}")
+        details = test_results or "_No test results recorded._"
+        if drug_id:
+            details += f"  \nPrescribed drug ID: {drug_id}"
+        st.markdown(details)
+        st.markdown("---")
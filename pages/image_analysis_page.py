@@ -5,7 +5,7 @@ import io
 import base64
 
 # Import the new image analysis function from gemini_client
-from services.gemini_service import analyze_medical_image # Import from new path
+from services.gemini_service import stream_medical_image_analysis # Import from new path
 
 def show_image_analysis_page():
     """
@@ -66,31 +66,32 @@ def show_image_analysis_page():
 
 
     # Button to trigger analysis
+    analysis_streamed = False
     if st.button("Generate Image Analysis", key="generate_image_analysis_btn"):
         if st.session_state.uploaded_image_data:
-            with st.spinner("Analyzing image... This may take a moment."):
-                # Convert image bytes to base64
-                base64_image = base64.b64encode(st.session_state.uploaded_image_data).decode('utf-8')
+            # Convert image bytes to base64
+            base64_image = base64.b64encode(st.session_state.uploaded_image_data).decode('utf-8')
 
-                # Define the prompt for Gemini Vision model
-                analysis_prompt = """
-                Analyze this medical image. Describe what you observe in detail.
-                Identify any visible anatomical structures, anomalies, or potential findings.
-                Based on your observations, provide a concise and informative analysis.
-                DO NOT make a diagnosis or offer medical advice. Focus solely on describing the image content.
-                """
-                
-                # Call the Gemini Vision API
-                analysis_result = analyze_medical_image(base64_image, analysis_prompt)
-                
-                st.session_state.image_analysis_result = analysis_result
-                st.rerun() # Rerun to display result
+            # Define the prompt for Gemini Vision model
+            analysis_prompt = """
+            Analyze this medical image. Describe what you observe in detail.
+            Identify any visible anatomical structures, anomalies, or potential findings.
+            Based on your observations, provide a concise and informative analysis.
+            DO NOT make a diagnosis or offer medical advice. Focus solely on describing the image content.
+            """
+
+            # Call the Gemini Vision API; the analysis is written as it arrives and kept even if cut off
+            st.subheader("AI Image Analysis:")
+            outcome = {}
+            st.write_stream(stream_medical_image_analysis(base64_image, analysis_prompt, outcome=outcome))
+            st.session_state.image_analysis_result = outcome["text"]
+            analysis_streamed = True
 
         else:
             st.warning("Please upload a medical image first to generate an analysis.")
 
     # Display analysis result
-    if st.session_state.image_analysis_result:
+    if st.session_state.image_analysis_result and not analysis_streamed:
         st.subheader("AI Image Analysis:")
         st.markdown(st.session_state.image_analysis_result)
 
@@ -1,41 +1,74 @@
 # pages/inventory_insights_page.py
 import streamlit as st
-from datetime import date
-import pandas as pd
-from services.database_service import execute_sql_query # Import from new path
-from services.gemini_service import get_llm_analysis_from_data # Import from new path
+from services.inventory_alerts import (
+    get_inventory_alerts, get_inventory_alert_counts, set_alert_threshold, delete_alert_threshold, ALERT_SCOPES
+)
+from services.database_service import run_named_query # Import from new path
+from services.gemini_service import stream_llm_analysis_from_data # Import from new path
 from prompts import LLM_INVENTORY_INSIGHTS_PROMPT # Import from new path
 
 def show_inventory_insights_page():
     st.header("AI-Driven Inventory Insights")
     st.markdown("Get actionable recommendations for your pharmacy inventory based on stock levels and expiry dates.")
 
+    # LOW_STOCK / EXPIRING_SOON are kept current by triggers, so this is a read of a few rows
+    counts = get_inventory_alert_counts()
+    if counts:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Low stock", counts["LOW_STOCK"])
+        col2.metric("Expiring soon", counts["EXPIRING_SOON"])
+        col3.metric("Already expired", counts["EXPIRED"])
+
     if st.button("Generate Inventory Insights", key="generate_inventory_insights_btn"):
-        with st.spinner("Analyzing inventory for insights..."):
-            current_date_str = date.today().strftime('%Y-%m-%d')
-            future_date_str = (date.today() + pd.DateOffset(months=6)).strftime('%Y-%m-%d')
-            
-            inventory_insights_query = f"""
-            SELECT DRUG_NAME, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER
-            FROM PHARMACY_INVENTORY
-            WHERE STOCK_QUANTITY < 50 OR EXPIRY_DATE <= '{future_date_str}'
-            ORDER BY EXPIRY_DATE ASC, STOCK_QUANTITY ASC;
-            """
-            inventory_data_raw, inventory_cols = execute_sql_query(inventory_insights_query)
-
-            if inventory_data_raw:
-                inventory_data_df = [dict(zip(inventory_cols, row)) for row in inventory_data_raw]
-                
-                llm_insights = get_llm_analysis_from_data(
-                    inventory_data_df,
-                    LLM_INVENTORY_INSIGHTS_PROMPT,
-                    original_request="Analyze pharmacy inventory for urgent attention items"
-                )
-                if llm_insights and not llm_insights.startswith("Error:"):
-                    st.subheader("Pharmacy Inventory Insights & Recommendations:")
-                    st.write(llm_insights)
-                else:
-                    st.error(llm_insights)
+        with st.spinner("Loading inventory alerts..."):
+            inventory_data_raw, inventory_cols = get_inventory_alerts()
+
+        if isinstance(inventory_data_raw, str):
+            st.error(inventory_data_raw)
+        elif inventory_data_raw:
+            inventory_data_df = [dict(zip(inventory_cols, row)) for row in inventory_data_raw]
+
+            # The insights are written as they arrive; errors are reported by the stream itself
+            st.subheader("Pharmacy Inventory Insights & Recommendations:")
+            st.write_stream(stream_llm_analysis_from_data(
+                inventory_data_df,
+                LLM_INVENTORY_INSIGHTS_PROMPT,
+                original_request="Analyze pharmacy inventory for urgent attention items"
+            ))
+        else:
+            st.info("No low stock or expiring drugs found. Inventory appears healthy!")
+    st.markdown("---")
+    show_alert_thresholds_editor()
+
+
+def show_alert_thresholds_editor():
+    """Default, per-formulation and per-drug alert thresholds. The most specific one set wins."""
+    with st.expander("⚙️ Alert thresholds"):
+        thresholds, columns = run_named_query("alert_threshold_list")
+        if isinstance(thresholds, str):
+            st.error(thresholds)
+            return
+        st.dataframe([dict(zip(columns, row)) for row in thresholds], use_container_width=True, hide_index=True)
+        st.caption("A drug uses its own thresholds, else its formulation's, else the default. Empty values inherit.")
+
+        with st.form("alert_threshold_form"):
+            scope = st.selectbox("Applies to", ALERT_SCOPES, key="alert_threshold_scope")
+            scope_key = st.text_input("Formulation (e.g. Tablet) or DRUG_ID — leave empty for DEFAULT", key="alert_threshold_key")
+            col1, col2 = st.columns(2)
+            low_stock_below = col1.number_input("Low stock below (packs)", min_value=0, value=None, step=1, key="alert_threshold_stock")
+            expiry_within_days = col2.number_input("Expiring within (days)", min_value=0, value=None, step=1, key="alert_threshold_days")
+            save, remove = st.columns(2)
+            save_clicked = save.form_submit_button("Save thresholds")
+            remove_clicked = remove.form_submit_button("Remove override")
+
+        if (save_clicked or remove_clicked) and scope != "DEFAULT" and not scope_key.strip():
+            st.error(f"Enter the {'formulation' if scope == 'FORMULATION' else 'DRUG_ID'} this applies to.")
+        elif save_clicked or remove_clicked:
+            if save_clicked:
+                status = set_alert_threshold(scope, scope_key, low_stock_below, expiry_within_days)
+            else:
+                status = delete_alert_threshold(scope, scope_key.strip())
+            if status.startswith("Query executed successfully"):
+                st.success("Thresholds updated; low-stock and expiry alerts were recalculated.")
             else:
-                st.info("No low stock or expiring drugs found. Inventory appears healthy!")
-    st.markdown("---")
\ No newline at end of file
+                st.error(status)
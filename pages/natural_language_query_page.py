@@ -1,8 +1,17 @@
 # pages/natural_language_query_page.py
 import streamlit as st
-from services.database_service import execute_sql_query # Import from new path
-from services.gemini_service import generate_sql_query_from_prompt # Import from new path
+from services.database_service import execute_sql_query, is_select_query # Import from new path
+from services.sql_cache import get_sql_for_question, discard_sql
+from services.intent_parser import parse_intent
 from prompts import LLM_SQL_GENERATION_PROMPT # Import from new path
+from services.query_guard import guard_query
+from services.query_limits import get_query_budget_ms, QUERY_CANCELLED_PREFIX
+from utils.result_pager import start_paged_result, render_paged_result
+from utils.query_guard_view import show_guarded_sql, show_sql_source
+from utils.query_runner import run_cancellable, show_cancelled_status
+
+NLQ_RESULT_STATE_KEY = "nlq_paged_result"
+NLQ_GUARD_STATE_KEY = "nlq_query_guard"
 
 def show_natural_language_query_page():
     st.header("Natural Language Query (Advanced)")
@@ -43,48 +52,82 @@ def show_natural_language_query_page():
         if current_question_llm.strip() == "":
             st.warning("Please enter a query or command, or choose a suggestion.")
         else:
-            with st.spinner("Generating SQL query..."):
-                generated_sql_query = generate_sql_query_from_prompt(current_question_llm, LLM_SQL_GENERATION_PROMPT)
+            # Everyday commands are recognized locally; everything else goes to the cache and then Gemini
+            intent = parse_intent(current_question_llm)
+            if intent:
+                generated_sql_query, sql_params, sql_source = intent["sql"], intent["params"], "intent"
+            else:
+                sql_params = ()
+                with st.spinner("Generating SQL query..."):
+                    generated_sql_query, sql_source = get_sql_for_question(current_question_llm, LLM_SQL_GENERATION_PROMPT)
 
             if generated_sql_query and not generated_sql_query.startswith("Error:"):
-                st.subheader("Generated SQL Query:")
-                st.code(generated_sql_query, language="sql")
-
-                st.subheader("Query Results/Status:")
-                
-                query_results_data, query_results_columns = execute_sql_query(generated_sql_query) 
+                # Plan the statement before it touches the shared database
+                guard = guard_query(generated_sql_query, st.session_state.get("user_role", ""), sql_params)
+                st.session_state[NLQ_GUARD_STATE_KEY] = guard
+                show_guarded_sql(guard)
+                show_sql_source(sql_source, intent)
+                generated_sql_query = guard["query"]
+                query_budget_ms = get_query_budget_ms(st.session_state.get("user_role", ""))
 
                 history_entry = {
                     "prompt": current_question_llm,
-                    "sql": generated_sql_query,
-                    "result": query_results_data if isinstance(query_results_data, str) else "Data Retrieved",
-                    "status": "Success"
+                    "sql": generated_sql_query + (f"\n-- parameters: {list(sql_params)}" if sql_params else ""),
+                    "result": "Data Retrieved",
+                    "status": "Success",
+                    "source": sql_source
                 }
-                if query_results_data is not None and isinstance(query_results_data, list) and not query_results_data:
-                    history_entry["result"] = "No results found"
-                st.session_state.prompt_history.append(history_entry)
 
-                if query_results_data is not None:
-                    if isinstance(query_results_data, str): 
+                if guard["action"] == "refuse":
+                    st.session_state[NLQ_RESULT_STATE_KEY] = None
+                    history_entry["status"] = "Refused"
+                    history_entry["result"] = "; ".join(issue["message"] for issue in guard["issues"] if issue["action"] == "refuse")
+                    st.session_state.prompt_history.append(history_entry)
+                    discard_sql(current_question_llm, LLM_SQL_GENERATION_PROMPT)  # Don't serve it again
+                elif is_select_query(generated_sql_query):
+                    # SELECTs are paged so a broad query never materializes the whole table
+                    error_message = start_paged_result(
+                        NLQ_RESULT_STATE_KEY, generated_sql_query, sql_params, timeout_ms=query_budget_ms, cancellable=True
+                    )
+                    if error_message:
+                        st.subheader("Query Results/Status:")
+                        if error_message.startswith(QUERY_CANCELLED_PREFIX):
+                            st.warning(error_message)
+                            history_entry["status"] = "Cancelled"
+                        else:
+                            st.error(error_message)
+                            history_entry["status"] = "Error"
+                            discard_sql(current_question_llm, LLM_SQL_GENERATION_PROMPT)
+                        history_entry["result"] = error_message
+                    elif not st.session_state[NLQ_RESULT_STATE_KEY]["rows"]:
+                        history_entry["result"] = "No results found"
+                    st.session_state.prompt_history.append(history_entry)
+                else:
+                    st.session_state[NLQ_RESULT_STATE_KEY] = None
+                    st.subheader("Query Results/Status:")
+
+                    query_results_data, _ = run_cancellable(
+                        NLQ_RESULT_STATE_KEY, execute_sql_query, generated_sql_query, sql_params, timeout_ms=query_budget_ms
+                    )
+                    history_entry["result"] = query_results_data if isinstance(query_results_data, str) else "Data Retrieved"
+                    if not isinstance(query_results_data, str): # e.g. PRAGMA output
+                        st.write(query_results_data)
+                    elif query_results_data.startswith(QUERY_CANCELLED_PREFIX):
+                        st.warning(query_results_data)
+                        history_entry["status"] = "Cancelled"
+                    elif query_results_data.startswith(("Database Error", "An unexpected error")):
+                        st.error(query_results_data)
+                        history_entry["status"] = "Error"
+                        discard_sql(current_question_llm, LLM_SQL_GENERATION_PROMPT)
+                    elif intent and intent["intent"] == "sell_stock" and query_results_data.endswith("Rows affected: 0"):
+                        # The local sale only decrements when the stock covers it
+                        st.warning(f"Nothing was sold: not enough stock for this sale ({intent['description']}).")
+                        history_entry["status"] = "Not enough stock"
+                    else:
                         st.success(query_results_data)
                         if generated_sql_query.strip().upper().startswith(("UPDATE", "INSERT", "DELETE")):
                             st.info("The database has been modified. You can run a SELECT query to see the changes.")
-                    else:
-                        if query_results_data:
-                            try:
-                                if query_results_columns:
-                                    df_data_llm = [dict(zip(query_results_columns, row)) for row in query_results_data]
-                                    st.dataframe(df_data_llm)
-                                else:
-                                    st.write(query_results_data)
-                            except Exception as e:
-                                st.write(query_results_data)
-                                st.warning(f"Could not display results as a table/dataframe: {e}")
-                        else:
-                            st.info("No results found for your query. Check the query and database content, or criteria.")
-                else:
-                    history_entry["status"] = "Error"
-                    history_entry["result"] = "Database error occurred (see above)."
+                    st.session_state.prompt_history.append(history_entry)
             elif generated_sql_query.startswith("Error:"):
                 history_entry = {
                     "prompt": current_question_llm,
@@ -95,6 +138,21 @@ def show_natural_language_query_page():
                 st.session_state.prompt_history.append(history_entry)
                 pass
 
+    # A query stopped with the Cancel button ends the run that started it; report it on this one
+    show_cancelled_status(NLQ_RESULT_STATE_KEY)
+
+    # Paged SELECT results live in session state so "Load more" survives the rerun it triggers
+    if st.session_state.get(NLQ_RESULT_STATE_KEY):
+        if not submit_button_clicked_llm:
+            guard = st.session_state.get(NLQ_GUARD_STATE_KEY)
+            if guard and guard["query"] == st.session_state[NLQ_RESULT_STATE_KEY]["sql"]:
+                show_guarded_sql(guard)
+            else:
+                st.subheader("Generated SQL Query:")
+                st.code(st.session_state[NLQ_RESULT_STATE_KEY]["sql"], language="sql")
+        st.subheader("Query Results/Status:")
+        render_paged_result(NLQ_RESULT_STATE_KEY)
+
     st.markdown("---")
 
     if st.button("Show Query History", key="show_history_btn"):
@@ -106,7 +164,7 @@ def show_natural_language_query_page():
                     st.markdown(f"**Generated SQL:**")
                     st.code(entry['sql'], language="sql")
                     st.markdown(f"**Result/Status:** {entry['result']}")
-                    st.markdown(f"**Overall Status:** `{entry['status']}`")
+                    st.markdown(f"**Overall Status:** `{entry['status']}`" + (f" · SQL from {entry['source']}" if entry.get("source", "model") != "model" else ""))
                     st.markdown("---")
         else:
             st.info("No SQL query history yet. Type a query or command and execute it!")
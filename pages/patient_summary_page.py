@@ -1,9 +1,17 @@
 # pages/patient_summary_page.py
 import streamlit as st
-from services.database_service import execute_sql_query, fetch_all_patient_names_and_ids # Import from new path
-from services.gemini_service import get_llm_analysis_from_data # Import from new path
+import csv
+import io
+from services.database_service import run_named_query, fetch_all_patient_names_and_ids, fetch_all_diagnoses # Import from new path
+from services.gemini_service import stream_llm_analysis_from_data # Import from new path
+from services.patient_summaries import (
+    summarize_patients, get_patient_summaries, failed_patient_ids, patient_ids_for_diagnosis, parse_patient_ids,
+    BATCH_SUMMARY_WORKERS
+)
 from prompts import LLM_PATIENT_SUMMARY_PROMPT # Import from new path
 
+BATCH_SELECTION_MODES = ["Patients with a diagnosis", "Patient IDs (e.g. an appointment list)", "Retry failed summaries"]
+
 def show_patient_summary_page():
     st.header("AI-Powered Patient History Summarizer")
     st.markdown("Get a concise, AI-generated summary of a patient's diagnostic and medication history.")
@@ -18,39 +26,81 @@ def show_patient_summary_page():
         if st.button("Generate Patient Summary", key="generate_patient_summary_btn"):
             if selected_patient:
                 patient_id_summary = patient_dict[selected_patient]
-                with st.spinner(f"Generating summary for {selected_patient}..."):
-                    summary_query = f"""
-                    SELECT
-                        DD.PATIENT_NAME,
-                        DD.DIAGNOSIS,
-                        DD.DIAGNOSIS_DATE,
-                        DD.TEST_RESULTS,
-                        PI.DRUG_NAME,
-                        PI.DOSAGE
-                    FROM DIAGNOSTIC_DATA AS DD
-                    LEFT JOIN PHARMACY_INVENTORY AS PI ON DD.DRUG_ID_PRESCRIBED = PI.DRUG_ID
-                    WHERE DD.PATIENT_ID = {patient_id_summary}
-                    ORDER BY DD.DIAGNOSIS_DATE ASC;
-                    """
-                    summary_data_raw, summary_cols = execute_sql_query(summary_query)
-
-                    if summary_data_raw:
-                        summary_data_df = [dict(zip(summary_cols, row)) for row in summary_data_raw]
-
-                        llm_summary = get_llm_analysis_from_data(
-                            summary_data_df,
-                            LLM_PATIENT_SUMMARY_PROMPT,
-                            original_request=f"Summarize the health history for {selected_patient}"
-                        )
-                        if llm_summary and not llm_summary.startswith("Error:"):
-                            st.subheader(f"Summary for {selected_patient}:")
-                            st.write(llm_summary)
-                        else:
-                            st.error(llm_summary)
-                    else:
-                        st.info(f"No diagnostic data found for {selected_patient}.")
+                with st.spinner(f"Loading history for {selected_patient}..."):
+                    summary_data_raw, summary_cols = run_named_query("patient_history", patient_id=patient_id_summary)
+
+                if isinstance(summary_data_raw, str):
+                    st.error(summary_data_raw)
+                elif summary_data_raw:
+                    summary_data_df = [dict(zip(summary_cols, row)) for row in summary_data_raw]
+
+                    # The summary is written as it arrives; errors are reported by the stream itself
+                    st.subheader(f"Summary for {selected_patient}:")
+                    st.write_stream(stream_llm_analysis_from_data(
+                        summary_data_df,
+                        LLM_PATIENT_SUMMARY_PROMPT,
+                        original_request=f"Summarize the health history for {selected_patient}"
+                    ))
+                else:
+                    st.info(f"No diagnostic data found for {selected_patient}.")
             else:
                 st.warning("Please select a patient.")
     else:
         st.warning("No patients found in the diagnostic data.")
-    st.markdown("---")
\ No newline at end of file
+    st.markdown("---")
+    show_batch_summary_section()
+
+
+def show_batch_summary_section():
+    """Pre-generates summaries for a diagnosis or an appointment list; results are stored for later."""
+    with st.expander("📋 Batch summaries"):
+        st.caption("Summaries are generated in parallel (paced to the Gemini quota) and saved. "
+                   "Patients whose history has not changed since their last summary are skipped.")
+        mode = st.radio("Select patients", BATCH_SELECTION_MODES, key="batch_summary_mode", horizontal=True)
+        if mode == BATCH_SELECTION_MODES[0]:
+            diagnosis = st.selectbox("Diagnosis", fetch_all_diagnoses(), key="batch_summary_diagnosis")
+            patient_ids = patient_ids_for_diagnosis(diagnosis) if diagnosis else []
+        elif mode == BATCH_SELECTION_MODES[1]:
+            pasted = st.text_area("PATIENT_IDs (comma, space or line separated)", key="batch_summary_ids")
+            uploaded = st.file_uploader("...or upload a CSV with a PATIENT_ID column", type=["csv", "txt"], key="batch_summary_file")
+            patient_ids = parse_patient_ids(pasted + "\n" + (uploaded.getvalue().decode("utf-8", errors="ignore") if uploaded else ""))
+        else:
+            patient_ids = failed_patient_ids()
+
+        if isinstance(patient_ids, str):
+            st.error(patient_ids)
+            return
+        st.caption(f"{len(patient_ids):,} patients selected.")
+        force = st.checkbox("Regenerate summaries that are already up to date", key="batch_summary_force")
+
+        if st.button("Generate Batch Summaries", key="batch_summary_btn", disabled=not patient_ids):
+            progress_bar = st.progress(0.0)
+            progress_text = st.empty()
+
+            # Called on this script thread; the workers themselves make no Streamlit calls
+            def report_progress(completed, total, patient_id, status, error):
+                progress_bar.progress(completed / total)
+                progress_text.caption(f"{completed}/{total} · patient {patient_id}: {status}")
+                if error:
+                    (st.warning if status == "retrying" else st.error)(f"Patient {patient_id}: {error}")
+
+            report = summarize_patients(patient_ids, workers=BATCH_SUMMARY_WORKERS, force=force, on_progress=report_progress)
+            if isinstance(report, str):
+                st.error(report)
+                return
+            progress_bar.progress(1.0)
+            st.success(f"{report['done']} summarized, {report['up_to_date']} already up to date, "
+                       f"{report['no_data']} without records in {report['elapsed_s']:.1f}s.")
+            if report["failed"] or report["blocked"]:
+                st.warning(f"{report['failed']} failed after {report['retried']} retries and {report['blocked']} were blocked. "
+                           "Choose \"Retry failed summaries\" to try the failed ones again.")
+
+        summaries = get_patient_summaries(patient_ids) if patient_ids else []
+        if summaries:
+            st.dataframe(summaries, use_container_width=True, hide_index=True)
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=list(summaries[0].keys()))
+            writer.writeheader()
+            writer.writerows(summaries)
+            st.download_button("📥 Download summaries (CSV)", data=buffer.getvalue(), file_name="patient_summaries.csv",
+                               mime="text/csv", key="batch_summary_download")
@@ -1,17 +1,44 @@
+import time
 import streamlit as st
-from services.database_service import execute_sql_query, fetch_all_drug_names
+from services.database_service import run_named_query
+from services.drug_search import search_drugs, DRUG_SEARCH_LIMIT
 
 def show_quick_drug_search_page():
     st.markdown("### 🔍 Quick Drug Search")
 
-    # Auto-suggest dropdown
-    drug_names = fetch_all_drug_names()
-    selected_drug = st.selectbox("Type or select drug name", drug_names)
+    # Ranked full-text search: brand or generic name, supplier, formulation or strength, typos allowed
+    search_term = st.text_input(
+        "Search drugs",
+        placeholder="e.g. lipitor, amox 250, atorvastatin, PharmaCorp",
+        key="quick_drug_search_term"
+    )
+    if not search_term.strip():
+        st.caption("Start typing a drug, generic name, supplier or strength and press Enter.")
+        return
 
-    if selected_drug:
-        query = f"SELECT * FROM PHARMACY_INVENTORY WHERE DRUG_NAME = '{selected_drug}'"
-        result, columns = execute_sql_query(query)
-        if result:
+    start = time.perf_counter()
+    matches, _ = search_drugs(search_term, limit=DRUG_SEARCH_LIMIT)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if isinstance(matches, str):
+        st.error(matches)
+        return
+    if not matches:
+        st.warning("No drug matches that search.")
+        return
+
+    st.caption(f"Top {len(matches)} matches in {elapsed_ms:.1f} ms")
+    labels = {
+        f"{name} — {generic or '?'}, {dosage or ''} {formulation or ''} ({supplier or 'unknown supplier'})"
+        + (" · similar spelling" if match_type == "fuzzy" else ""): drug_id
+        for drug_id, name, generic, formulation, dosage, supplier, _, _, match_type in matches
+    }
+    selected_label = st.radio("Matches", list(labels.keys()), key="quick_drug_search_match")
+
+    if selected_label:
+        result, columns = run_named_query("drug_by_id", drug_id=labels[selected_label])
+        if isinstance(result, str):
+            st.error(result)
+        elif result:
             st.table([dict(zip(columns, row)) for row in result])
         else:
-            st.warning("No drug found with that name.")
+            st.warning("That drug is no longer in the inventory.")
@@ -3,8 +3,7 @@ import bcrypt
 import random
 import time
 import os
-
-DATABASE_FILE = os.path.join('data', 'pharmacy_db.db')
+from services.db_connection import DATABASE_FILE, get_connection
 
 # In-memory OTP store (for demo purposes only)
 otp_store = {}
@@ -48,38 +47,33 @@ def verify_otp(username, entered_otp, expiry_seconds=300):
 
 def add_user(username, password, role='Pharmacist'):
     """Adds a new user to the database with a specific role."""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            cursor = conn.cursor()
 
-        # Check if username already exists
-        cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            return False  # Username already exists
+            # Check if username already exists
+            cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
+            if cursor.fetchone():
+                return False  # Username already exists
 
-        hashed_password = hash_password(password)
-        cursor.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, hashed_password, role)
-        )
-        conn.commit()
-        return True
+            hashed_password = hash_password(password)
+            cursor.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                (username, hashed_password, role)
+            )
+            conn.commit()
+            return True
     except sqlite3.Error as e:
         print(f"Database error during add_user: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
 def verify_user(username, password):
     """Verifies user credentials and stores role if valid."""
-    conn = None
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT password, role FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT password, role FROM users WHERE username = ?", (username,))
+            result = cursor.fetchone()
         if result:
             hashed_password, role = result
             if verify_password(password, hashed_password):
@@ -90,19 +84,14 @@ def verify_user(username, password):
     except sqlite3.Error as e:
         print(f"Database error during verify_user: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
             
 def get_user_role(username):
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT role FROM users WHERE username = ?", (username,))
-        result = cursor.fetchone()
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT role FROM users WHERE username = ?", (username,))
+            result = cursor.fetchone()
         return result[0] if result else None
     except Exception as e:
         print(f"Error fetching user role: {e}")
-        return None
-    finally:
-        conn.close()
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -1,7 +1,6 @@
 import os
-import sqlite3
 from datetime import datetime
-from fpdf import FPDF
+from services.db_connection import get_connection
 
 INVOICE_DB = "data/invoice_records.db"
 INVOICE_DIR = "data"
@@ -11,23 +10,22 @@ os.makedirs(INVOICE_DIR, exist_ok=True)
 
 def init_invoice_db():
     """Creates the invoice database and table if not exists."""
-    conn = sqlite3.connect(INVOICE_DB)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS invoices (
-            invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_name TEXT,
-            drug_name TEXT,
-            quantity INTEGER,
-            price_per_pack REAL,
-            gst_amount REAL,
-            total_amount REAL,
-            payment_mode TEXT,
-            timestamp TEXT
-        );
-    """)
-    conn.commit()
-    conn.close()
+    with get_connection(INVOICE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invoices (
+                invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                customer_name TEXT,
+                drug_name TEXT,
+                quantity INTEGER,
+                price_per_pack REAL,
+                gst_amount REAL,
+                total_amount REAL,
+                payment_mode TEXT,
+                timestamp TEXT
+            );
+        """)
+        conn.commit()
 
 
 def generate_invoice(customer_name, drug_name, quantity, price_per_pack, payment_mode):
@@ -40,15 +38,14 @@ def generate_invoice(customer_name, drug_name, quantity, price_per_pack, payment
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     # Save to DB
-    conn = sqlite3.connect(INVOICE_DB)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO invoices (customer_name, drug_name, quantity, price_per_pack, gst_amount, total_amount, payment_mode, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (customer_name, drug_name, quantity, price_per_pack, gst_amount, total_amount, payment_mode, timestamp))
-    invoice_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_connection(INVOICE_DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO invoices (customer_name, drug_name, quantity, price_per_pack, gst_amount, total_amount, payment_mode, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (customer_name, drug_name, quantity, price_per_pack, gst_amount, total_amount, payment_mode, timestamp))
+        invoice_id = cursor.lastrowid
+        conn.commit()
 
     # Generate PDF
     file_path = os.path.join(INVOICE_DIR, f"invoice_{invoice_id}.pdf")
@@ -59,6 +56,7 @@ def generate_invoice(customer_name, drug_name, quantity, price_per_pack, payment
 
 def create_invoice_pdf(invoice_id, customer_name, drug_name, quantity, price_per_pack, gst_amount, total_amount, payment_mode, timestamp, file_path):
     """Creates a simple GST invoice PDF."""
+    from fpdf import FPDF  # Imported here so startup (init_invoice_db) doesn't load fpdf
     pdf = FPDF()
     pdf.add_page()
 
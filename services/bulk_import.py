@@ -0,0 +1,253 @@
+# services/bulk_import.py
+import argparse
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from services.db_connection import get_connection
+from services.migrations import drop_secondary_indexes, rebuild_indexes
+
+IMPORT_CHUNK_ROWS = 50000  # Rows read, validated and committed per transaction
+REJECT_DIR = os.path.join("data", "import_rejects")
+
+# Column specs per importable table: (column, kind, required)
+# kind: "text", "real" (>= 0), "int" (>= 0), "date" (stored as 'YYYY-MM-DD'), "drug_id" (must exist)
+IMPORT_TABLES = {
+    "PHARMACY_INVENTORY": [
+        ("DRUG_NAME", "text", True),
+        ("GENERIC_NAME", "text", False),
+        ("FORMULATION", "text", False),
+        ("DOSAGE", "text", False),
+        ("PACK_SIZE", "text", False),
+        ("PRICE_PER_PACK", "real", False),
+        ("STOCK_QUANTITY", "int", False),
+        ("EXPIRY_DATE", "date", False),
+        ("SUPPLIER", "text", False),
+    ],
+    "DIAGNOSTIC_DATA": [
+        ("PATIENT_NAME", "text", True),
+        ("DIAGNOSIS", "text", False),
+        ("DIAGNOSIS_DATE", "date", False),
+        ("TEST_RESULTS", "text", False),
+        ("DRUG_ID_PRESCRIBED", "drug_id", False),
+    ],
+}
+
+
+def _json_array_chunks(source, chunk_rows):
+    """A JSON array of row objects, sliced into chunks. The array has to be parsed whole, unlike JSONL."""
+    frame = pd.read_json(source, orient="records", dtype=False, convert_dates=False)
+    for start in range(0, len(frame), chunk_rows):
+        yield frame.iloc[start:start + chunk_rows]
+
+
+def _read_chunks(source, file_format, chunk_rows):
+    """Yields DataFrames of raw (object dtype) values from a CSV, JSONL or JSON array path / file-like object."""
+    if file_format == "csv":
+        return pd.read_csv(source, dtype=object, chunksize=chunk_rows, skipinitialspace=True)
+    if file_format == "jsonl":
+        return pd.read_json(source, lines=True, dtype=False, chunksize=chunk_rows)
+    if file_format == "json":
+        return _json_array_chunks(source, chunk_rows)
+    raise ValueError(f"Unsupported import format '{file_format}'. Use 'csv', 'jsonl' or 'json'.")
+
+
+def detect_format(file_name):
+    """Maps a file name to 'csv', 'jsonl' (one object per line) or 'json' (an array of objects) by extension."""
+    extension = os.path.splitext(file_name.lower())[1]
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "json" if extension == ".json" else "csv"
+
+
+def _parse_dates(values):
+    """
+    Vectorized date parsing: ISO first, then NN/NN/YYYY (or with '-' / '.') by the same rule as the
+    database's date normalization (services/migrations.py): converted only when the day/month order is
+    clear, i.e. one part is 13-31 or both are equal. Anything else is parsed as written (e.g. with a time
+    part, or 31 Dec 2026). Returns (parsed dates, mask of ambiguous values such as 03/04/2026).
+    """
+    parsed = pd.to_datetime(values, errors="coerce", format="%Y-%m-%d")
+    parts = values.astype(str).str.strip().str.extract(r"^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$").astype(float)
+    first, second, year = parts[0], parts[1], parts[2]
+    two_part = values.notna() & first.notna()
+    day_first = second.between(1, 12) & (first.between(13, 31) | (first == second))
+    month_first = first.between(1, 12) & second.between(13, 31)
+    ambiguous = two_part & first.between(1, 12) & second.between(1, 12) & (first != second)
+    if two_part.any():
+        assembled = pd.DataFrame({
+            "year": year, "month": second.where(day_first, first), "day": first.where(day_first, second)
+        })[two_part & (day_first | month_first)]
+        parsed[two_part] = pd.NaT
+        if not assembled.empty:
+            parsed[assembled.index] = pd.to_datetime(assembled, errors="coerce")
+    retry = parsed.isna() & values.notna() & ~two_part
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed, ambiguous
+
+
+def _validate_chunk(chunk, table, known_drug_ids):
+    """
+    Coerces a raw chunk column by column. Returns (clean DataFrame of accepted rows, rejected rows
+    with a REJECT_REASON column).
+    """
+    chunk = chunk.rename(columns=lambda name: str(name).strip().upper())
+    reasons = pd.Series("", index=chunk.index, dtype=object)
+    clean = pd.DataFrame(index=chunk.index)
+
+    for column, kind, required in IMPORT_TABLES[table]:
+        if column in chunk.columns:
+            raw = chunk[column]
+        else:
+            raw = pd.Series(None, index=chunk.index, dtype=object)
+        is_text_dtype = raw.dtype == object or pd.api.types.is_string_dtype(raw.dtype)
+        if kind == "text":
+            if is_text_dtype:
+                # JSONL can mix numbers into a text column, so only str values are stripped and
+                # everything else is stringified as-is.
+                stripped = raw.str.strip()
+                non_str = stripped.isna() & raw.notna()
+                if non_str.any():
+                    stripped[non_str] = raw[non_str].astype(str)
+                raw = stripped.astype(object)
+            else:
+                raw = raw.astype(object).where(raw.notna(), None).map(lambda value: value if value is None else str(value))
+        if is_text_dtype or kind == "text":
+            raw = raw.mask(raw == "")  # Blank values count as missing
+
+        if kind == "text":
+            values = raw
+            invalid = pd.Series(False, index=chunk.index)
+        elif kind in ("real", "int", "drug_id"):
+            values = pd.to_numeric(raw, errors="coerce")
+            invalid = raw.notna() & (values.isna() | (values < 0))
+            if kind != "real":
+                invalid |= values.notna() & (values % 1 != 0)
+            if kind == "drug_id":
+                invalid |= values.notna() & ~values.isin(known_drug_ids)
+        else:  # date
+            parsed, ambiguous = _parse_dates(raw)
+            invalid = raw.notna() & parsed.isna() & ~ambiguous
+            if ambiguous.any():
+                reasons[ambiguous] += f"ambiguous {column}: day and month could be either way round, use YYYY-MM-DD; "
+            values = parsed.dt.strftime("%Y-%m-%d")
+
+        if required:
+            missing = raw.isna()
+            reasons[missing] += f"{column} is required; "
+        if invalid.any():
+            reasons[invalid] += f"invalid {column}; "
+
+        if kind in ("int", "drug_id"):
+            values = values.where(~invalid).astype("Int64")  # Invalid rows are rejected anyway
+        clean[column] = values
+
+    rejected_mask = reasons != ""
+    rejected = chunk[rejected_mask].copy()
+    rejected["REJECT_REASON"] = reasons[rejected_mask].str.rstrip("; ")
+    return clean[~rejected_mask], rejected
+
+
+def import_file(source, table, file_format="csv", reject_path=None, chunk_rows=IMPORT_CHUNK_ROWS,
+                progress_callback=None, defer_indexes=False):
+    """
+    Streams a CSV/JSONL/JSON file into PHARMACY_INVENTORY or DIAGNOSTIC_DATA.
+    Each chunk is validated in bulk and written with executemany() in its own transaction, so a failure
+    loses at most one chunk. Invalid rows go to reject_path (CSV with a REJECT_REASON column).
+    progress_callback(rows_read, rows_imported, rows_rejected) is called after every chunk.
+
+    defer_indexes drops the table's secondary indexes for the duration of the load and rebuilds them
+    afterwards (one sort per index instead of millions of random B-tree inserts). Lookups on that table
+    are unindexed while the load runs, so use it for onboarding-sized files.
+    Returns a summary dict.
+    """
+    table = table.upper()
+    if table not in IMPORT_TABLES:
+        raise ValueError(f"Unsupported import table '{table}'. Choose one of: {', '.join(IMPORT_TABLES)}.")
+
+    columns = [column for column, _, _ in IMPORT_TABLES[table]]
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)});"
+    if reject_path is None:
+        os.makedirs(REJECT_DIR, exist_ok=True)
+        reject_path = os.path.join(REJECT_DIR, f"{table.lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_rejects.csv")
+
+    summary = {"table": table, "rows_read": 0, "rows_imported": 0, "rows_rejected": 0, "reject_file": None}
+    start = time.perf_counter()
+
+    with get_connection() as conn:
+        known_drug_ids = set()
+        if table == "DIAGNOSTIC_DATA":
+            known_drug_ids = {row[0] for row in conn.execute("SELECT DRUG_ID FROM PHARMACY_INVENTORY;")}
+
+        deferred_indexes = drop_secondary_indexes(conn, table) if defer_indexes else []
+        try:
+            for chunk in _read_chunks(source, file_format, chunk_rows):
+                accepted, rejected = _validate_chunk(chunk, table, known_drug_ids)
+
+                # Column-wise conversion to Python values, with pandas NA/NaN as None so sqlite stores NULL
+                column_values = [
+                    accepted[column].astype(object).where(accepted[column].notna(), None).tolist()
+                    for column in columns
+                ]
+                rows = zip(*column_values)
+                try:
+                    conn.executemany(insert_sql, rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                if not rejected.empty:
+                    rejected.to_csv(reject_path, mode="a", index=False, header=summary["reject_file"] is None)
+                    summary["reject_file"] = reject_path
+
+                summary["rows_read"] += len(chunk)
+                summary["rows_imported"] += len(accepted)
+                summary["rows_rejected"] += len(rejected)
+                if progress_callback:
+                    progress_callback(summary["rows_read"], summary["rows_imported"], summary["rows_rejected"])
+        finally:
+            if deferred_indexes:
+                rebuild_indexes(conn, table, deferred_indexes)
+
+    summary["elapsed_s"] = time.perf_counter() - start
+    summary["rows_per_second"] = summary["rows_imported"] / summary["elapsed_s"] if summary["elapsed_s"] else 0.0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import drugs or diagnostic records from CSV, JSONL or a JSON array.")
+    parser.add_argument("table", choices=["inventory", "diagnostic"], help="Target table")
+    parser.add_argument("path", help="CSV, JSONL or JSON (array of objects) file to import")
+    parser.add_argument("--format", choices=["csv", "jsonl", "json"], help="Input format (default: from file extension)")
+    parser.add_argument("--reject-file", help="Where to write rejected rows (default: data/import_rejects/...)")
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS, help="Rows per chunk/transaction")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="Maintain indexes row by row instead of rebuilding them after the load")
+    args = parser.parse_args(argv)
+
+    from services.bootstrap import bootstrap_databases
+    bootstrap_databases()  # Make sure tables and migrations exist before importing
+
+    table = "PHARMACY_INVENTORY" if args.table == "inventory" else "DIAGNOSTIC_DATA"
+
+    def report(rows_read, rows_imported, rows_rejected):
+        print(f"  read {rows_read:,} | imported {rows_imported:,} | rejected {rows_rejected:,}", flush=True)
+
+    summary = import_file(
+        args.path, table, args.format or detect_format(args.path),
+        reject_path=args.reject_file, chunk_rows=args.chunk_rows, progress_callback=report,
+        defer_indexes=not args.keep_indexes
+    )
+    print(f"Imported {summary['rows_imported']:,} rows into {table} in {summary['elapsed_s']:.1f}s "
+          f"({summary['rows_per_second']:,.0f} rows/s); rejected {summary['rows_rejected']:,}.")
+    if summary["reject_file"]:
+        print(f"Rejected rows written to {summary['reject_file']}")
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.bulk_import inventory supplier_catalogue.csv
+    main()
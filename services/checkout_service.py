@@ -0,0 +1,97 @@
+# services/checkout_service.py
+import json
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+from services.database_service import NAMED_QUERIES
+from services.db_connection import CONNECTION_PRAGMAS, DATABASE_FILE, get_connection
+
+GST_RATE = 0.18
+CHECKOUT_MAX_ATTEMPTS = 8
+CHECKOUT_BUSY_TIMEOUT_MS = 250  # Short SQLite-level wait per attempt; the jittered retries below do the rest
+CHECKOUT_BACKOFF_BASE_S = 0.01
+CHECKOUT_BACKOFF_MAX_S = 0.5
+
+
+class OutOfStock(Exception):
+    """A cart line asked for more packs than are in stock (or the drug no longer exists)."""
+
+
+def _is_lock_error(error):
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def _merge_cart(items):
+    """One line per drug (quantities summed), in DRUG_ID order."""
+    merged = {}
+    for item in items:
+        line = merged.setdefault(item["drug_id"], dict(item, quantity=0))
+        line["quantity"] += int(item["quantity"])
+    return [merged[drug_id] for drug_id in sorted(merged)]
+
+
+def _checkout_once(conn, customer_name, payment_method, lines, gst_rate):
+    """One attempt: stock decrements and the invoice in a single BEGIN IMMEDIATE transaction."""
+    conn.execute("BEGIN IMMEDIATE;")  # Take the write lock up front: no other checkout can interleave
+    try:
+        for line in lines:
+            # Conditional decrement: affects no row when stock is short, so stock can never go negative
+            cursor = conn.execute(NAMED_QUERIES["decrement_stock"], {"drug_id": line["drug_id"], "quantity": line["quantity"]})
+            if cursor.rowcount == 0:
+                row = conn.execute("SELECT STOCK_QUANTITY FROM PHARMACY_INVENTORY WHERE DRUG_ID = ?;", (line["drug_id"],)).fetchone()
+                available = f"only {row[0]} in stock" if row else "no longer in the inventory"
+                raise OutOfStock(f"Not enough stock for {line['drug_name']}: {line['quantity']} requested, {available}.")
+
+        subtotal = round(sum(line["quantity"] * line["price_per_pack"] for line in lines), 2)
+        gst_amount = round(subtotal * gst_rate, 2)
+        invoice = {
+            "invoice_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "customer_name": customer_name,
+            "payment_method": payment_method,
+            "invoice_items_json": json.dumps(lines),  # INVOICE_LINES rows are derived from this by trigger
+            "subtotal": subtotal,
+            "gst_amount": gst_amount,
+            "grand_total": round(subtotal + gst_amount, 2),
+        }
+        invoice["invoice_id"] = conn.execute(NAMED_QUERIES["insert_invoice"], invoice).lastrowid
+        conn.commit()
+        return invoice
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def checkout(customer_name, payment_method, items, gst_rate=GST_RATE, db_file=DATABASE_FILE):
+    """
+    Sells a cart atomically: every line's stock is decremented and the invoice (header and lines) is
+    written in one transaction, or nothing is. items are dicts with drug_id, drug_name, quantity and
+    price_per_pack. Lock contention is retried with jittered exponential backoff.
+    Returns (invoice, None) where invoice includes invoice_id, subtotal, gst_amount, grand_total and
+    attempts, or (None, error message) when stock is short or the database stays busy.
+    """
+    lines = _merge_cart(items)
+    if not lines:
+        return None, "The cart is empty."
+
+    with get_connection(db_file) as conn:
+        conn.execute(f"PRAGMA busy_timeout = {CHECKOUT_BUSY_TIMEOUT_MS}")
+        try:
+            for attempt in range(1, CHECKOUT_MAX_ATTEMPTS + 1):
+                try:
+                    invoice = _checkout_once(conn, customer_name, payment_method, lines, gst_rate)
+                    invoice["attempts"] = attempt
+                    return invoice, None
+                except OutOfStock as e:
+                    return None, str(e)
+                except sqlite3.OperationalError as e:
+                    if not _is_lock_error(e) or attempt == CHECKOUT_MAX_ATTEMPTS:
+                        return None, f"Database Error: {e}"
+                    # Full jitter, so counters that collided don't retry in lockstep
+                    time.sleep(random.uniform(0, min(CHECKOUT_BACKOFF_MAX_S, CHECKOUT_BACKOFF_BASE_S * 2 ** attempt)))
+                except sqlite3.Error as e:
+                    return None, f"Database Error: {e}"
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {dict(CONNECTION_PRAGMAS)['busy_timeout']}")  # Back to the pool default
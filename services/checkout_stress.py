@@ -0,0 +1,146 @@
+# services/checkout_stress.py
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from services.checkout_service import checkout
+from services.db_connection import close_all_connections, get_connection
+
+STRESS_CUSTOMER = "__checkout_stress__"
+DEFAULT_COUNTERS = 16
+DEFAULT_HOT_DRUGS = 5
+DEFAULT_STOCK_PER_DRUG = 500
+DEFAULT_DURATION_S = 10.0
+
+
+def _prepare_database(source_db, work_db, hot_drugs, stock_per_drug):
+    """Copies source_db (or a fresh seeded database) to work_db and sets the hot drugs' stock. Returns their rows."""
+    if source_db:
+        with sqlite3.connect(source_db) as source, sqlite3.connect(work_db) as target:
+            source.backup(target)
+    from services.database_service import init_db
+    init_db(work_db)  # Seed rows for a fresh database; migrations for a copy
+    with get_connection(work_db) as conn:
+        drugs = conn.execute(
+            "SELECT DRUG_ID, DRUG_NAME, PRICE_PER_PACK FROM PHARMACY_INVENTORY ORDER BY DRUG_ID LIMIT ?;", (hot_drugs,)
+        ).fetchall()
+        conn.executemany("UPDATE PHARMACY_INVENTORY SET STOCK_QUANTITY = ? WHERE DRUG_ID = ?;",
+                         [(stock_per_drug, drug_id) for drug_id, _, _ in drugs])
+        conn.commit()
+    return drugs
+
+
+def _counter(work_db, drugs, deadline, seed, results):
+    """One checkout counter: random 1-3 line carts on the hot drugs, back to back, until the deadline."""
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        cart = [{"drug_id": drug_id, "drug_name": name, "quantity": rng.randint(1, 3), "price_per_pack": price or 0.0}
+                for drug_id, name, price in rng.sample(drugs, rng.randint(1, min(3, len(drugs))))]
+        start = time.perf_counter()
+        invoice, error = checkout(STRESS_CUSTOMER, "Cash", cart, db_file=work_db)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if invoice is not None:
+            results["sold"].append((elapsed_ms, invoice["attempts"], time.perf_counter()))
+        elif error.startswith("Not enough stock"):
+            results["out_of_stock"].append(elapsed_ms)
+        else:
+            results["errors"].append(error)
+
+
+def run_stress_test(source_db=None, counters=DEFAULT_COUNTERS, hot_drugs=DEFAULT_HOT_DRUGS,
+                    stock_per_drug=DEFAULT_STOCK_PER_DRUG, duration_s=DEFAULT_DURATION_S, seed=0):
+    """
+    Runs `counters` threads checking out carts of the same few drugs at once, on a scratch copy of
+    source_db (or of a fresh database), so the real data is never touched. Stock is deliberately small
+    enough to run out. Afterwards it checks that no drug went negative and that every pack missing from
+    stock is accounted for by exactly one INVOICE_LINES row. Returns a report dict ("ok" is the verdict).
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_db = os.path.join(work_dir, "checkout_stress.db")
+        drugs = _prepare_database(source_db, work_db, hot_drugs, stock_per_drug)
+        results = {"sold": [], "out_of_stock": [], "errors": []}  # list.append is thread-safe
+        deadline = time.perf_counter() + duration_s
+        threads = [threading.Thread(target=_counter, args=(work_db, drugs, deadline, seed + n, results))
+                   for n in range(counters)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_s = time.perf_counter() - start
+
+        drug_ids = [drug_id for drug_id, _, _ in drugs]
+        placeholders = ", ".join("?" * len(drug_ids))
+        with get_connection(work_db) as conn:
+            stock = dict(conn.execute(
+                f"SELECT DRUG_ID, STOCK_QUANTITY FROM PHARMACY_INVENTORY WHERE DRUG_ID IN ({placeholders});", drug_ids))
+            sold = dict(conn.execute(f"""
+                SELECT L.drug_id, SUM(L.quantity) FROM INVOICE_LINES L JOIN INVOICES I ON I.invoice_id = L.invoice_id
+                WHERE I.customer_name = ? AND L.drug_id IN ({placeholders}) GROUP BY L.drug_id;
+            """, [STRESS_CUSTOMER] + drug_ids))
+            invoices = conn.execute("SELECT COUNT(*) FROM INVOICES WHERE customer_name = ?;", (STRESS_CUSTOMER,)).fetchone()[0]
+        close_all_connections()  # Release the scratch database before its directory is removed
+
+    per_drug = {
+        drug_id: {"final_stock": stock[drug_id], "sold": sold.get(drug_id, 0),
+                  "balanced": stock[drug_id] + sold.get(drug_id, 0) == stock_per_drug}
+        for drug_id in drug_ids
+    }
+    latencies = [elapsed_ms for elapsed_ms, _, _ in results["sold"]]
+    # Throughput up to the last sale: once the stock is gone, counters only collect refusals
+    selling_s = max((finished for _, _, finished in results["sold"]), default=start) - start
+    cut_points = statistics.quantiles(latencies, n=20) if len(latencies) >= 2 else latencies * 19
+    return {
+        "counters": counters,
+        "duration_s": elapsed_s,
+        "checkouts": len(results["sold"]),
+        "checkouts_per_s": len(results["sold"]) / selling_s if selling_s else 0.0,
+        "invoices_written": invoices,
+        "out_of_stock": len(results["out_of_stock"]),
+        "errors": len(results["errors"]),
+        "first_error": results["errors"][0] if results["errors"] else None,
+        "retried_checkouts": sum(1 for _, attempts, _ in results["sold"] if attempts > 1),
+        "p50_ms": cut_points[9] if cut_points else None,
+        "p95_ms": cut_points[18] if cut_points else None,
+        "per_drug": per_drug,
+        "oversold": any(entry["final_stock"] < 0 for entry in per_drug.values()),
+        "ok": invoices == len(results["sold"]) and all(entry["balanced"] and entry["final_stock"] >= 0
+                                                      for entry in per_drug.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent checkout stress test (runs on a scratch copy of the database).")
+    parser.add_argument("--db", help="Database to copy (default: a fresh seeded database)")
+    parser.add_argument("--counters", type=int, default=DEFAULT_COUNTERS, help="Simultaneous checkout counters (threads)")
+    parser.add_argument("--drugs", type=int, default=DEFAULT_HOT_DRUGS, help="Number of drugs every counter sells")
+    parser.add_argument("--stock", type=int, default=DEFAULT_STOCK_PER_DRUG, help="Starting stock per drug")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_S, help="Seconds to run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    report = run_stress_test(args.db, args.counters, args.drugs, args.stock, args.duration, args.seed)
+    print(f"{report['counters']} counters, {report['duration_s']:.1f}s: {report['checkouts']:,} checkouts "
+          f"({report['checkouts_per_s']:,.0f}/s), {report['out_of_stock']:,} refused for stock, {report['errors']} errors")
+    if report["p50_ms"] is not None:
+        print(f"latency p50 {report['p50_ms']:.2f} ms, p95 {report['p95_ms']:.2f} ms; "
+              f"{report['retried_checkouts']:,} checkouts needed a retry")
+    for drug_id, entry in report["per_drug"].items():
+        print(f"  drug {drug_id}: sold {entry['sold']:,}, left {entry['final_stock']:,}"
+              + ("" if entry["balanced"] else "  MISMATCH"))
+    if report["first_error"]:
+        print(f"first error: {report['first_error']}")
+    print("OK: no oversell, stock and invoice lines balance" if report["ok"] else "FAILED: stock and invoices disagree")
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.checkout_stress --counters 32 --duration 20 [--db data/pharmacy_db.db]
+    main()
@@ -1,142 +1,410 @@
 # services/database_service.py
 import sqlite3
 import os
+import re
+from services.db_connection import DATABASE_FILE, get_connection, get_read_connection
+from services.db_snapshot import get_analytics_connection
+from services.migrations import apply_migrations
+from services.query_cache import cached_select
+from services.query_limits import time_limited, QueryCancelled
 
-DATABASE_FILE = os.path.join('data', 'pharmacy_db.db')
-
-def init_db():
-    """Initializes the SQLite database, creates tables, and inserts sample data if they don't exist."""
-    os.makedirs('data', exist_ok=True) # Ensure data directory exists
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-
-    # Create users table
-     # Create users table with role support
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL
-        );
-    """)
-
-    # Create PHARMACY_INVENTORY table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS PHARMACY_INVENTORY (
-            DRUG_ID INTEGER PRIMARY KEY AUTOINCREMENT,
-            DRUG_NAME VARCHAR(255) NOT NULL,
-            GENERIC_NAME VARCHAR(255),
-            FORMULATION VARCHAR(100),
-            DOSAGE VARCHAR(100),
-            PACK_SIZE VARCHAR(100),
-            PRICE_PER_PACK REAL,
-            STOCK_QUANTITY INT,
-            EXPIRY_DATE DATE,
-            SUPPLIER VARCHAR(255)
-        );
-    """)
-
-    # Create DIAGNOSTIC_DATA table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS DIAGNOSTIC_DATA (
-            PATIENT_ID INTEGER PRIMARY KEY AUTOINCREMENT,
-            PATIENT_NAME VARCHAR(255) NOT NULL,
-            DIAGNOSIS VARCHAR(255),
-            DIAGNOSIS_DATE DATE,
-            TEST_RESULTS TEXT,
-            DRUG_ID_PRESCRIBED INTEGER,
-            FOREIGN KEY (DRUG_ID_PRESCRIBED) REFERENCES PHARMACY_INVENTORY(DRUG_ID)
-        );
-    """)
-
-    # Insert sample data into PHARMACY_INVENTORY if table is empty
-    cursor.execute("SELECT COUNT(*) FROM PHARMACY_INVENTORY;")
-    if cursor.fetchone()[0] == 0:
-        sample_drugs = [
-            ('Lipitor', 'Atorvastatin', 'Tablet', '20mg', '30 tabs', 15.75, 120, '2025-12-31', 'PharmaCorp'),
-            ('Amoxil', 'Amoxicillin', 'Capsule', '250mg', '20 caps', 8.20, 200, '2026-06-15', 'MediSupply'),
-            ('Ventolin', 'Salbutamol', 'Inhaler', '100mcg/puff', '1 inhaler', 25.00, 80, '2025-10-01', 'RespiraLabs'),
-            ('Metformin', 'Metformin', 'Tablet', '500mg', '60 tabs', 5.50, 50, '2026-03-20', 'GenericMeds'),
-            ('Zoloft', 'Sertraline', 'Tablet', '50mg', '30 tabs', 30.00, 30, '2025-09-01', 'NeuroPharma'),
-            ('Ibuprofen', 'Ibuprofen', 'Tablet', '200mg', '50 tabs', 3.00, 150, '2027-01-01', 'GenericMeds')
-        ]
-        cursor.executemany("""
-            INSERT INTO PHARMACY_INVENTORY (DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, PACK_SIZE, PRICE_PER_PACK, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
-        """, sample_drugs)
-        conn.commit()
-
-    # Insert sample data into DIAGNOSTIC_DATA if table is empty
-    cursor.execute("SELECT COUNT(*) FROM DIAGNOSTIC_DATA;")
-    if cursor.fetchone()[0] == 0:
-        sample_diagnoses = [
-            ('Alice Smith', 'Hypertension', '2023-01-10', 'BP consistently high', 1), # Lipitor
-            ('Bob Johnson', 'Asthma', '2023-03-22', 'Wheezing, shortness of breath', 3), # Ventolin
-            ('Charlie Brown', 'Diabetes Type 2', '2023-05-01', 'High blood sugar levels', 4), # Metformin
-            ('Diana Prince', 'Anxiety Disorder', '2023-07-15', 'Persistent worry, panic attacks', 5), # Zoloft
-            ('Eve Adams', 'Common Cold', '2024-01-05', 'Runny nose, sore throat', 6), # Ibuprofen
-            ('Frank White', 'Hypertension', '2024-02-20', 'Follow-up, BP stable', 1), # Lipitor
-            ('Grace Lee', 'Diabetes Type 2', '2024-03-10', 'HbA1c elevated', 4), # Metformin
-            ('Henry King', 'Migraine', '2024-04-01', 'Severe headache, light sensitivity', None) # No drug prescribed
-        ]
-        cursor.executemany("""
-            INSERT INTO DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE, TEST_RESULTS, DRUG_ID_PRESCRIBED)
-            VALUES (?, ?, ?, ?, ?);
-        """, sample_diagnoses)
-        conn.commit()
-
-    conn.close()
-
-def execute_sql_query(query):
-    """Executes a given SQL query and returns results or status."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
+def init_db(db_file=DATABASE_FILE):
+    """Initializes the SQLite database, creates tables, inserts sample data if they don't exist and applies pending migrations."""
+    os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True) # Ensure data directory exists
+    with get_connection(db_file) as conn:
         cursor = conn.cursor()
 
-        # For DML statements (INSERT, UPDATE, DELETE)
-        if query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
-            cursor.execute(query)
+        # Create users table
+         # Create users table with role support
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL
+            );
+        """)
+
+        # Create PHARMACY_INVENTORY table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS PHARMACY_INVENTORY (
+                DRUG_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                DRUG_NAME VARCHAR(255) NOT NULL,
+                GENERIC_NAME VARCHAR(255),
+                FORMULATION VARCHAR(100),
+                DOSAGE VARCHAR(100),
+                PACK_SIZE VARCHAR(100),
+                PRICE_PER_PACK REAL,
+                STOCK_QUANTITY INT,
+                EXPIRY_DATE DATE,
+                SUPPLIER VARCHAR(255)
+            );
+        """)
+
+        # Create DIAGNOSTIC_DATA table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS DIAGNOSTIC_DATA (
+                PATIENT_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                PATIENT_NAME VARCHAR(255) NOT NULL,
+                DIAGNOSIS VARCHAR(255),
+                DIAGNOSIS_DATE DATE,
+                TEST_RESULTS TEXT,
+                DRUG_ID_PRESCRIBED INTEGER,
+                FOREIGN KEY (DRUG_ID_PRESCRIBED) REFERENCES PHARMACY_INVENTORY(DRUG_ID)
+            );
+        """)
+
+        # Insert sample data into PHARMACY_INVENTORY if table is empty
+        cursor.execute("SELECT COUNT(*) FROM PHARMACY_INVENTORY;")
+        if cursor.fetchone()[0] == 0:
+            sample_drugs = [
+                ('Lipitor', 'Atorvastatin', 'Tablet', '20mg', '30 tabs', 15.75, 120, '2025-12-31', 'PharmaCorp'),
+                ('Amoxil', 'Amoxicillin', 'Capsule', '250mg', '20 caps', 8.20, 200, '2026-06-15', 'MediSupply'),
+                ('Ventolin', 'Salbutamol', 'Inhaler', '100mcg/puff', '1 inhaler', 25.00, 80, '2025-10-01', 'RespiraLabs'),
+                ('Metformin', 'Metformin', 'Tablet', '500mg', '60 tabs', 5.50, 50, '2026-03-20', 'GenericMeds'),
+                ('Zoloft', 'Sertraline', 'Tablet', '50mg', '30 tabs', 30.00, 30, '2025-09-01', 'NeuroPharma'),
+                ('Ibuprofen', 'Ibuprofen', 'Tablet', '200mg', '50 tabs', 3.00, 150, '2027-01-01', 'GenericMeds')
+            ]
+            cursor.executemany("""
+                INSERT INTO PHARMACY_INVENTORY (DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, PACK_SIZE, PRICE_PER_PACK, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """, sample_drugs)
             conn.commit()
-            return f"Query executed successfully. Rows affected: {cursor.rowcount}", None
-        # For DDL statements (CREATE, DROP, ALTER) - though LLM should not generate these
-        elif query.strip().upper().startswith(("CREATE", "DROP", "ALTER")):
-            cursor.execute(query)
+
+        # Insert sample data into DIAGNOSTIC_DATA if table is empty
+        cursor.execute("SELECT COUNT(*) FROM DIAGNOSTIC_DATA;")
+        if cursor.fetchone()[0] == 0:
+            sample_diagnoses = [
+                ('Alice Smith', 'Hypertension', '2023-01-10', 'BP consistently high', 1), # Lipitor
+                ('Bob Johnson', 'Asthma', '2023-03-22', 'Wheezing, shortness of breath', 3), # Ventolin
+                ('Charlie Brown', 'Diabetes Type 2', '2023-05-01', 'High blood sugar levels', 4), # Metformin
+                ('Diana Prince', 'Anxiety Disorder', '2023-07-15', 'Persistent worry, panic attacks', 5), # Zoloft
+                ('Eve Adams', 'Common Cold', '2024-01-05', 'Runny nose, sore throat', 6), # Ibuprofen
+                ('Frank White', 'Hypertension', '2024-02-20', 'Follow-up, BP stable', 1), # Lipitor
+                ('Grace Lee', 'Diabetes Type 2', '2024-03-10', 'HbA1c elevated', 4), # Metformin
+                ('Henry King', 'Migraine', '2024-04-01', 'Severe headache, light sensitivity', None) # No drug prescribed
+            ]
+            cursor.executemany("""
+                INSERT INTO DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE, TEST_RESULTS, DRUG_ID_PRESCRIBED)
+                VALUES (?, ?, ?, ?, ?);
+            """, sample_diagnoses)
             conn.commit()
-            return "DDL query executed successfully.", None
-        # For SELECT statements
-        else:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            return rows, columns
+
+        # Bring older databases up to date (indexes, normalized dates, INVOICES table)
+        apply_migrations(conn)
+
+def execute_sql_query(query, params=(), timeout_ms=None, cancel_event=None):
+    """
+    Executes a given SQL query and returns results or status.
+    Values should be passed in params (a sequence for ? placeholders, a dict for :name placeholders)
+    rather than formatted into the SQL, so quotes in user input can't break the statement.
+    timeout_ms / cancel_event abort the statement (see query_limits.time_limited); the status is then
+    "Query cancelled after N ms ...". SELECTs run on the read-only pool.
+    """
+    connect = get_read_connection if is_select_query(query) else get_connection
+    try:
+        with connect() as conn, time_limited(conn, query, timeout_ms, cancel_event):
+            cursor = conn.cursor()
+
+            # For DML statements (INSERT, UPDATE, DELETE)
+            if query.strip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+                cursor.execute(query, params)
+                conn.commit()
+                return f"Query executed successfully. Rows affected: {cursor.rowcount}", None
+            # For DDL statements (CREATE, DROP, ALTER) - though LLM should not generate these
+            elif query.strip().upper().startswith(("CREATE", "DROP", "ALTER")):
+                cursor.execute(query, params)
+                conn.commit()
+                return "DDL query executed successfully.", None
+            # For SELECT statements
+            else:
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                columns = [description[0] for description in cursor.description]
+                return rows, columns
+    except QueryCancelled as e:
+        return str(e), None
     except sqlite3.Error as e:
         return f"Database Error: {e}", None
     except Exception as e:
         return f"An unexpected error occurred: {e}", None
-    finally:
-        if conn:
-            conn.close()
+
+# --- Named, parameterized queries used by the pages ---
+# The SQL text of each entry never changes, only the bound values do, so every call after the first
+# is a hit in the connection's prepared-statement cache (see STATEMENT_CACHE_SIZE in db_connection).
+NAMED_QUERIES = {
+    "drug_by_name": """
+        SELECT * FROM PHARMACY_INVENTORY WHERE DRUG_NAME = :drug_name;
+    """,
+    "drug_by_id": """
+        SELECT * FROM PHARMACY_INVENTORY WHERE DRUG_ID = :drug_id;
+    """,
+    "insert_drug": """
+        INSERT INTO PHARMACY_INVENTORY (DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, PACK_SIZE, PRICE_PER_PACK, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER)
+        VALUES (:drug_name, :generic_name, :formulation, :dosage, :pack_size, :price_per_pack, :stock_quantity, :expiry_date, :supplier);
+    """,
+    "insert_diagnostic": """
+        INSERT INTO DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE, TEST_RESULTS, DRUG_ID_PRESCRIBED)
+        VALUES (:patient_name, :diagnosis, :diagnosis_date, :test_results, :drug_id_prescribed);
+    """,
+    "delete_drug": """
+        DELETE FROM PHARMACY_INVENTORY WHERE DRUG_ID = :record_id;
+    """,
+    "delete_diagnostic": """
+        DELETE FROM DIAGNOSTIC_DATA WHERE PATIENT_ID = :record_id;
+    """,
+    "drug_name_list": """
+        SELECT DRUG_NAME FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME ASC;
+    """,
+    "drug_select_list": """
+        SELECT DRUG_ID, DRUG_NAME FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME ASC;
+    """,
+    "drug_price_list": """
+        SELECT DRUG_ID, DRUG_NAME, PRICE_PER_PACK FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME;
+    """,
+    "patient_select_list": """
+        SELECT PATIENT_ID, PATIENT_NAME FROM DIAGNOSTIC_DATA ORDER BY PATIENT_NAME ASC;
+    """,
+    "inventory_alert_items": """
+        SELECT PI.DRUG_NAME, PI.STOCK_QUANTITY, PI.EXPIRY_DATE, PI.SUPPLIER,
+               LS.LOW_STOCK_BELOW, ES.EXPIRY_WITHIN_DAYS
+        FROM (SELECT DRUG_ID FROM LOW_STOCK UNION SELECT DRUG_ID FROM EXPIRING_SOON) AS ALERT
+        JOIN PHARMACY_INVENTORY AS PI ON PI.DRUG_ID = ALERT.DRUG_ID
+        LEFT JOIN LOW_STOCK AS LS ON LS.DRUG_ID = ALERT.DRUG_ID
+        LEFT JOIN EXPIRING_SOON AS ES ON ES.DRUG_ID = ALERT.DRUG_ID
+        ORDER BY PI.EXPIRY_DATE ASC, PI.STOCK_QUANTITY ASC;
+    """,
+    "inventory_alert_counts": """
+        SELECT (SELECT COUNT(*) FROM LOW_STOCK) AS LOW_STOCK,
+               (SELECT COUNT(*) FROM EXPIRING_SOON) AS EXPIRING_SOON,
+               (SELECT COUNT(*) FROM EXPIRING_SOON
+                WHERE EXPIRY_DATE < date('now', 'localtime') AND EXPIRY_DATE GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]') AS EXPIRED;
+    """,
+    "alert_threshold_list": """
+        SELECT SCOPE, SCOPE_KEY, LOW_STOCK_BELOW, EXPIRY_WITHIN_DAYS
+        FROM INVENTORY_ALERT_THRESHOLDS
+        ORDER BY CASE SCOPE WHEN 'DEFAULT' THEN 0 WHEN 'FORMULATION' THEN 1 ELSE 2 END, SCOPE_KEY;
+    """,
+    "upsert_alert_threshold": """
+        INSERT INTO INVENTORY_ALERT_THRESHOLDS (SCOPE, SCOPE_KEY, LOW_STOCK_BELOW, EXPIRY_WITHIN_DAYS)
+        VALUES (:scope, :scope_key, :low_stock_below, :expiry_within_days)
+        ON CONFLICT (SCOPE, SCOPE_KEY) DO UPDATE SET
+            LOW_STOCK_BELOW = excluded.LOW_STOCK_BELOW, EXPIRY_WITHIN_DAYS = excluded.EXPIRY_WITHIN_DAYS;
+    """,
+    "delete_alert_threshold": """
+        DELETE FROM INVENTORY_ALERT_THRESHOLDS WHERE SCOPE = :scope AND SCOPE_KEY = :scope_key AND SCOPE <> 'DEFAULT';
+    """,
+    "decrement_stock": """
+        UPDATE PHARMACY_INVENTORY SET STOCK_QUANTITY = STOCK_QUANTITY - :quantity
+        WHERE DRUG_ID = :drug_id AND STOCK_QUANTITY >= :quantity;
+    """,
+    "insert_invoice": """
+        INSERT INTO INVOICES (invoice_date, customer_name, payment_method, invoice_items_json, subtotal, gst_amount, grand_total)
+        VALUES (:invoice_date, :customer_name, :payment_method, :invoice_items_json, :subtotal, :gst_amount, :grand_total);
+    """,
+    "sales_by_drug": """
+        SELECT drug_id, MAX(drug_name) AS drug_name, SUM(quantity) AS units_sold, SUM(line_total) AS revenue
+        FROM INVOICE_LINES
+        WHERE invoice_date >= :date_from AND invoice_date < :date_to
+        GROUP BY drug_id
+        ORDER BY revenue DESC;
+    """,
+    "patient_history": """
+        SELECT
+            DD.PATIENT_NAME,
+            DD.DIAGNOSIS,
+            DD.DIAGNOSIS_DATE,
+            DD.TEST_RESULTS,
+            PI.DRUG_NAME,
+            PI.DOSAGE
+        FROM DIAGNOSTIC_DATA AS DD
+        LEFT JOIN PHARMACY_INVENTORY AS PI ON DD.DRUG_ID_PRESCRIBED = PI.DRUG_ID
+        WHERE DD.PATIENT_ID = :patient_id
+        ORDER BY DD.DIAGNOSIS_DATE ASC;
+    """,
+    # Batch summaries: every selected patient's history in one statement; :patient_ids is a JSON array
+    "patient_history_batch": """
+        SELECT
+            DD.PATIENT_ID,
+            DD.PATIENT_NAME,
+            DD.DIAGNOSIS,
+            DD.DIAGNOSIS_DATE,
+            DD.TEST_RESULTS,
+            PI.DRUG_NAME,
+            PI.DOSAGE
+        FROM DIAGNOSTIC_DATA AS DD
+        LEFT JOIN PHARMACY_INVENTORY AS PI ON DD.DRUG_ID_PRESCRIBED = PI.DRUG_ID
+        WHERE DD.PATIENT_ID IN (SELECT value FROM json_each(:patient_ids))
+        ORDER BY DD.PATIENT_ID, DD.DIAGNOSIS_DATE ASC;
+    """,
+    "patient_ids_by_diagnosis": """
+        SELECT PATIENT_ID FROM DIAGNOSTIC_DATA WHERE DIAGNOSIS = :diagnosis ORDER BY PATIENT_ID;
+    """,
+    "diagnosis_list": """
+        SELECT DISTINCT DIAGNOSIS FROM DIAGNOSTIC_DATA WHERE DIAGNOSIS IS NOT NULL ORDER BY DIAGNOSIS ASC;
+    """,
+}
+
+def run_named_query(name, **params):
+    """
+    Runs one of NAMED_QUERIES with keyword parameters, e.g. run_named_query("drug_by_name", drug_name="Lipitor").
+    Returns the same (rows, columns) / (status, None) pair as execute_sql_query.
+    """
+    query = NAMED_QUERIES.get(name)
+    if query is None:
+        return f"An unexpected error occurred: unknown named query '{name}'", None
+    missing = set(re.findall(r":(\w+)", query)) - set(params)
+    if missing:
+        return f"An unexpected error occurred: missing parameters for '{name}': {', '.join(sorted(missing))}", None
+    return execute_sql_query(query, params)
 
 def get_all_drugs_for_select():
-    """Fetches all drug IDs and names for select boxes."""
-    query = "SELECT DRUG_ID, DRUG_NAME FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME ASC;"
-    return execute_sql_query(query)
+    """Fetches all drug IDs and names for select boxes (served from the query cache)."""
+    try:
+        return cached_select(NAMED_QUERIES["drug_select_list"])
+    except sqlite3.Error as e:
+        return f"Database Error: {e}", None
 
 def fetch_all_patient_names_and_ids():
-    """Fetches all patient IDs and names for select boxes."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT PATIENT_ID, PATIENT_NAME FROM DIAGNOSTIC_DATA ORDER BY PATIENT_NAME ASC")
-    rows = cursor.fetchall()
-    conn.close()
+    """Fetches all patient IDs and names for select boxes (served from the query cache)."""
+    rows, _ = cached_select(NAMED_QUERIES["patient_select_list"])
     return rows
 
+def fetch_all_diagnoses():
+    """Distinct diagnoses for select boxes (served from the query cache)."""
+    rows, _ = cached_select(NAMED_QUERIES["diagnosis_list"])
+    return [row[0] for row in rows]
+
 def fetch_all_drug_names():
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DRUG_NAME FROM PHARMACY_INVENTORY ORDER BY DRUG_NAME ASC")
-    rows = cursor.fetchall()
-    conn.close()
-    return [row[0] for row in rows]
\ No newline at end of file
+    rows, _ = cached_select(NAMED_QUERIES["drug_name_list"])
+    return [row[0] for row in rows]
+
+# --- Streaming / paginated reads for large result sets ---
+
+DEFAULT_FETCH_BATCH = 500  # Rows pulled per fetchmany() call
+MAX_RESULT_ROWS = 5000  # Hard cap on rows a page may hold in memory for one result
+
+# Primary key per table, used for keyset pagination of single-table SELECTs
+TABLE_KEY_COLUMNS = {
+    "PHARMACY_INVENTORY": "DRUG_ID",
+    "DIAGNOSTIC_DATA": "PATIENT_ID",
+    "INVOICES": "invoice_id",
+    "USERS": "id",
+}
+
+def is_select_query(query):
+    """True for read-only statements (SELECT / WITH ... SELECT)."""
+    return query.strip().upper().startswith(("SELECT", "WITH"))
+
+def _strip_statement(query):
+    return query.strip().rstrip(";").strip()
+
+def _read_connection(analytics=False):
+    """Read-only pooled connection, or the analytics snapshot (see db_snapshot) for heavy reports."""
+    return get_analytics_connection() if analytics else get_read_connection()
+
+def stream_query_rows(query, params=(), batch_size=DEFAULT_FETCH_BATCH, max_rows=MAX_RESULT_ROWS,
+                      timeout_ms=None, cancel_event=None, analytics=False):
+    """
+    Yields (columns, rows) batches from a SELECT using fetchmany(), stopping after max_rows
+    (None = no cap). The connection stays checked out until the generator is exhausted or closed,
+    so consume it on the thread that created it. Raises QueryCancelled when the budget runs out.
+    """
+    with _read_connection(analytics) as conn, time_limited(conn, query, timeout_ms, cancel_event):
+        cursor = conn.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        remaining = max_rows
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            rows = cursor.fetchmany(size)
+            if not rows:
+                break
+            if remaining is not None:
+                remaining -= len(rows)
+            yield columns, rows
+        cursor.close()
+
+def fetch_capped_rows(query, params=(), max_rows=MAX_RESULT_ROWS, timeout_ms=None, cancel_event=None, analytics=False):
+    """Collects at most max_rows rows from a SELECT. Returns (rows, columns) like execute_sql_query."""
+    try:
+        rows, columns = [], None
+        for columns, batch in stream_query_rows(query, params, max_rows=max_rows, timeout_ms=timeout_ms,
+                                                cancel_event=cancel_event, analytics=analytics):
+            rows.extend(batch)
+        if columns is None:
+            columns = get_query_columns(query, params, analytics=analytics)
+        return rows, columns
+    except QueryCancelled as e:
+        return str(e), None
+    except sqlite3.Error as e:
+        return f"Database Error: {e}", None
+
+def get_query_columns(query, params=(), analytics=False):
+    """Returns the result column names of a SELECT without fetching any rows."""
+    with _read_connection(analytics) as conn:
+        cursor = conn.execute(f"SELECT * FROM ({_strip_statement(query)}) LIMIT 0", params)
+        return [description[0] for description in cursor.description]
+
+def detect_key_column(query, columns):
+    """
+    Returns the primary key column to paginate on when the query reads a single table, has no
+    ORDER BY / GROUP BY / LIMIT of its own and returns that table's key. Otherwise None
+    (the caller falls back to LIMIT/OFFSET paging).
+    """
+    upper_query = query.upper()
+    if re.search(r"\b(JOIN|ORDER\s+BY|GROUP\s+BY|LIMIT|UNION)\b", upper_query):
+        return None
+    tables = re.findall(r"\bFROM\s+([A-Z_][A-Z0-9_]*)", upper_query)
+    if len(tables) != 1 or re.search(r"\bFROM\s+[A-Z_][A-Z0-9_]*(\s+(AS\s+)?[A-Z_][A-Z0-9_]*)?\s*,", upper_query):
+        return None
+    key_column = TABLE_KEY_COLUMNS.get(tables[0])
+    if key_column and columns.count(key_column) == 1:
+        return key_column
+    return None
+
+def fetch_query_page(query, params=(), page_size=100, key_column=None, after_key=None, offset=0,
+                     timeout_ms=None, cancel_event=None, analytics=False):
+    """
+    Fetches one page of a SELECT.
+    With key_column, uses keyset pagination (rows with key > after_key, ordered by key) so each page
+    costs the same regardless of depth; otherwise uses LIMIT/OFFSET.
+    Returns (rows, columns, has_more), or (error / cancellation message, None, False) on failure.
+    """
+    base_query = _strip_statement(query)
+    try:
+        with _read_connection(analytics) as conn, time_limited(conn, query, timeout_ms, cancel_event):
+            if key_column:
+                if after_key is None:
+                    paged_query = f'SELECT * FROM ({base_query}) ORDER BY "{key_column}" LIMIT ?'
+                    paged_params = tuple(params) + (page_size + 1,)
+                else:
+                    paged_query = f'SELECT * FROM ({base_query}) WHERE "{key_column}" > ? ORDER BY "{key_column}" LIMIT ?'
+                    paged_params = tuple(params) + (after_key, page_size + 1)
+            else:
+                paged_query = f"SELECT * FROM ({base_query}) LIMIT ? OFFSET ?"
+                paged_params = tuple(params) + (page_size + 1, offset)
+            cursor = conn.execute(paged_query, paged_params)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchmany(page_size + 1)
+        has_more = len(rows) > page_size
+        return rows[:page_size], columns, has_more
+    except QueryCancelled as e:
+        return str(e), None, False
+    except sqlite3.Error as e:
+        return f"Database Error: {e}", None, False
+
+def estimate_row_count(query, params=(), cap=MAX_RESULT_ROWS, timeout_ms=None, cancel_event=None, analytics=False):
+    """
+    Counts the rows a SELECT returns, stopping at cap so the estimate never costs more than
+    reading cap rows. Returns (count, is_exact); is_exact is False when there are more than cap rows
+    (count is None when the count failed or ran out of time).
+    """
+    try:
+        with _read_connection(analytics) as conn, time_limited(conn, query, timeout_ms, cancel_event):
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM ({_strip_statement(query)}) LIMIT ?)",
+                tuple(params) + (cap + 1,)
+            ).fetchone()[0]
+        return min(count, cap), count <= cap
+    except sqlite3.Error:
+        return None, False
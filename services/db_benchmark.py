@@ -0,0 +1,238 @@
+# services/db_benchmark.py
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from services.database_service import NAMED_QUERIES
+from services.db_connection import DATABASE_FILE, close_all_connections, get_connection, get_read_connection
+from services.diagnostic_search import run_diagnostic_search
+from services.drug_search import run_drug_search
+from services.migrations import get_schema_version
+
+BENCHMARK_FORMAT_VERSION = 1
+DEFAULT_RUNS = 50
+DEFAULT_REGRESSION_THRESHOLD = 0.20  # Flag a case whose p50 is more than 20% slower than the baseline
+BENCHMARK_CUSTOMER = "__benchmark__"  # Invoices written by the insert cases (on the scratch copy) are tagged
+REPORT_LOAD_QUERY = """
+    SELECT DD.DIAGNOSIS, PI.SUPPLIER, COUNT(*), AVG(PI.PRICE_PER_PACK), MAX(DD.DIAGNOSIS_DATE)
+    FROM DIAGNOSTIC_DATA DD LEFT JOIN PHARMACY_INVENTORY PI ON PI.DRUG_ID = DD.DRUG_ID_PRESCRIBED
+    GROUP BY DD.DIAGNOSIS, PI.SUPPLIER;
+"""  # A custom-report-sized aggregate over the whole of DIAGNOSTIC_DATA
+REPORT_LOAD_THREADS = 2
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _time_case(run, arguments):
+    """Calls run(args) once per entry in arguments and returns latency statistics in milliseconds."""
+    timings = []
+    rows = 0
+    for args in arguments:
+        start = time.perf_counter()
+        rows += run(args)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": _percentile(timings, 0.50),
+        "p95_ms": _percentile(timings, 0.95),
+        "max_ms": timings[-1],
+        "rows_per_run": rows / len(timings),
+    }
+
+
+def _select(conn, name):
+    """Runs a named query the way the pages do (full fetch) and returns the row count."""
+    sql = NAMED_QUERIES[name]
+    return lambda params: len(conn.execute(sql, params).fetchall())
+
+
+def _report_load(db_file, stop_event, completed):
+    """Runs REPORT_LOAD_QUERY back to back on the read-only pool until stop_event is set."""
+    with get_read_connection(db_file) as conn:
+        while not stop_event.is_set():
+            conn.execute(REPORT_LOAD_QUERY).fetchall()
+            completed.append(1)
+
+
+def run_benchmarks(db_file=DATABASE_FILE, runs=DEFAULT_RUNS, seed=0):
+    """
+    Times the app's real query paths against a scratch copy of db_file and returns a JSON-serialisable
+    report. Each case uses the page's own NAMED_QUERIES entry with parameters sampled from the data, and
+    fetches every row as the page would. The query cache is bypassed so the database itself is measured.
+    The insert cases write invoices, so they run on the copy: db_file's INVOICES AUTOINCREMENT counter
+    and INVOICE_LINES are never touched.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_db = os.path.join(work_dir, "benchmark.db")
+        with get_read_connection(db_file) as source, sqlite3.connect(work_db) as target:
+            source.backup(target)
+        try:
+            report = _run_cases(work_db, runs, seed)
+        finally:
+            close_all_connections()  # Release the scratch database before its directory is removed
+    return {**report, "db_file": db_file}
+
+
+def _run_cases(db_file, runs, seed):
+    """Runs every case against db_file (the scratch copy) and builds the report."""
+    rng = random.Random(seed)
+    cases = {}
+    with get_connection(db_file) as conn:
+        row_counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table};").fetchone()[0]
+            for table in ("PHARMACY_INVENTORY", "DIAGNOSTIC_DATA", "INVOICES", "INVOICE_LINES", "users")
+        }
+        drug_names = [row[0] for row in conn.execute(
+            "SELECT DRUG_NAME FROM PHARMACY_INVENTORY ORDER BY random() LIMIT ?;", (runs,))]
+        patient_ids = [row[0] for row in conn.execute(
+            "SELECT PATIENT_ID FROM DIAGNOSTIC_DATA ORDER BY random() LIMIT ?;", (runs,))]
+
+        # Quick Drug Search: name list for the select box, then the exact-name lookup
+        cases["quick_search_name_list"] = _time_case(_select(conn, "drug_name_list"), [{}] * runs)
+        cases["quick_search_lookup"] = _time_case(
+            _select(conn, "drug_by_name"), [{"drug_name": rng.choice(drug_names)} for _ in range(runs)])
+        # Quick Drug Search typeahead: ranked full-text search on the first letters of a name
+        cases["quick_search_fts"] = _time_case(
+            lambda term: len(run_drug_search(conn, term)), [rng.choice(drug_names)[:4] for _ in range(runs)])
+        # Patient Summary: patient picker, then the history JOIN for one patient
+        cases["patient_summary_picker"] = _time_case(_select(conn, "patient_select_list"), [{}] * runs)
+        cases["patient_summary_join"] = _time_case(
+            _select(conn, "patient_history"), [{"patient_id": rng.choice(patient_ids)} for _ in range(runs)])
+        # Diagnostic Notes Search: ranked full-text search on a word from a test result
+        result_words = [row[0].split()[0] for row in conn.execute(
+            "SELECT TEST_RESULTS FROM DIAGNOSTIC_DATA WHERE TEST_RESULTS <> '' ORDER BY random() LIMIT ?;", (runs,))]
+        if result_words:
+            cases["diagnostic_notes_search"] = _time_case(
+                lambda text: len(run_diagnostic_search(conn, text)),
+                [rng.choice(result_words) for _ in range(runs)])
+        # Inventory Insights: drugs in the trigger-maintained LOW_STOCK / EXPIRING_SOON tables
+        cases["inventory_insights_filter"] = _time_case(_select(conn, "inventory_alert_items"), [{}] * runs)
+        # Checkout / Billing: drug list with prices, then saving an invoice (one commit each)
+        cases["billing_drug_list"] = _time_case(_select(conn, "drug_price_list"), [{}] * runs)
+        # Sales by drug over the last year of invoices, from INVOICE_LINES
+        year_ago = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+        cases["sales_by_drug_year"] = _time_case(
+            _select(conn, "sales_by_drug"), [{"date_from": year_ago, "date_to": "9999-12-31"}] * runs)
+
+        def insert_invoice(params):
+            conn.execute(NAMED_QUERIES["insert_invoice"], params)
+            conn.commit()
+            return 1
+
+        invoice = {
+            "invoice_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "customer_name": BENCHMARK_CUSTOMER,
+            "payment_method": "Cash",
+            "invoice_items_json": json.dumps([{"drug_id": 1, "drug_name": "Lipitor", "quantity": 2, "price_per_pack": 15.75}]),
+            "subtotal": 31.5,
+            "gst_amount": 5.67,
+            "grand_total": 37.17,
+        }
+        try:
+            cases["billing_invoice_insert"] = _time_case(insert_invoice, [invoice] * runs)
+
+            # The same inserts while doctors run heavy reports: these should stay close to the case above
+            stop_event, completed = threading.Event(), []
+            readers = [threading.Thread(target=_report_load, args=(db_file, stop_event, completed), daemon=True)
+                       for _ in range(REPORT_LOAD_THREADS)]
+            for reader in readers:
+                reader.start()
+            try:
+                time.sleep(0.05)  # Let the readers get into their first scan
+                cases["billing_invoice_insert_under_report_load"] = _time_case(insert_invoice, [invoice] * runs)
+            finally:
+                stop_event.set()
+                for reader in readers:
+                    reader.join()
+            cases["billing_invoice_insert_under_report_load"]["concurrent_reports"] = len(completed)
+        finally:
+            conn.execute("DELETE FROM INVOICES WHERE customer_name = ?;", (BENCHMARK_CUSTOMER,))
+            conn.commit()
+        schema_version = get_schema_version(conn)
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "db_file": db_file,
+        "schema_version": schema_version,
+        "sqlite_version": sqlite3.sqlite_version,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "runs_per_case": runs,
+        "row_counts": row_counts,
+        "cases": cases,
+    }
+
+
+def compare_reports(report, baseline, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """
+    Compares p50 latencies case by case. Returns a list of dicts
+    (case, baseline_p50_ms, p50_ms, change, regression) for cases present in both reports.
+    """
+    comparison = []
+    for case, result in report["cases"].items():
+        previous = baseline.get("cases", {}).get(case)
+        if not previous:
+            continue
+        change = (result["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"] if previous["p50_ms"] else 0.0
+        comparison.append({
+            "case": case,
+            "baseline_p50_ms": previous["p50_ms"],
+            "p50_ms": result["p50_ms"],
+            "change": change,
+            "regression": change > threshold,
+        })
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's query paths against a SQLite database.")
+    parser.add_argument("--db", default=DATABASE_FILE,
+                        help=f"Database to benchmark; it is copied first and never written (default: {DATABASE_FILE})")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Timed runs per case")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Relative p50 slowdown that counts as a regression (default: 0.20)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.db, runs=args.runs)
+    print(f"{args.db}: " + ", ".join(f"{table} {count:,}" for table, count in report["row_counts"].items()))
+    print(f"{'case':<42}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}  (ms)")
+    for case, result in report["cases"].items():
+        print(f"{case:<42}{result['mean_ms']:>10.3f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['max_ms']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        comparison = compare_reports(report, baseline, args.threshold)
+        print(f"\nAgainst {args.compare} ({baseline.get('timestamp', 'unknown date')}):")
+        for entry in comparison:
+            flag = "  REGRESSION" if entry["regression"] else ""
+            print(f"{entry['case']:<42}{entry['baseline_p50_ms']:>10.3f} -> {entry['p50_ms']:>8.3f} ms ({entry['change']:+.0%}){flag}")
+        if any(entry["regression"] for entry in comparison):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.db_benchmark --db data/bench_1m.db --output bench.json [--compare baseline.json]
+    main()
@@ -0,0 +1,132 @@
+# services/db_connection.py
+import os
+import pathlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE_FILE = os.path.join('data', 'pharmacy_db.db')
+
+# Pragmas applied once, when a pooled connection is first opened.
+# WAL lets readers keep going while a checkout is writing, and busy_timeout makes a
+# second writer wait for the lock instead of failing with "database is locked".
+CONNECTION_PRAGMAS = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),   # Safe with WAL; fsync only at checkpoints
+    ("cache_size", -16000),      # Negative = KiB, i.e. ~16 MB page cache per connection
+    ("mmap_size", 134217728),    # 128 MB memory-mapped reads
+    ("busy_timeout", 5000),      # ms to wait on a locked database
+    ("foreign_keys", "ON"),
+    ("temp_store", "MEMORY"),
+]
+
+# Pragmas for read-only pooled connections. query_only makes any write fail even if a statement
+# slips past the SELECT check, and these connections never take the write lock.
+READ_ONLY_PRAGMAS = [
+    ("query_only", "ON"),
+    ("cache_size", -16000),
+    ("mmap_size", 134217728),
+    ("busy_timeout", 5000),
+    ("temp_store", "MEMORY"),
+]
+
+MAX_IDLE_CONNECTIONS = 8  # Idle connections kept per database file (and again per read-only pool)
+STATEMENT_CACHE_SIZE = 256  # Prepared statements cached per connection
+
+_idle_connections = {}  # (db_file, read_only) -> list of idle sqlite3.Connection
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _open_connection(db_file):
+    """Opens a new connection and applies the tuned pragmas."""
+    directory = os.path.dirname(db_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Streamlit runs each rerun on a fresh thread, so pooled connections are handed
+    # between threads. The pool guarantees only one thread uses a connection at a time.
+    conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _open_read_only_connection(db_file):
+    """Opens a read-only (URI mode=ro) connection. The database file must already exist."""
+    uri = f"{pathlib.Path(os.path.abspath(db_file)).as_uri()}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    for name, value in READ_ONLY_PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _acquire(db_file, read_only=False):
+    with _pool_lock:
+        idle = _idle_connections.get((db_file, read_only))
+        if idle:
+            return idle.pop()
+    return _open_read_only_connection(db_file) if read_only else _open_connection(db_file)
+
+
+def _release(db_file, conn, read_only=False):
+    if conn.in_transaction:
+        conn.rollback()  # Never hand out a connection with a half-finished transaction
+    with _pool_lock:
+        idle = _idle_connections.setdefault((db_file, read_only), [])
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+@contextmanager
+def _checkout(db_file, read_only):
+    held = getattr(_local, "held", None)
+    if held is None:
+        held = _local.held = {}
+
+    # A read inside an open read/write block reuses that connection, so it sees the block's own writes
+    entry = held.get((db_file, False)) or (held.get((db_file, True)) if read_only else None)
+    if entry is not None:
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+        return
+
+    conn = _acquire(db_file, read_only)
+    held[(db_file, read_only)] = [conn, 1]
+    try:
+        yield conn
+    finally:
+        del held[(db_file, read_only)]
+        _release(db_file, conn, read_only)
+
+
+def get_connection(db_file=DATABASE_FILE):
+    """
+    Checks out a pooled connection for the duration of the `with` block.
+    Nested calls on the same thread reuse the connection already checked out, so helpers
+    can be composed inside one transaction. Uncommitted work is rolled back on release.
+    """
+    return _checkout(db_file, read_only=False)
+
+
+def get_read_connection(db_file=DATABASE_FILE):
+    """
+    Like get_connection(), but from a separate pool of read-only (mode=ro, query_only) connections.
+    Use it for SELECT-only work so long reads never occupy the connections writers use.
+    Inside an open get_connection() block on the same thread, that connection is reused instead.
+    """
+    return _checkout(db_file, read_only=True)
+
+
+def close_all_connections():
+    """Closes every idle pooled connection (used by CLI tools and benchmarks)."""
+    with _pool_lock:
+        pools = list(_idle_connections.values())
+        _idle_connections.clear()
+    for idle in pools:
+        for conn in idle:
+            conn.close()
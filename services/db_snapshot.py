@@ -0,0 +1,124 @@
+# services/db_snapshot.py
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from services.db_connection import DATABASE_FILE, get_read_connection, READ_ONLY_PRAGMAS
+
+# Heavy reports can read from an in-memory copy of the database instead of the file. The copy is
+# rebuilt at most every SNAPSHOT_REFRESH_SECONDS, so reports may be that stale. Off by default:
+# set ANALYTICS_SNAPSHOT=1 in .env to enable it.
+load_dotenv()
+SNAPSHOT_ENABLED = os.getenv("ANALYTICS_SNAPSHOT", "0") == "1"
+SNAPSHOT_REFRESH_SECONDS = int(os.getenv("ANALYTICS_SNAPSHOT_REFRESH_SECONDS", "300"))
+SNAPSHOT_MAX_BYTES = 512 * 1024 * 1024  # Larger databases are read from the read-only pool instead
+
+_snapshot_lock = threading.Lock()
+_generation = itertools.count(1)
+_snapshot = None  # {"uri", "anchor", "created_at", "build_ms", "bytes"}
+_refreshing = False
+
+
+def _snapshot_uri(generation):
+    return f"file:pharmacy_snapshot_{generation}?mode=memory&cache=shared"
+
+
+def _build_snapshot(db_file):
+    """Copies db_file into a new shared-cache in-memory database with the online backup API."""
+    uri = _snapshot_uri(next(_generation))
+    anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)  # Keeps the memory database alive
+    start = time.perf_counter()
+    with get_read_connection(db_file) as source:
+        source.backup(anchor)
+    page_count = anchor.execute("PRAGMA page_count;").fetchone()[0]
+    page_size = anchor.execute("PRAGMA page_size;").fetchone()[0]
+    return {
+        "uri": uri,
+        "anchor": anchor,
+        "created_at": time.time(),
+        "build_ms": (time.perf_counter() - start) * 1000,
+        "bytes": page_count * page_size,
+    }
+
+
+def refresh_snapshot(db_file=DATABASE_FILE):
+    """
+    Rebuilds the in-memory snapshot now. Readers still on the previous copy keep it until they finish;
+    it is freed when its last connection closes.
+    """
+    global _snapshot
+    new_snapshot = _build_snapshot(db_file)
+    with _snapshot_lock:
+        old_snapshot, _snapshot = _snapshot, new_snapshot
+    if old_snapshot is not None:
+        old_snapshot["anchor"].close()
+    return new_snapshot
+
+
+def _current_snapshot(db_file):
+    """Returns the snapshot, rebuilding it when stale. None while the first copy is still being built."""
+    global _refreshing
+    with _snapshot_lock:
+        snapshot = _snapshot
+        stale = snapshot is None or time.time() - snapshot["created_at"] > SNAPSHOT_REFRESH_SECONDS
+        should_refresh = stale and not _refreshing
+        if should_refresh:
+            _refreshing = True
+    if not should_refresh:
+        return snapshot  # Fresh, or another thread is rebuilding it: keep using the current copy
+    try:
+        return refresh_snapshot(db_file)
+    finally:
+        with _snapshot_lock:
+            _refreshing = False
+
+
+def snapshot_available(db_file=DATABASE_FILE):
+    """True when snapshots are enabled and the database is small enough to copy into memory."""
+    if not SNAPSHOT_ENABLED:
+        return False
+    try:
+        return os.path.getsize(db_file) <= SNAPSHOT_MAX_BYTES
+    except OSError:
+        return False
+
+
+@contextmanager
+def get_analytics_connection(db_file=DATABASE_FILE):
+    """
+    Connection for heavy read-only reports: the in-memory snapshot when it is enabled, otherwise the
+    read-only pool. Reports on the snapshot never touch the database file, so they can't hold back
+    WAL checkpoints or compete with checkout writes for I/O.
+    """
+    snapshot = _current_snapshot(db_file) if snapshot_available(db_file) else None
+    if snapshot is None:
+        with get_read_connection(db_file) as conn:
+            yield conn
+        return
+
+    conn = sqlite3.connect(snapshot["uri"], uri=True, check_same_thread=False)
+    try:
+        for name, value in READ_ONLY_PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        yield conn
+    finally:
+        conn.close()
+
+
+def get_snapshot_info():
+    """Age and size of the current snapshot, for the admin panel (None when there is none)."""
+    with _snapshot_lock:
+        snapshot = _snapshot
+    if snapshot is None:
+        return None
+    return {
+        "age_s": time.time() - snapshot["created_at"],
+        "bytes": snapshot["bytes"],
+        "build_ms": snapshot["build_ms"],
+        "refresh_seconds": SNAPSHOT_REFRESH_SECONDS,
+    }
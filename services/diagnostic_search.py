@@ -0,0 +1,76 @@
+# services/diagnostic_search.py
+import re
+import sqlite3
+
+from services.db_connection import get_read_connection
+
+DIAGNOSTIC_SEARCH_LIMIT = 50
+SNIPPET_TOKENS = 16  # Words of TEST_RESULTS shown around the matches
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = "**", "**"  # Markdown bold, so pages can render matches directly
+
+# bm25() column weights, in (DIAGNOSIS, TEST_RESULTS) order: a hit in the diagnosis outranks one in the notes
+DIAGNOSTIC_SEARCH_WEIGHTS = (4.0, 1.0)
+
+DIAGNOSTIC_SEARCH_RESULT_COLUMNS = [
+    "PATIENT_ID", "PATIENT_NAME", "DIAGNOSIS_DATE", "DIAGNOSIS", "TEST_RESULTS_SNIPPET", "DRUG_ID_PRESCRIBED",
+]
+_DIAGNOSTIC_SEARCH_SQL = f"""
+    SELECT DD.PATIENT_ID, DD.PATIENT_NAME, DD.DIAGNOSIS_DATE,
+           highlight(DIAGNOSTIC_SEARCH_FTS, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}'),
+           snippet(DIAGNOSTIC_SEARCH_FTS, 1, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', {SNIPPET_TOKENS}),
+           DD.DRUG_ID_PRESCRIBED
+    FROM DIAGNOSTIC_SEARCH_FTS JOIN DIAGNOSTIC_DATA DD ON DD.PATIENT_ID = DIAGNOSTIC_SEARCH_FTS.rowid
+    WHERE DIAGNOSTIC_SEARCH_FTS MATCH :match
+      AND (:date_from IS NULL OR DD.DIAGNOSIS_DATE >= :date_from)
+      AND (:date_to IS NULL OR DD.DIAGNOSIS_DATE <= :date_to)
+    ORDER BY bm25(DIAGNOSTIC_SEARCH_FTS, {", ".join(str(weight) for weight in DIAGNOSTIC_SEARCH_WEIGHTS)}),
+             DD.DIAGNOSIS_DATE DESC
+    LIMIT :limit;
+"""
+
+
+def build_match_query(text):
+    """
+    Turns free text into an FTS5 MATCH expression: "quoted phrases" stay phrases, other words must all
+    match, and the last word is a prefix so "elevated hba" finds "elevated HbA1c". FTS5 operators and
+    syntax characters typed by the user are treated as plain words. Returns "" when nothing is searchable.
+    """
+    terms = []
+    for phrase, words in re.findall(r'"([^"]*)"|([^"\s]+)', text):
+        tokens = re.findall(r"\w+", (phrase or words).lower())
+        if tokens:
+            terms.append((" ".join(tokens), bool(phrase)))
+    if not terms:
+        return ""
+    parts = [f'"{tokens}"' for tokens, _ in terms]
+    last_tokens, last_is_phrase = terms[-1]
+    if not last_is_phrase:
+        parts[-1] = f'"{last_tokens}"*'
+    return " AND ".join(parts)
+
+
+def run_diagnostic_search(conn, text, date_from=None, date_to=None, limit=DIAGNOSTIC_SEARCH_LIMIT):
+    """Ranked diagnostic notes search on an open connection. Returns rows in DIAGNOSTIC_SEARCH_RESULT_COLUMNS order."""
+    match = build_match_query(text)
+    if not match:
+        return []
+    params = {
+        "match": match,
+        "date_from": str(date_from) if date_from else None,
+        "date_to": str(date_to) if date_to else None,
+        "limit": limit,
+    }
+    return conn.execute(_DIAGNOSTIC_SEARCH_SQL, params).fetchall()
+
+
+def search_diagnostic_notes(text, date_from=None, date_to=None, limit=DIAGNOSTIC_SEARCH_LIMIT):
+    """
+    Ranked full-text search over DIAGNOSIS and TEST_RESULTS, optionally limited to a DIAGNOSIS_DATE range
+    ('YYYY-MM-DD' strings or dates, inclusive). Matches are wrapped in **bold**; TEST_RESULTS is cut down to
+    a snippet around them. Returns (rows, columns) like execute_sql_query, or ("Database Error: ...", None).
+    """
+    try:
+        with get_read_connection() as conn:
+            return run_diagnostic_search(conn, text, date_from, date_to, limit), DIAGNOSTIC_SEARCH_RESULT_COLUMNS
+    except sqlite3.Error as e:
+        return f"Database Error: {e}", None
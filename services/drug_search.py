@@ -0,0 +1,94 @@
+# services/drug_search.py
+import re
+import sqlite3
+
+from services.db_connection import get_read_connection
+
+DRUG_SEARCH_LIMIT = 10
+FUZZY_MIN_TERM_LENGTH = 3
+FUZZY_MIN_TRIGRAM_SHARE = 0.5  # A fuzzy match must contain at least half of the term's trigrams
+
+# bm25() column weights, in DRUG_SEARCH_COLUMNS order: a hit on the brand name outranks one on the supplier
+DRUG_SEARCH_WEIGHTS = (10.0, 6.0, 1.0, 2.0, 1.5)
+
+DRUG_SEARCH_RESULT_COLUMNS = [
+    "DRUG_ID", "DRUG_NAME", "GENERIC_NAME", "FORMULATION", "DOSAGE", "SUPPLIER", "STOCK_QUANTITY", "PRICE_PER_PACK",
+    "MATCH_TYPE",
+]
+_SELECT_DRUG = """
+    SELECT PI.DRUG_ID, PI.DRUG_NAME, PI.GENERIC_NAME, PI.FORMULATION, PI.DOSAGE, PI.SUPPLIER,
+           PI.STOCK_QUANTITY, PI.PRICE_PER_PACK
+"""
+_PREFIX_SEARCH_SQL = f"""
+    {_SELECT_DRUG}
+    FROM DRUG_SEARCH_FTS JOIN PHARMACY_INVENTORY PI ON PI.DRUG_ID = DRUG_SEARCH_FTS.rowid
+    WHERE DRUG_SEARCH_FTS MATCH :match
+    ORDER BY bm25(DRUG_SEARCH_FTS, {", ".join(str(weight) for weight in DRUG_SEARCH_WEIGHTS)}), PI.DRUG_NAME
+    LIMIT :limit;
+"""
+_TRIGRAM_SEARCH_SQL = f"""
+    {_SELECT_DRUG}
+    FROM DRUG_SEARCH_TRIGRAM JOIN PHARMACY_INVENTORY PI ON PI.DRUG_ID = DRUG_SEARCH_TRIGRAM.rowid
+    WHERE DRUG_SEARCH_TRIGRAM MATCH :match
+    ORDER BY bm25(DRUG_SEARCH_TRIGRAM, 10.0, 6.0, 1.0)
+    LIMIT :limit;
+"""
+
+
+def _search_tokens(term):
+    """Lower-cased words of the search term; FTS5 syntax characters are dropped."""
+    return re.findall(r"\w+", term.lower())
+
+
+def _trigrams(text):
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def run_drug_search(conn, term, limit=DRUG_SEARCH_LIMIT):
+    """
+    Ranked drug search on an open connection. Returns rows in DRUG_SEARCH_RESULT_COLUMNS order.
+    1. Prefix match on whole words (every word must match the start of a word in any column), ranked by
+       BM25 with the brand name weighted highest: "amox 250" finds "Amoxil 250mg".
+    2. If that finds fewer than limit drugs, trigram matches on name, generic name and supplier fill the
+       rest, so misspellings and substrings ("amoxcilin", "statin") still find something.
+    """
+    tokens = _search_tokens(term)
+    if not tokens:
+        return []
+
+    prefix_query = " ".join(f'"{token}"*' for token in tokens)
+    results = [row + ("prefix",) for row in conn.execute(_PREFIX_SEARCH_SQL, {"match": prefix_query, "limit": limit})]
+    if len(results) >= limit:
+        return results
+
+    term_trigrams = _trigrams(" ".join(tokens))
+    if len(" ".join(tokens)) < FUZZY_MIN_TERM_LENGTH or not term_trigrams:
+        return results
+
+    found_ids = {row[0] for row in results}
+    fuzzy_query = " OR ".join(f'"{trigram}"' for trigram in sorted(term_trigrams) if '"' not in trigram)
+    candidates = conn.execute(_TRIGRAM_SEARCH_SQL, {"match": fuzzy_query, "limit": limit * 5}).fetchall()
+    scored = []
+    for position, row in enumerate(candidates):
+        if row[0] in found_ids:
+            continue
+        candidate_trigrams = _trigrams(" ".join(str(value) for value in (row[1], row[2], row[5]) if value))
+        share = len(term_trigrams & candidate_trigrams) / len(term_trigrams)
+        if share >= FUZZY_MIN_TRIGRAM_SHARE:
+            scored.append((-share, position, row))
+    scored.sort()
+    results.extend(row + ("fuzzy",) for _, _, row in scored[:limit - len(results)])
+    return results
+
+
+def search_drugs(term, limit=DRUG_SEARCH_LIMIT):
+    """
+    Ranked prefix/fuzzy search over drug name, generic name, formulation, dosage and supplier.
+    Returns (rows, columns) like execute_sql_query, or ("Database Error: ...", None).
+    """
+    try:
+        with get_read_connection() as conn:
+            return run_drug_search(conn, term, limit), DRUG_SEARCH_RESULT_COLUMNS
+    except sqlite3.Error as e:
+        return f"Database Error: {e}", None
@@ -0,0 +1,281 @@
+# services/gemini_client.py
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from google.api_core import exceptions as api_exceptions
+
+load_dotenv()
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "models/gemini-2.0-flash")
+
+# Client-side quota, shared by every session in the process. Set these to the project's Gemini quota
+# (requests and tokens per minute) so a busy morning queues here instead of producing a burst of 429s.
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+RATE_LIMIT_MAX_WAIT_S = 60  # A call queued longer than this gives up with RateLimitTimeout
+CHARS_PER_TOKEN = 4  # Rough estimate used to reserve tokens before a call; settled from usage_metadata after
+IMAGE_TOKENS = 258  # Gemini bills each image as a fixed number of tokens
+
+# Retry policy: exponential backoff with jitter, never shorter than the server's own retry hint
+RETRY_MAX_DELAY_S = 60
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted,  # 429: quota
+    api_exceptions.ServiceUnavailable,  # 503: overloaded
+    api_exceptions.InternalServerError,  # 500
+    api_exceptions.DeadlineExceeded,  # Per-call timeout
+)
+
+# Per-task model settings. Handles are built once per (task, system instruction) and shared by every
+# session, so a request only pays for the API call itself. timeout_s is the default per-call deadline;
+# expected_output_tokens is added to the prompt estimate when reserving rate-limiter tokens;
+# data_token_budget caps the query results embedded in the prompt (see services/prompt_data.py).
+GEMINI_TASKS = {
+    "sql": {"model": GEMINI_MODEL_NAME, "timeout_s": 30, "generation_config": {"temperature": 0.0}, "expected_output_tokens": 200},
+    "analysis": {"model": GEMINI_MODEL_NAME, "timeout_s": 90, "generation_config": {"temperature": 0.4}, "expected_output_tokens": 1000,
+                 "data_token_budget": int(os.getenv("ANALYSIS_DATA_TOKEN_BUDGET", "12000"))},
+    "chatbot": {"model": GEMINI_MODEL_NAME, "timeout_s": 45, "generation_config": {"temperature": 0.3}, "expected_output_tokens": 400},
+    "image": {"model": GEMINI_MODEL_NAME, "timeout_s": 120, "generation_config": {"temperature": 0.2}, "expected_output_tokens": 800},
+}
+
+_client_lock = threading.Lock()
+_configured = False
+_models = {}  # (task, system_instruction) -> genai.GenerativeModel
+
+
+class GeminiNotConfigured(Exception):
+    """GOOGLE_API_KEY is missing, so no model can be created."""
+
+
+class RateLimitTimeout(Exception):
+    """A call waited longer than RATE_LIMIT_MAX_WAIT_S for client-side quota."""
+
+
+class TokenBucketLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets refilled continuously. Callers are served strictly
+    in arrival order: a large request at the head of the queue is not starved by smaller ones behind it.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.capacity = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self._rate = {name: capacity / 60.0 for name, capacity in self.capacity.items()}
+        self._level = dict(self.capacity)
+        self._refilled_at = time.monotonic()
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._refilled_at = now - self._refilled_at, now
+        for name, rate in self._rate.items():
+            self._level[name] = min(self.capacity[name], self._level[name] + rate * elapsed)
+
+    def acquire(self, tokens, timeout=None):
+        """Blocks until this caller is first in line and both buckets can cover it. Returns seconds waited."""
+        need = {"requests": 1, "tokens": min(tokens, self.capacity["tokens"])}  # One oversized call must still fit
+        ticket = object()
+        start = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] is ticket:
+                        shortfall = max((need[name] - self._level[name]) / self._rate[name] for name in need)
+                        if shortfall <= 0:
+                            for name in need:
+                                self._level[name] -= need[name]
+                            self._queue.popleft()
+                            self._cond.notify_all()
+                            return time.monotonic() - start
+                        wait_s = shortfall
+                    else:
+                        wait_s = None  # Woken when the head of the queue is served
+                    if timeout is not None:
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            raise RateLimitTimeout(f"Waited {timeout}s for Gemini quota.")
+                        wait_s = remaining if wait_s is None else min(wait_s, remaining)
+                    self._cond.wait(wait_s)
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._cond.notify_all()
+                raise
+
+    def settle(self, extra_tokens):
+        """Charges (or refunds, if negative) the difference between a call's estimate and its real usage."""
+        with self._cond:
+            self._refill()
+            self._level["tokens"] = min(self.capacity["tokens"], self._level["tokens"] - extra_tokens)
+            self._cond.notify_all()
+
+    def drain(self):
+        """Empties the request bucket after a 429, so every queued session backs off, not just the caller."""
+        with self._cond:
+            self._refill()
+            self._level["requests"] = min(self._level["requests"], 0)
+
+    def queued(self):
+        with self._cond:
+            return len(self._queue)
+
+
+rate_limiter = TokenBucketLimiter(GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE)
+
+
+def _configure():
+    """Configures the SDK with GOOGLE_API_KEY once per process. Caller holds _client_lock."""
+    global _configured
+    if not _configured:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise GeminiNotConfigured("GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+        genai.configure(api_key=api_key)
+        _configured = True
+
+
+def is_configured():
+    """True when the API key is available (configures the SDK on first call)."""
+    try:
+        with _client_lock:
+            _configure()
+        return True
+    except GeminiNotConfigured:
+        return False
+
+
+def get_model(task, system_instruction=None):
+    """
+    Shared GenerativeModel for a task in GEMINI_TASKS, with system_instruction attached at construction.
+    Raises GeminiNotConfigured when there is no API key.
+    """
+    key = (task, system_instruction)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    settings = GEMINI_TASKS[task]
+    with _client_lock:
+        _configure()
+        model = _models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(
+                settings["model"],
+                generation_config=settings["generation_config"],
+                system_instruction=system_instruction,
+            )
+            _models[key] = model
+    return model
+
+
+def request_options(task, timeout_s=None):
+    """request_options for generate_content()/send_message(): the call's timeout, else the task default."""
+    return {"timeout": timeout_s or GEMINI_TASKS[task]["timeout_s"]}
+
+
+def estimate_tokens(contents):
+    """Rough prompt size: text length / CHARS_PER_TOKEN plus IMAGE_TOKENS per inline image."""
+    if isinstance(contents, str):
+        return len(contents) // CHARS_PER_TOKEN + 1
+    if isinstance(contents, dict):
+        if "inline_data" in contents:
+            return IMAGE_TOKENS
+        return sum(estimate_tokens(value) for value in contents.values() if isinstance(value, (str, list, dict)))
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(part) for part in contents)
+    return 0
+
+
+def retry_hint_s(error):
+    """The server's suggested wait (RetryInfo detail or "retry in Ns" in the message), or None."""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and hasattr(delay, "seconds"):
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    match = re.search(r"retry in ([\d.]+)\s*s", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+def backoff_delay_s(attempt, initial_delay, error=None):
+    """Delay before retry number attempt (1-based): jittered exponential backoff, at least the server hint."""
+    ceiling = min(RETRY_MAX_DELAY_S, initial_delay * 2 ** (attempt - 1))
+    delay = random.uniform(ceiling / 2, ceiling)  # Jitter, so sessions that failed together retry apart
+    hint = retry_hint_s(error) if error is not None else None
+    if hint is not None:
+        delay = max(delay, hint + random.uniform(0, 1))
+    return delay
+
+
+def call_with_retries(task, call, contents, max_retries=3, initial_delay=5, on_retry=None):
+    """
+    Runs call() (one Gemini request for contents) under the shared rate limiter and retry policy.
+    Quota, overload and timeout errors are retried up to max_retries attempts in total, with
+    on_retry(attempt, max_retries, delay_s, error) called before each wait. After the last attempt
+    the error is raised, as are RateLimitTimeout and non-retryable errors (e.g. a blocked prompt).
+    """
+    estimated = estimate_tokens(contents) + GEMINI_TASKS[task]["expected_output_tokens"]
+    for attempt in range(1, max_retries + 1):
+        rate_limiter.acquire(estimated, timeout=RATE_LIMIT_MAX_WAIT_S)
+        try:
+            response = call()
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, api_exceptions.ResourceExhausted):
+                rate_limiter.drain()
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay_s(attempt, initial_delay, e)
+            if on_retry:
+                on_retry(attempt, max_retries, delay, e)
+            time.sleep(delay)
+            continue
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "total_token_count", None):
+            rate_limiter.settle(usage.total_token_count - estimated)
+        return response
+
+
+def _chunk_text(chunk):
+    """A streamed chunk's text; chunks without text parts (e.g. the final safety/usage chunk) give ""."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def stream_with_retries(task, call, contents, max_retries=3, initial_delay=5, on_retry=None):
+    """
+    Generator version of call_with_retries for streamed responses: call() must start a request with
+    stream=True, and the text of each chunk is yielded as it arrives. A failure before the first chunk
+    is retried like call_with_retries; once text has been yielded the error is raised to the caller,
+    which already holds the partial output.
+    """
+    estimated = estimate_tokens(contents) + GEMINI_TASKS[task]["expected_output_tokens"]
+    for attempt in range(1, max_retries + 1):
+        rate_limiter.acquire(estimated, timeout=RATE_LIMIT_MAX_WAIT_S)
+        started = False
+        try:
+            response = call()
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if text:
+                    started = True
+                    yield text
+        except RETRYABLE_ERRORS as e:
+            if isinstance(e, api_exceptions.ResourceExhausted):
+                rate_limiter.drain()
+            if started or attempt == max_retries:
+                raise
+            delay = backoff_delay_s(attempt, initial_delay, e)
+            if on_retry:
+                on_retry(attempt, max_retries, delay, e)
+            time.sleep(delay)
+            continue
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "total_token_count", None):
+            rate_limiter.settle(usage.total_token_count - estimated)
+        return
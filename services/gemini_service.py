@@ -1,162 +1,177 @@
 # services/gemini_service.py
-import os
 import re
-import time
 import google.generativeai as genai
 import streamlit as st
+from google.api_core import exceptions as api_exceptions
 
-from dotenv import load_dotenv
-
-load_dotenv()
+from services.gemini_client import (
+    GEMINI_TASKS, RateLimitTimeout, call_with_retries, get_model, is_configured, request_options, stream_with_retries,
+)
+from services.prompt_data import encode_for_prompt
 
 def configure_gemini():
-    """Configures the Google Gemini API key."""
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    if GOOGLE_API_KEY:
-        genai.configure(api_key=GOOGLE_API_KEY)
+    """Checks that the shared Gemini client is configured (the SDK is set up once per process)."""
+    if is_configured():
         return True
+    st.error("Error: GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
+    return False
+
+def _retry_notice(label):
+    """on_retry callback for call_with_retries: tells the user how long the next attempt is deferred."""
+    def notify(attempt, max_retries, delay_s, error):
+        reason = "quota exceeded" if isinstance(error, api_exceptions.ResourceExhausted) else "temporarily unavailable"
+        st.warning(f"{label} {reason} (attempt {attempt}/{max_retries}). Retrying in {delay_s:.0f}s...")
+    return notify
+
+def _is_quota_error(error):
+    """Server-side quota exhausted after all retries, or the shared client-side limiter timed out."""
+    return isinstance(error, (api_exceptions.ResourceExhausted, RateLimitTimeout))
+
+def _stream_text(task, call, contents, max_retries, initial_delay, label, outcome, messages):
+    """
+    Yields a streamed response's text chunks for st.write_stream and records the run in outcome:
+    "text" (everything yielded), "error" (the non-streaming variant's error string, or None) and
+    "interrupted" (the stream failed after some text arrived; that partial text stays in "text").
+    Errors are reported with st.error/st.warning instead of raised, so the partial answer stays on screen.
+    messages maps "blocked", "quota" and "failed" to (shown to the user, returned as error) pairs.
+    """
+    outcome.update(text="", error=None, interrupted=False)
+    try:
+        for chunk in stream_with_retries(task, call, contents, max_retries, initial_delay, on_retry=_retry_notice(label)):
+            outcome["text"] += chunk
+            yield chunk
+        if outcome["text"]:
+            return
+        # A stream that ends without any text was stopped by the safety filters after the prompt was accepted
+        shown, outcome["error"] = messages["blocked"]
+        shown = f"{shown} the response contained no text."
+    except genai.types.BlockedPromptException as e:
+        shown, outcome["error"] = messages["blocked"]
+        shown = f"{shown} {e.safety_ratings}"
+    except Exception as e:
+        if _is_quota_error(e):
+            shown, outcome["error"] = messages["quota"]
+        else:
+            shown, outcome["error"] = messages["failed"]
+            shown = f"{shown} {e}"
+    if outcome["text"]:
+        outcome["interrupted"] = True
+        st.warning(f"The response was interrupted before it finished ({shown}). The partial answer above has been kept.")
     else:
-        st.error("Error: GOOGLE_API_KEY not found in environment variables. Please check your .env file.")
-        return False
+        st.error(shown)
 
-def generate_sql_query_from_prompt(question, prompt_template, max_retries=3, initial_delay=5):
+def generate_sql_query_from_prompt(question, prompt_template, max_retries=3, initial_delay=5, timeout_s=None):
     """
     Generates an SQL query from a natural language question using the Gemini model.
+    The schema prompt is the model's system instruction, so only the question is sent per call.
     """
     if not configure_gemini():
         return "Error: Gemini API not configured."
 
-    model = genai.GenerativeModel('models/gemini-2.0-flash')
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content([prompt_template[0], question])
-            cleaned_response = response.text.strip()
-            # This regex extracts content from various code block formats (```sql, ```, ```python)
-            cleaned_response = re.sub(r'```(?:\w+)?\s*(.*?)\s*```', r'\1', cleaned_response, flags=re.DOTALL)
-            cleaned_response = cleaned_response.strip()
-            return cleaned_response
-        except genai.types.BlockedPromptException as e:
-            st.error(f"The request was blocked: {e.safety_ratings}. Please refine your query.")
-            return "Error: Query blocked due to safety concerns."
-        except Exception as e:
-            if "ResourceExhausted" in str(e):
-                st.warning(f"API quota exceeded (attempt {attempt + 1}/{max_retries}). Please wait a moment.")
-                if attempt < max_retries - 1:
-                    delay = initial_delay * (2 ** attempt)
-                else:
-                    st.error("Max retries reached for API call. Please try again later or check your Google API quotas.")
-                    return "Error: API quota exceeded."
-            else:
-                st.error(f"An unexpected API error occurred: {e}")
-                return "Error: An API error occurred."
-    return "Error: Failed to get response after multiple retries."
-
-def get_llm_analysis_from_data(data_to_analyze, analysis_prompt_template, original_request="", max_retries=3, initial_delay=5):
+    model = get_model("sql", system_instruction=prompt_template[0])
+    try:
+        response = call_with_retries(
+            "sql", lambda: model.generate_content(question, request_options=request_options("sql", timeout_s)),
+            question, max_retries, initial_delay, on_retry=_retry_notice("API"),
+        )
+        cleaned_response = response.text.strip()
+        # This regex extracts content from various code block formats (```sql, ```, ```python)
+        cleaned_response = re.sub(r'```(?:\w+)?\s*(.*?)\s*```', r'\1', cleaned_response, flags=re.DOTALL)
+        cleaned_response = cleaned_response.strip()
+        return cleaned_response
+    except genai.types.BlockedPromptException as e:
+        st.error(f"The request was blocked: {e.safety_ratings}. Please refine your query.")
+        return "Error: Query blocked due to safety concerns."
+    except Exception as e:
+        if _is_quota_error(e):
+            st.error("Max retries reached for API call. Please try again later or check your Google API quotas.")
+            return "Error: API quota exceeded."
+        st.error(f"An unexpected API error occurred: {e}")
+        return "Error: An API error occurred."
+
+def _analysis_prompt(data_to_analyze, analysis_prompt_template, original_request="", token_budget=None):
     """
-    Takes structured data (e.g., list of dicts from SQL query results) and an analysis prompt,
-    then uses Gemini to generate a human-readable analysis or summary.
+    Fills the analysis prompt with the query results as a compact table, or with statistics and a sample
+    when the table would exceed token_budget (default: the analysis task's data_token_budget).
     """
-    if not configure_gemini():
-        return "Error: Gemini API not configured."
-
-    model = genai.GenerativeModel('models/gemini-2.0-flash')
-    
-    # Format data for LLM
-    formatted_data = []
-    if isinstance(data_to_analyze, list) and all(isinstance(d, dict) for d in data_to_analyze):
-        # Convert list of dicts to a more readable string format
-        for item in data_to_analyze:
-            formatted_data.append(", ".join([f"{k}: {v}" for k, v in item.items()]))
-        formatted_data_str = "\n".join(formatted_data)
-    else: # Fallback for non-dict data (e.g., simple list of tuples)
-        formatted_data_str = str(data_to_analyze)
+    formatted_data_str, _ = encode_for_prompt(data_to_analyze, token_budget or GEMINI_TASKS["analysis"]["data_token_budget"])
 
     # Construct the final prompt for the LLM
     if "original_request" in analysis_prompt_template: # For generic report prompt
-        full_prompt = analysis_prompt_template.format(original_request=original_request, raw_data=formatted_data_str)
-    else: # For patient summary or inventory insights
-        full_prompt = analysis_prompt_template.format(patient_data=formatted_data_str, inventory_data=formatted_data_str)
-
-
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content([full_prompt])
-            cleaned_response = response.text.strip()
-            return cleaned_response
-        except genai.types.BlockedPromptException as e:
-            st.error(f"The analysis request was blocked: {e.safety_ratings}. Please refine your input.")
-            return "Error: Analysis blocked due to safety concerns."
-        except Exception as e:
-            if "ResourceExhausted" in str(e):
-                st.warning(f"API quota exceeded (attempt {attempt + 1}/{max_retries}). Please wait a moment.")
-                if attempt < max_retries - 1:
-                    delay = initial_delay * (2 ** attempt)
-                else:
-                    st.error("Max retries reached for analysis API call. Please try again later or check your Google API quotas.")
-                    return "Error: API quota exceeded for analysis."
-            else:
-                st.error(f"An unexpected API error occurred during analysis: {e}")
-                return "Error: An API error occurred during analysis."
-    return "Error: Failed to get analysis after multiple retries."
-
-
-def get_chatbot_response(user_query, chatbot_prompt_template, chat_history, max_retries=3, initial_delay=5):
+        return analysis_prompt_template.format(original_request=original_request, raw_data=formatted_data_str)
+    # For patient summary or inventory insights
+    return analysis_prompt_template.format(patient_data=formatted_data_str, inventory_data=formatted_data_str)
+
+def get_llm_analysis_from_data(data_to_analyze, analysis_prompt_template, original_request="", max_retries=3, initial_delay=5, timeout_s=None, token_budget=None, quiet=False):
     """
-    Gets a conversational response from Gemini based on a user query and provided chat history.
+    Takes structured data (e.g., list of dicts from SQL query results) and an analysis prompt,
+    then uses Gemini to generate a human-readable analysis or summary.
+    quiet=True makes no Streamlit calls (no retry notices or st.error), for callers running outside the
+    page's script thread such as batch workers; errors are then only in the returned string, with the cause.
     """
-    if not configure_gemini():
+    if not (is_configured() if quiet else configure_gemini()):
         return "Error: Gemini API not configured."
 
-    model = genai.GenerativeModel('models/gemini-2.0-flash')
-    
-    # Construct conversation history including the system prompt
-    convo = model.start_chat(history=[])
-
-    # Add the system prompt as an initial "user" instruction
-    convo.history.append({"role": "user", "parts": [chatbot_prompt_template]})
-    convo.history.append({"role": "model", "parts": ["Understood. I am ready to answer your questions about the database schema."]})
-
-    # Add previous chat history for context
-    for msg in chat_history:
-        role = "user" if msg["role"] == "user" else "model"
-        convo.history.append({"role": role, "parts": [msg["content"]]})
-
-
-    for attempt in range(max_retries):
-        try:
-            response = convo.send_message(user_query)
-            cleaned_response = response.text.strip()
-            return cleaned_response
-        except genai.types.BlockedPromptException as e:
-            st.error(f"The chatbot request was blocked: {e.safety_ratings}. Please try a different phrasing.")
-            return "I'm sorry, I cannot respond to that query due to safety guidelines. Please ask something different about the database structure."
-        except Exception as e:
-            if "ResourceExhausted" in str(e):
-                st.warning(f"Chatbot API quota exceeded (attempt {attempt + 1}/{max_retries}). Please wait a moment.")
-                if attempt < max_retries - 1:
-                    delay = initial_delay * (2 ** attempt)
-                else:
-                    st.error("Max retries reached for chatbot API call. Please try again later.")
-                    return "I'm experiencing high traffic. Please try asking again in a few moments."
-            else:
-                st.error(f"An unexpected API error occurred with the chatbot: {e}")
-                return "I'm sorry, an error occurred while processing your request. Please try again."
-    return "I'm having trouble connecting. Please try again later."
-
-
-def analyze_medical_image(image_data_base64, prompt, max_retries=3, initial_delay=5):
+    model = get_model("analysis")
+    full_prompt = _analysis_prompt(data_to_analyze, analysis_prompt_template, original_request, token_budget)
+    show_error = (lambda message: None) if quiet else st.error
+
+    try:
+        response = call_with_retries(
+            "analysis", lambda: model.generate_content([full_prompt], request_options=request_options("analysis", timeout_s)),
+            full_prompt, max_retries, initial_delay, on_retry=None if quiet else _retry_notice("API"),
+        )
+        cleaned_response = response.text.strip()
+        return cleaned_response
+    except genai.types.BlockedPromptException as e:
+        show_error(f"The analysis request was blocked: {e.safety_ratings}. Please refine your input.")
+        return "Error: Analysis blocked due to safety concerns." + (f" ({e.safety_ratings})" if quiet else "")
+    except Exception as e:
+        if _is_quota_error(e):
+            show_error("Max retries reached for analysis API call. Please try again later or check your Google API quotas.")
+            return "Error: API quota exceeded for analysis." + (f" ({e})" if quiet else "")
+        show_error(f"An unexpected API error occurred during analysis: {e}")
+        return "Error: An API error occurred during analysis." + (f" ({e})" if quiet else "")
+
+
+def _chat_history(chat_history):
+    """The page's chat messages in the SDK's history format."""
+    return [{"role": "user" if msg["role"] == "user" else "model", "parts": [msg["content"]]} for msg in chat_history]
+
+def get_chatbot_response(user_query, chatbot_prompt_template, chat_history, max_retries=3, initial_delay=5, timeout_s=None):
     """
-    Analyzes a medical image using Gemini's vision capabilities.
-    image_data_base64: Base64 encoded string of the image.
-    prompt: Text prompt for the LLM to guide the analysis.
+    Gets a conversational response from Gemini based on a user query and provided chat history.
     """
     if not configure_gemini():
         return "Error: Gemini API not configured."
 
-    model = genai.GenerativeModel('models/gemini-2.0-flash') # Gemini 2.0 Flash supports vision
-    
-    # Construct the content for the model
-    contents = [
+    # The chatbot prompt is the shared model's system instruction; only the conversation is per session
+    model = get_model("chatbot", system_instruction=chatbot_prompt_template)
+    history = _chat_history(chat_history)
+    convo = model.start_chat(history=history)
+
+    try:
+        # The history is part of every request, so it counts towards the token estimate too
+        response = call_with_retries(
+            "chatbot", lambda: convo.send_message(user_query, request_options=request_options("chatbot", timeout_s)),
+            [chatbot_prompt_template, history, user_query], max_retries, initial_delay, on_retry=_retry_notice("Chatbot API"),
+        )
+        cleaned_response = response.text.strip()
+        return cleaned_response
+    except genai.types.BlockedPromptException as e:
+        st.error(f"The chatbot request was blocked: {e.safety_ratings}. Please try a different phrasing.")
+        return "I'm sorry, I cannot respond to that query due to safety guidelines. Please ask something different about the database structure."
+    except Exception as e:
+        if _is_quota_error(e):
+            st.error("Max retries reached for chatbot API call. Please try again later.")
+            return "I'm experiencing high traffic. Please try asking again in a few moments."
+        st.error(f"An unexpected API error occurred with the chatbot: {e}")
+        return "I'm sorry, an error occurred while processing your request. Please try again."
+
+
+def _image_contents(image_data_base64, prompt):
+    """The prompt and the base64 image as one user turn."""
+    return [
         {"role": "user", "parts": [
             {"text": prompt},
             {"inline_data": {
@@ -166,23 +181,103 @@ def analyze_medical_image(image_data_base64, prompt, max_retries=3, initial_dela
         ]}
     ]
 
-    for attempt in range(max_retries):
-        try:
-            response = model.generate_content(contents)
-            cleaned_response = response.text.strip()
-            return cleaned_response
-        except genai.types.BlockedPromptException as e:
-            st.error(f"Image analysis request blocked: {e.safety_ratings}. Please ensure the image content is appropriate.")
-            return "Error: Image analysis blocked due to safety concerns. Please try a different image or refine your request."
-        except Exception as e:
-            if "ResourceExhausted" in str(e):
-                st.warning(f"Image analysis API quota exceeded (attempt {attempt + 1}/{max_retries}). Please wait a moment.")
-                if attempt < max_retries - 1:
-                    delay = initial_delay * (2 ** attempt)
-                else:
-                    st.error("Max retries reached for image analysis API call. Please try again later.")
-                    return "Error: Image analysis API quota exceeded."
-            else:
-                st.error(f"An unexpected API error occurred during image analysis: {e}")
-                return "Error: An API error occurred during image analysis."
-    return "Error: Failed to get image analysis after multiple retries."
\ No newline at end of file
+def analyze_medical_image(image_data_base64, prompt, max_retries=3, initial_delay=5, timeout_s=None):
+    """
+    Analyzes a medical image using Gemini's vision capabilities.
+    image_data_base64: Base64 encoded string of the image.
+    prompt: Text prompt for the LLM to guide the analysis.
+    """
+    if not configure_gemini():
+        return "Error: Gemini API not configured."
+
+    model = get_model("image") # Gemini 2.0 Flash supports vision
+    
+    contents = _image_contents(image_data_base64, prompt)
+
+    try:
+        response = call_with_retries(
+            "image", lambda: model.generate_content(contents, request_options=request_options("image", timeout_s)),
+            contents, max_retries, initial_delay, on_retry=_retry_notice("Image analysis API"),
+        )
+        cleaned_response = response.text.strip()
+        return cleaned_response
+    except genai.types.BlockedPromptException as e:
+        st.error(f"Image analysis request blocked: {e.safety_ratings}. Please ensure the image content is appropriate.")
+        return "Error: Image analysis blocked due to safety concerns. Please try a different image or refine your request."
+    except Exception as e:
+        if _is_quota_error(e):
+            st.error("Max retries reached for image analysis API call. Please try again later.")
+            return "Error: Image analysis API quota exceeded."
+        st.error(f"An unexpected API error occurred during image analysis: {e}")
+        return "Error: An API error occurred during image analysis."
+
+
+# Streaming variants for the pages: the same prompts and error messages as above, but the text is
+# yielded as it arrives so st.write_stream can show it immediately. Each takes an outcome dict that
+# _stream_text fills in (full text, error string, whether the stream was cut off).
+
+def stream_llm_analysis_from_data(data_to_analyze, analysis_prompt_template, original_request="", outcome=None, max_retries=3, initial_delay=5, timeout_s=None, token_budget=None):
+    """Streaming get_llm_analysis_from_data."""
+    outcome = {} if outcome is None else outcome
+    if not configure_gemini():
+        outcome.update(text="", error="Error: Gemini API not configured.", interrupted=False)
+        return
+    model = get_model("analysis")
+    full_prompt = _analysis_prompt(data_to_analyze, analysis_prompt_template, original_request, token_budget)
+    yield from _stream_text(
+        "analysis",
+        lambda: model.generate_content([full_prompt], stream=True, request_options=request_options("analysis", timeout_s)),
+        full_prompt, max_retries, initial_delay, "API", outcome,
+        {
+            "blocked": ("The analysis request was blocked:", "Error: Analysis blocked due to safety concerns."),
+            "quota": ("Max retries reached for analysis API call. Please try again later or check your Google API quotas.",
+                      "Error: API quota exceeded for analysis."),
+            "failed": ("An unexpected API error occurred during analysis:", "Error: An API error occurred during analysis."),
+        },
+    )
+
+
+def stream_chatbot_response(user_query, chatbot_prompt_template, chat_history, outcome=None, max_retries=3, initial_delay=5, timeout_s=None):
+    """Streaming get_chatbot_response."""
+    outcome = {} if outcome is None else outcome
+    if not configure_gemini():
+        outcome.update(text="", error="Error: Gemini API not configured.", interrupted=False)
+        return
+    model = get_model("chatbot", system_instruction=chatbot_prompt_template)
+    history = _chat_history(chat_history)
+    convo = model.start_chat(history=history)
+    yield from _stream_text(
+        "chatbot",
+        lambda: convo.send_message(user_query, stream=True, request_options=request_options("chatbot", timeout_s)),
+        [chatbot_prompt_template, history, user_query], max_retries, initial_delay, "Chatbot API", outcome,
+        {
+            "blocked": ("The chatbot request was blocked:",
+                        "I'm sorry, I cannot respond to that query due to safety guidelines. Please ask something different about the database structure."),
+            "quota": ("Max retries reached for chatbot API call. Please try again later.",
+                      "I'm experiencing high traffic. Please try asking again in a few moments."),
+            "failed": ("An unexpected API error occurred with the chatbot:",
+                       "I'm sorry, an error occurred while processing your request. Please try again."),
+        },
+    )
+
+
+def stream_medical_image_analysis(image_data_base64, prompt, outcome=None, max_retries=3, initial_delay=5, timeout_s=None):
+    """Streaming analyze_medical_image."""
+    outcome = {} if outcome is None else outcome
+    if not configure_gemini():
+        outcome.update(text="", error="Error: Gemini API not configured.", interrupted=False)
+        return
+    model = get_model("image")
+    contents = _image_contents(image_data_base64, prompt)
+    yield from _stream_text(
+        "image",
+        lambda: model.generate_content(contents, stream=True, request_options=request_options("image", timeout_s)),
+        contents, max_retries, initial_delay, "Image analysis API", outcome,
+        {
+            "blocked": ("Image analysis request blocked:",
+                        "Error: Image analysis blocked due to safety concerns. Please try a different image or refine your request."),
+            "quota": ("Max retries reached for image analysis API call. Please try again later.",
+                      "Error: Image analysis API quota exceeded."),
+            "failed": ("An unexpected API error occurred during image analysis:", "Error: An API error occurred during image analysis."),
+        },
+    )
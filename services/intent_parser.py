@@ -0,0 +1,250 @@
+# services/intent_parser.py
+import difflib
+import re
+import sqlite3
+import time
+
+from services.db_connection import get_read_connection
+from services.drug_search import run_drug_search
+from services.query_cache import cached_select
+
+# A misspelt name is accepted when it is this close to exactly one known name (difflib ratio), and the
+# runner-up is at least FUZZY_NAME_MARGIN behind. Anything less falls through to Gemini.
+FUZZY_NAME_MIN_RATIO = 0.8
+FUZZY_NAME_MARGIN = 0.1
+
+FORMULATION_WORDS = {
+    "tablet": "Tablet", "tablets": "Tablet", "tab": "Tablet", "tabs": "Tablet",
+    "capsule": "Capsule", "capsules": "Capsule", "cap": "Capsule", "caps": "Capsule",
+    "syrup": "Syrup", "injection": "Injection", "injections": "Injection",
+    "inhaler": "Inhaler", "inhalers": "Inhaler", "cream": "Cream", "drops": "Drops",
+}
+_DOSAGE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(mg|mcg|g|ml|iu)(/\w+)?\b", re.IGNORECASE)
+_PACKS = r"(?:packs?|boxes|box|units?)"
+
+_DRUG_COLUMNS = "DRUG_ID, DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER"
+INTENT_SQL = {
+    "stock_lookup": f"SELECT {_DRUG_COLUMNS} FROM PHARMACY_INVENTORY WHERE {{column}} = ?{{filters}};",
+    # Same guard as the checkout's decrement_stock: a sale larger than the stock changes nothing
+    "sell_stock": "UPDATE PHARMACY_INVENTORY SET STOCK_QUANTITY = STOCK_QUANTITY - ? WHERE DRUG_ID = ? AND STOCK_QUANTITY >= ?;",
+    "restock": "UPDATE PHARMACY_INVENTORY SET STOCK_QUANTITY = STOCK_QUANTITY + ? WHERE DRUG_ID = ?;",
+    "low_stock": f"SELECT {_DRUG_COLUMNS} FROM PHARMACY_INVENTORY WHERE STOCK_QUANTITY < ? ORDER BY STOCK_QUANTITY;",
+    "drugs_by_supplier": f"SELECT {_DRUG_COLUMNS} FROM PHARMACY_INVENTORY WHERE SUPPLIER = ?;",
+    "expiring_before": f"SELECT {_DRUG_COLUMNS} FROM PHARMACY_INVENTORY WHERE EXPIRY_DATE < ? ORDER BY EXPIRY_DATE;",
+    "patients_with_diagnosis": """
+        SELECT PATIENT_ID, PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE FROM DIAGNOSTIC_DATA WHERE DIAGNOSIS = ?;
+    """,
+    "drugs_for_diagnosis": """
+        SELECT DISTINCT P.DRUG_NAME, P.GENERIC_NAME FROM PHARMACY_INVENTORY AS P
+        INNER JOIN DIAGNOSTIC_DATA AS D ON P.DRUG_ID = D.DRUG_ID_PRESCRIBED WHERE D.DIAGNOSIS = ?;
+    """,
+    "patient_record": """
+        SELECT D.PATIENT_ID, D.PATIENT_NAME, D.DIAGNOSIS, D.DIAGNOSIS_DATE, D.TEST_RESULTS, P.DRUG_NAME, P.DOSAGE
+        FROM DIAGNOSTIC_DATA AS D LEFT JOIN PHARMACY_INVENTORY AS P ON D.DRUG_ID_PRESCRIBED = P.DRUG_ID
+        WHERE D.PATIENT_NAME = ? ORDER BY D.DIAGNOSIS_DATE;
+    """,
+}
+# Distinct values for fuzzy resolution; served from the query result cache until the data changes
+_DISTINCT_SUPPLIERS = "SELECT DISTINCT SUPPLIER FROM PHARMACY_INVENTORY WHERE SUPPLIER IS NOT NULL;"
+_DISTINCT_DIAGNOSES = "SELECT DISTINCT DIAGNOSIS FROM DIAGNOSTIC_DATA WHERE DIAGNOSIS IS NOT NULL;"
+_DISTINCT_PATIENTS = "SELECT DISTINCT PATIENT_NAME FROM DIAGNOSTIC_DATA;"
+
+# (intent, pattern) in priority order; the first pattern whose entities resolve wins.
+# Patterns run on the question lower-cased, with whitespace collapsed and trailing punctuation removed.
+INTENT_PATTERNS = [
+    ("sell_stock", rf"(?:i\s+(?:have\s+)?)?(?:sell|sold|dispense|dispensed)\s+(?P<quantity>\d+)\s+{_PACKS}\s+of\s+(?P<drug>.+)"),
+    ("sell_stock", rf"(?:i\s+(?:have\s+)?)?(?:sell|sold|dispense|dispensed)\s+(?P<quantity>\d+)\s+(?P<drug>.+?)\s+{_PACKS}"),
+    ("restock", rf"(?:restock|restocked|received|receive)\s+(?P<quantity>\d+)\s+{_PACKS}\s+of\s+(?P<drug>.+?)(?:\s+to\s+(?:the\s+)?(?:stock|inventory))?"),
+    ("restock", rf"add\s+(?P<quantity>\d+)\s+{_PACKS}\s+of\s+(?P<drug>.+?)\s+to\s+(?:the\s+)?(?:stock|inventory)"),
+    ("restock", rf"restock\s+(?P<drug>.+?)\s+(?:with|by)\s+(?P<quantity>\d+)(?:\s+{_PACKS})?"),
+    ("low_stock", rf"(?:show|list|find|which)?\s*(?:all\s+)?(?:the\s+)?drugs\s+(?:with\s+|having\s+)?(?:less|fewer)\s+than\s+(?P<quantity>\d+)\s+(?:{_PACKS}\s+)?(?:in\s+stock|left)"),
+    ("low_stock", r"(?:show|list|find|which)?\s*(?:all\s+)?(?:the\s+)?drugs\s+(?:with\s+)?stock\s+(?:below|under|less\s+than)\s+(?P<quantity>\d+)"),
+    ("stock_lookup", r"(?:what(?:'s|\s+is)\s+(?:the\s+)?)?(?:current\s+)?stock(?:\s+quantity|\s+level)?\s+(?:of|for)\s+(?P<drug>.+)"),
+    ("stock_lookup", rf"how\s+many\s+(?:{_PACKS}\s+)?(?:of\s+)?(?P<drug>.+?)\s+(?:do\s+we\s+have|are\s+(?:left|in\s+stock))(?:\s+in\s+stock|\s+left)?"),
+    ("stock_lookup", r"(?:show\s+|check\s+)?(?P<drug>.+?)\s+stock(?:\s+level|\s+quantity)?"),
+    ("drugs_by_supplier", r"(?:show|list|find)?\s*(?:all\s+)?(?:the\s+)?drugs\s+(?:supplied\s+by|from\s+supplier|from)\s+(?P<supplier>.+)"),
+    ("drugs_by_supplier", r"what\s+(?:drugs\s+)?does\s+(?P<supplier>.+?)\s+supply"),
+    ("expiring_before", r"(?:which|what|show|list)?\s*(?:all\s+)?(?:the\s+)?drugs\s+(?:are\s+)?(?:expiring|expire|that\s+expire)\s+before\s+(?P<date>\d{4}-\d{2}-\d{2})"),
+    ("drugs_for_diagnosis", r"what\s+drugs\s+(?:were|are)\s+prescribed\s+(?:for|to)\s+patients\s+(?:diagnosed\s+with|with)\s+(?:an?\s+)?(?P<diagnosis>.+?)(?:\s+diagnosis)?"),
+    ("patients_with_diagnosis", r"(?:list|show|find|which)?\s*(?:all\s+)?patients?(?:\s+names?)?\s+(?:with\s+(?:an?\s+)?|diagnosed\s+with\s+|who\s+have\s+(?:an?\s+)?)(?P<diagnosis>.+?)(?:\s+diagnosis)?"),
+    ("patient_record", r"(?:show|get|list)\s+(?:the\s+)?(?:diagnostic\s+(?:data|records?)|records?|history)\s+(?:for|of)\s+(?:patient\s+)?(?P<patient>.+)"),
+]
+_COMPILED_PATTERNS = [(intent, re.compile(pattern)) for intent, pattern in INTENT_PATTERNS]
+
+
+def _normalize(question):
+    return re.sub(r"\s+", " ", question).strip().rstrip(".?!").strip().lower()
+
+
+def _strip_quotes(text):
+    return text.strip().strip("'\"").strip()
+
+
+def _closest(term, choices):
+    """The one choice term confidently refers to: exact (case-insensitive), else a clear fuzzy winner."""
+    lowered = {choice.lower(): choice for choice in choices}
+    if term in lowered:
+        return lowered[term], False
+    scored = sorted(((difflib.SequenceMatcher(None, term, key).ratio(), key) for key in lowered), reverse=True)
+    if not scored or scored[0][0] < FUZZY_NAME_MIN_RATIO:
+        return None, False
+    if len(scored) > 1 and scored[0][0] - scored[1][0] < FUZZY_NAME_MARGIN:
+        return None, False
+    return lowered[scored[0][1]], True
+
+
+def parse_drug_phrase(text):
+    """Splits "lipitor 20mg tablets" into ("lipitor", "20mg", "Tablet"). Dosage and formulation may be None."""
+    dosage = None
+    match = _DOSAGE.search(text)
+    if match:
+        dosage = f"{match.group(1)}{match.group(2).lower()}{match.group(3) or ''}"
+        text = text[:match.start()] + text[match.end():]
+    formulation, words = None, []
+    for word in _strip_quotes(text).split():
+        if word in FORMULATION_WORDS:
+            formulation = FORMULATION_WORDS[word]
+        else:
+            words.append(word)
+    return " ".join(words), dosage, formulation
+
+
+def resolve_drug(conn, phrase):
+    """
+    Inventory rows a drug phrase refers to, by brand name (exact, then fuzzy via the drug search index)
+    or generic name. Returns {"name", "column", "dosage", "formulation", "rows", "fuzzy", "filters", "params"}
+    (filters/params being the WHERE clause tail and values that select those rows), or None.
+    """
+    name, dosage, formulation = parse_drug_phrase(phrase)
+    if not name:
+        return None
+    column, fuzzy = "DRUG_NAME", False
+    variants = list(dict.fromkeys([name, name.title(), name.upper(), name.capitalize()]))
+    placeholders = ", ".join("?" * len(variants))
+    row = conn.execute(f"SELECT DRUG_NAME FROM PHARMACY_INVENTORY WHERE DRUG_NAME IN ({placeholders}) LIMIT 1;", variants).fetchone()
+    if row:
+        canonical = row[0]
+    else:
+        # Search rows: DRUG_ID, DRUG_NAME, GENERIC_NAME, ... ; match the phrase against both names
+        candidates = {}
+        for result in run_drug_search(conn, name):
+            candidates.setdefault(result[1], "DRUG_NAME")
+            if result[2]:
+                candidates.setdefault(result[2], "GENERIC_NAME")
+        canonical, fuzzy = _closest(name, candidates)
+        if canonical is None:
+            return None
+        column = candidates[canonical]
+
+    filters, params = "", [canonical]
+    if dosage:
+        filters += " AND DOSAGE = ? COLLATE NOCASE"
+        params.append(dosage)
+    if formulation:
+        filters += " AND FORMULATION = ? COLLATE NOCASE"
+        params.append(formulation)
+    rows = conn.execute(f"SELECT DRUG_ID, DRUG_NAME, DOSAGE, FORMULATION FROM PHARMACY_INVENTORY WHERE {column} = ?{filters};",
+                        params).fetchall()
+    if not rows:
+        return None
+    return {"name": canonical, "column": column, "dosage": dosage, "formulation": formulation, "rows": rows,
+            "fuzzy": fuzzy, "filters": filters, "params": tuple(params)}
+
+
+def _resolve_from_list(term, query):
+    rows, _ = cached_select(query)
+    return _closest(_strip_quotes(term), [row[0] for row in rows])
+
+
+def _resolve_patient(conn, term):
+    name = _strip_quotes(term)
+    variants = list(dict.fromkeys([name, name.title()]))
+    placeholders = ", ".join("?" * len(variants))
+    row = conn.execute(f"SELECT PATIENT_NAME FROM DIAGNOSTIC_DATA WHERE PATIENT_NAME IN ({placeholders}) LIMIT 1;", variants).fetchone()
+    if row:
+        return row[0], False
+    return _resolve_from_list(name, _DISTINCT_PATIENTS)
+
+
+def _describe_drug(drug):
+    label = " ".join(part for part in (drug["name"], drug["dosage"], drug["formulation"]) if part)
+    if len(drug["rows"]) == 1:
+        label += f" (DRUG_ID {drug['rows'][0][0]})"
+    return label
+
+
+def _build(conn, intent, groups):
+    """(sql, params, description, corrections) for one matched pattern, or None when an entity doesn't resolve."""
+    corrections = []
+
+    def note(typed, canonical, fuzzy):
+        if fuzzy:
+            corrections.append(f"'{typed}' → '{canonical}'")
+
+    if intent in ("sell_stock", "restock", "stock_lookup"):
+        drug = resolve_drug(conn, groups["drug"])
+        if drug is None:
+            return None
+        note(parse_drug_phrase(groups["drug"])[0], drug["name"], drug["fuzzy"])
+        if intent == "stock_lookup":
+            sql = INTENT_SQL[intent].format(column=drug["column"], filters=drug["filters"])
+            return sql, drug["params"], f"Stock of {_describe_drug(drug)}", corrections
+        if len(drug["rows"]) != 1:
+            return None  # A write must name exactly one inventory row; several strengths or suppliers match
+        quantity, drug_id = int(groups["quantity"]), drug["rows"][0][0]
+        if intent == "sell_stock":
+            return INTENT_SQL[intent], (quantity, drug_id, quantity), f"Sell {quantity} packs of {_describe_drug(drug)}", corrections
+        return INTENT_SQL[intent], (quantity, drug_id), f"Restock {quantity} packs of {_describe_drug(drug)}", corrections
+
+    if intent == "low_stock":
+        quantity = int(groups["quantity"])
+        return INTENT_SQL[intent], (quantity,), f"Drugs with fewer than {quantity} packs in stock", corrections
+    if intent == "expiring_before":
+        return INTENT_SQL[intent], (groups["date"],), f"Drugs expiring before {groups['date']}", corrections
+    if intent == "drugs_by_supplier":
+        supplier, fuzzy = _resolve_from_list(groups["supplier"], _DISTINCT_SUPPLIERS)
+        if supplier is None:
+            return None
+        note(_strip_quotes(groups["supplier"]), supplier, fuzzy)
+        return INTENT_SQL[intent], (supplier,), f"Drugs supplied by {supplier}", corrections
+    if intent in ("patients_with_diagnosis", "drugs_for_diagnosis"):
+        diagnosis, fuzzy = _resolve_from_list(groups["diagnosis"], _DISTINCT_DIAGNOSES)
+        if diagnosis is None:
+            return None
+        note(_strip_quotes(groups["diagnosis"]), diagnosis, fuzzy)
+        label = "Patients diagnosed with" if intent == "patients_with_diagnosis" else "Drugs prescribed for"
+        return INTENT_SQL[intent], (diagnosis,), f"{label} {diagnosis}", corrections
+    if intent == "patient_record":
+        patient, fuzzy = _resolve_patient(conn, groups["patient"])
+        if patient is None:
+            return None
+        note(_strip_quotes(groups["patient"]), patient, fuzzy)
+        return INTENT_SQL[intent], (patient,), f"Diagnostic records for {patient}", corrections
+    return None
+
+
+def parse_intent(question):
+    """
+    Recognizes the everyday commands and questions in INTENT_PATTERNS and builds parameterized SQL for
+    them locally, resolving drug, supplier, diagnosis and patient names against the live tables
+    (misspellings included, when one name is a clear match).
+    Returns {"intent", "sql", "params", "description", "corrections", "elapsed_ms"} or None when no rule
+    matches confidently, in which case the question should go to Gemini.
+    """
+    start = time.perf_counter()
+    text = _normalize(question)
+    matches = [(intent, match.groupdict()) for intent, pattern in _COMPILED_PATTERNS if (match := pattern.fullmatch(text))]
+    if not matches:
+        return None
+    try:
+        with get_read_connection() as conn:
+            for intent, groups in matches:
+                built = _build(conn, intent, groups)
+                if built is not None:
+                    sql, params, description, corrections = built
+                    return {"intent": intent, "sql": re.sub(r"\s+", " ", sql).strip(), "params": params,
+                            "description": description, "corrections": corrections,
+                            "elapsed_ms": (time.perf_counter() - start) * 1000}
+    except sqlite3.Error:
+        return None  # Let the model path report database problems
+    return None
@@ -0,0 +1,105 @@
+# services/inventory_alerts.py
+import argparse
+import sqlite3
+from datetime import date, datetime
+
+from services.database_service import run_named_query
+from services.db_connection import DATABASE_FILE, get_connection, get_read_connection
+from services.migrations import EXPIRY_ALERT_ROLL_FORWARD_SQL
+
+ALERT_SCOPES = ("DEFAULT", "FORMULATION", "DRUG")
+
+
+def _last_roll_date(conn):
+    return conn.execute("SELECT MAX(ROLL_DATE) FROM INVENTORY_ALERT_ROLLS;").fetchone()[0]
+
+
+def roll_forward_expiry_alerts(db_file=DATABASE_FILE, force=False):
+    """
+    Adds drugs that entered their expiry window since the last roll-forward to EXPIRING_SOON.
+    Runs at most once per day unless force is set; returns the number of drugs added (None when today's
+    roll-forward had already run). Safe to call from several processes at once.
+    """
+    today = date.today().isoformat()
+    with get_connection(db_file) as conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if not force and _last_roll_date(conn) == today:
+                conn.rollback()
+                return None
+            added = conn.execute(EXPIRY_ALERT_ROLL_FORWARD_SQL).rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO INVENTORY_ALERT_ROLLS (ROLL_DATE, ROLLED_AT, DRUGS_ADDED) VALUES (?, ?, ?);",
+                (today, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), added)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return added
+
+
+def ensure_alerts_current(db_file=DATABASE_FILE):
+    """Runs today's roll-forward if nothing (cron, app start) has run it yet. Cheap when it has."""
+    try:
+        with get_read_connection(db_file) as conn:
+            if _last_roll_date(conn) == date.today().isoformat():
+                return
+        roll_forward_expiry_alerts(db_file)
+    except sqlite3.Error as e:
+        print(f"Inventory alert roll-forward failed: {e}")
+
+
+def get_inventory_alerts():
+    """Drugs in LOW_STOCK or EXPIRING_SOON with their details. Returns (rows, columns) like execute_sql_query."""
+    ensure_alerts_current()
+    return run_named_query("inventory_alert_items")
+
+
+def get_inventory_alert_counts():
+    """{"LOW_STOCK": n, "EXPIRING_SOON": n, "EXPIRED": n}, or None if the counts can't be read."""
+    ensure_alerts_current()
+    rows, columns = run_named_query("inventory_alert_counts")
+    if isinstance(rows, str) or not rows:
+        return None
+    return dict(zip(columns, rows[0]))
+
+
+def set_alert_threshold(scope, scope_key, low_stock_below, expiry_within_days):
+    """
+    Sets the thresholds for the default, a FORMULATION or a DRUG_ID (None inherits the less specific level).
+    Triggers recompute LOW_STOCK and EXPIRING_SOON. Returns a status string like execute_sql_query.
+    """
+    if scope not in ALERT_SCOPES:
+        return f"An unexpected error occurred: unknown alert scope '{scope}'"
+    if scope == "DEFAULT" and (low_stock_below is None or expiry_within_days is None):
+        return "An unexpected error occurred: the default thresholds can't be left empty"
+    status, _ = run_named_query(
+        "upsert_alert_threshold", scope=scope, scope_key="" if scope == "DEFAULT" else str(scope_key).strip(),
+        low_stock_below=low_stock_below, expiry_within_days=expiry_within_days
+    )
+    return status
+
+
+def delete_alert_threshold(scope, scope_key):
+    """Removes a formulation or drug override (the default can't be removed). Returns a status string."""
+    status, _ = run_named_query("delete_alert_threshold", scope=scope, scope_key=str(scope_key))
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily roll-forward of the EXPIRING_SOON alert table.")
+    parser.add_argument("--db", default=DATABASE_FILE, help=f"Database to update (default: {DATABASE_FILE})")
+    parser.add_argument("--force", action="store_true", help="Run even if today's roll-forward already ran")
+    args = parser.parse_args(argv)
+
+    added = roll_forward_expiry_alerts(args.db, force=args.force)
+    if added is None:
+        print("Already rolled forward today.")
+    else:
+        print(f"{added} drug(s) entered their expiry window.")
+
+
+if __name__ == "__main__":
+    # Usage (e.g. from cron shortly after midnight): python -m services.inventory_alerts [--db data/pharmacy_db.db]
+    main()
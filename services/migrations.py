@@ -0,0 +1,519 @@
+# services/migrations.py
+from datetime import datetime
+
+SCHEMA_VERSION_TABLE = "SCHEMA_MIGRATIONS"
+
+# SQL expression that rewrites the date formats we have seen in the data (ISO with a time part,
+# YYYY/MM/DD, DD-MM-YYYY, DD/MM/YYYY) into plain 'YYYY-MM-DD' text. Keeping dates in that one form
+# lets `EXPIRY_DATE <= '2026-12-31'` compare as text and use an index, instead of wrapping the
+# column in date() and forcing a full scan.
+_ISO_DATE_GLOB = "'[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+DATE_REVIEW_TABLE = "DATE_NORMALIZATION_REVIEW"
+
+def _normalized_date_sql(column):
+    return f"""
+        CASE
+            WHEN {column} GLOB {_ISO_DATE_GLOB} THEN {column}
+            WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T]*' THEN substr({column}, 1, 10)
+            WHEN {column} GLOB '[0-9][0-9][0-9][0-9]/[0-9][0-9]/[0-9][0-9]' THEN replace({column}, '/', '-')
+            WHEN {column} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+              OR {column} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+                THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+            ELSE {column}
+        END"""
+
+
+def _unambiguous_date_sql(column):
+    """
+    Like _normalized_date_sql, but NN/NN/YYYY (or NN-NN-YYYY) is only converted when it reads the same
+    either way round: day 13-31 with month 1-12 (day first), month 1-12 with day 13-31 (US month
+    first), or day = month. 03/04/2026 could be 3 April or 4 March, and 45/03/2026 is no date at all;
+    both are left as written.
+    """
+    first, second = f"CAST(substr({column}, 1, 2) AS INTEGER)", f"CAST(substr({column}, 4, 2) AS INTEGER)"
+    two_part = (f"({column} GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]' "
+                f"OR {column} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]')")
+    return f"""
+        CASE
+            WHEN {column} GLOB {_ISO_DATE_GLOB} THEN {column}
+            WHEN {column} GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T]*' THEN substr({column}, 1, 10)
+            WHEN {column} GLOB '[0-9][0-9][0-9][0-9]/[0-9][0-9]/[0-9][0-9]' THEN replace({column}, '/', '-')
+            WHEN {two_part} AND {second} BETWEEN 1 AND 12 AND ({first} BETWEEN 13 AND 31 OR {first} = {second})
+                THEN substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+            WHEN {two_part} AND {first} BETWEEN 1 AND 12 AND {second} BETWEEN 13 AND 31
+                THEN substr({column}, 7, 4) || '-' || substr({column}, 1, 2) || '-' || substr({column}, 4, 2)
+            ELSE {column}
+        END"""
+
+
+def _valid_iso_date_sql(value):
+    """value is 'YYYY-MM-DD' with month 1-12 and day 1-31 (date() returns NULL otherwise)."""
+    return f"({value} GLOB {_ISO_DATE_GLOB} AND date({value}) IS {value})"
+
+
+def _date_normalization_statements(table, date_column, key_column):
+    """Rewrites existing values and installs triggers that keep new writes normalized."""
+    normalized = _normalized_date_sql(date_column)
+    normalized_new = _normalized_date_sql(f"NEW.{date_column}")
+    needs_fix = f"NEW.{date_column} IS NOT NULL AND NOT NEW.{date_column} GLOB {_ISO_DATE_GLOB}"
+    trigger_prefix = f"TRG_{table}_{date_column}_NORMALIZE"
+    return [
+        f"UPDATE {table} SET {date_column} = {normalized} "
+        f"WHERE {date_column} IS NOT NULL AND NOT {date_column} GLOB {_ISO_DATE_GLOB};",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_INSERT
+        AFTER INSERT ON {table} WHEN {needs_fix}
+        BEGIN
+            UPDATE {table} SET {date_column} = {normalized_new} WHERE {key_column} = NEW.{key_column};
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_UPDATE
+        AFTER UPDATE OF {date_column} ON {table} WHEN {needs_fix}
+        BEGIN
+            UPDATE {table} SET {date_column} = {normalized_new} WHERE {key_column} = NEW.{key_column};
+        END;
+        """,
+    ]
+
+
+def _date_review_statements(columns):
+    """
+    Replaces the normalization triggers with ones that only convert unambiguous dates, and logs every
+    value that is not a valid ISO date (ambiguous, impossible like '2029-03-45', or unrecognized) in
+    DATE_REVIEW_TABLE for someone to check by hand. Correcting a value to a valid ISO date clears its entry.
+    """
+    statements = [f"""
+        CREATE TABLE IF NOT EXISTS {DATE_REVIEW_TABLE} (
+            TABLE_NAME TEXT NOT NULL,
+            ROW_KEY INTEGER NOT NULL,
+            COLUMN_NAME TEXT NOT NULL,
+            ORIGINAL_VALUE TEXT,
+            LOGGED_AT TEXT NOT NULL,
+            PRIMARY KEY (TABLE_NAME, ROW_KEY, COLUMN_NAME)
+        );
+        """]
+    for table, date_column, key_column in columns:
+        normalized_new = _unambiguous_date_sql(f"NEW.{date_column}")
+        trigger_prefix = f"TRG_{table}_{date_column}_NORMALIZE"
+        statements += [f"DROP TRIGGER IF EXISTS {trigger_prefix}_INSERT;", f"DROP TRIGGER IF EXISTS {trigger_prefix}_UPDATE;"]
+        statements += [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_{event}
+            AFTER {event}{" OF " + date_column if event == "UPDATE" else ""} ON {table}
+            WHEN NEW.{date_column} IS NOT NULL AND NOT {_valid_iso_date_sql(f"NEW.{date_column}")}
+            BEGIN
+                UPDATE {table} SET {date_column} = {normalized_new} WHERE {key_column} = NEW.{key_column};
+                INSERT OR REPLACE INTO {DATE_REVIEW_TABLE} (TABLE_NAME, ROW_KEY, COLUMN_NAME, ORIGINAL_VALUE, LOGGED_AT)
+                SELECT '{table}', NEW.{key_column}, '{date_column}', NEW.{date_column}, datetime('now', 'localtime')
+                WHERE NOT {_valid_iso_date_sql(normalized_new)};
+            END;
+            """
+            for event in ("INSERT", "UPDATE")
+        ]
+        statements.append(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_REVIEWED
+            AFTER UPDATE OF {date_column} ON {table} WHEN {_valid_iso_date_sql(f"NEW.{date_column}")}
+            BEGIN
+                DELETE FROM {DATE_REVIEW_TABLE}
+                WHERE TABLE_NAME = '{table}' AND ROW_KEY = NEW.{key_column} AND COLUMN_NAME = '{date_column}';
+            END;
+        """)
+        statements.append(f"""
+            INSERT OR IGNORE INTO {DATE_REVIEW_TABLE} (TABLE_NAME, ROW_KEY, COLUMN_NAME, ORIGINAL_VALUE, LOGGED_AT)
+            SELECT '{table}', {key_column}, '{date_column}', {date_column}, datetime('now', 'localtime')
+            FROM {table} WHERE {date_column} IS NOT NULL AND NOT {_valid_iso_date_sql(date_column)};
+        """)
+    return statements
+
+
+def _search_index_statements(fts_table, content_table, key_column, columns, tokenize, options=""):
+    """
+    Creates an external-content FTS5 index over content_table and the triggers that keep it in sync.
+    The UPDATE trigger only fires for the indexed columns, so e.g. stock changes at checkout don't
+    touch the search index.
+    """
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{column}" for column in columns)
+    old_values = ", ".join(f"OLD.{column}" for column in columns)
+    delete_old = f"INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', OLD.{key_column}, {old_values});"
+    insert_new = f"INSERT INTO {fts_table} (rowid, {column_list}) VALUES (NEW.{key_column}, {new_values});"
+    trigger_prefix = f"TRG_{fts_table}_SYNC"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+            {column_list}, content='{content_table}', content_rowid='{key_column}', tokenize="{tokenize}"{options}
+        );
+        """,
+        f"CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_INSERT AFTER INSERT ON {content_table} BEGIN {insert_new} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_DELETE AFTER DELETE ON {content_table} BEGIN {delete_old} END;",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {trigger_prefix}_UPDATE AFTER UPDATE OF {column_list} ON {content_table}
+        BEGIN {delete_old} {insert_new} END;
+        """,
+        f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild');",
+    ]
+
+
+def _alert_threshold_sql(column, drug_id, formulation):
+    """The most specific INVENTORY_ALERT_THRESHOLDS value for a drug: its own, its formulation's, then the default."""
+    lookup = f"SELECT {column} FROM INVENTORY_ALERT_THRESHOLDS WHERE SCOPE = "
+    return (f"COALESCE(({lookup}'DRUG' AND SCOPE_KEY = CAST({drug_id} AS TEXT)), "
+            f"({lookup}'FORMULATION' AND SCOPE_KEY = {formulation}), ({lookup}'DEFAULT'))")
+
+
+def _expiry_cutoff_sql(days):
+    return f"date('now', 'localtime', '+' || {days} || ' days')"
+
+
+def _expiring_sql(date_column, days, iso_only):
+    """
+    date_column is within days of today. iso_only also requires a valid ISO date: anything else (an
+    ambiguous '03/04/2029' left for review) compares wrongly as text and would look expired.
+    """
+    expiring = f"{date_column} <= {_expiry_cutoff_sql(days)}"
+    return f"{expiring} AND {_valid_iso_date_sql(date_column)}" if iso_only else expiring
+
+
+def _inventory_alert_rebuild_statements(iso_only=False):
+    """Recomputes LOW_STOCK and EXPIRING_SOON from the whole catalogue (after threshold changes and bulk loads)."""
+    stock_below = _alert_threshold_sql("LOW_STOCK_BELOW", "PI.DRUG_ID", "PI.FORMULATION")
+    within_days = _alert_threshold_sql("EXPIRY_WITHIN_DAYS", "PI.DRUG_ID", "PI.FORMULATION")
+    return [
+        "DELETE FROM LOW_STOCK;",
+        f"""
+        INSERT INTO LOW_STOCK (DRUG_ID, STOCK_QUANTITY, LOW_STOCK_BELOW)
+        SELECT DRUG_ID, STOCK_QUANTITY, LOW_STOCK_BELOW
+        FROM (SELECT PI.DRUG_ID, PI.STOCK_QUANTITY, {stock_below} AS LOW_STOCK_BELOW FROM PHARMACY_INVENTORY PI)
+        WHERE STOCK_QUANTITY < LOW_STOCK_BELOW;
+        """,
+        "DELETE FROM EXPIRING_SOON;",
+        f"""
+        INSERT INTO EXPIRING_SOON (DRUG_ID, EXPIRY_DATE, EXPIRY_WITHIN_DAYS)
+        SELECT DRUG_ID, EXPIRY_DATE, EXPIRY_WITHIN_DAYS
+        FROM (SELECT PI.DRUG_ID, PI.EXPIRY_DATE, {within_days} AS EXPIRY_WITHIN_DAYS FROM PHARMACY_INVENTORY PI)
+        WHERE {_expiring_sql("EXPIRY_DATE", "EXPIRY_WITHIN_DAYS", iso_only)};
+        """,
+    ]
+
+
+def _inventory_alert_trigger_statements(iso_only=False):
+    """Triggers that keep LOW_STOCK and EXPIRING_SOON current as drugs and thresholds change."""
+    refresh = []
+    for alias in ("OLD", "NEW"):
+        refresh.append([
+            f"DELETE FROM LOW_STOCK WHERE DRUG_ID = {alias}.DRUG_ID;",
+            f"DELETE FROM EXPIRING_SOON WHERE DRUG_ID = {alias}.DRUG_ID;",
+        ])
+    stock_below = _alert_threshold_sql("LOW_STOCK_BELOW", "NEW.DRUG_ID", "NEW.FORMULATION")
+    within_days = _alert_threshold_sql("EXPIRY_WITHIN_DAYS", "NEW.DRUG_ID", "NEW.FORMULATION")
+    insert_new = f"""
+            INSERT INTO LOW_STOCK (DRUG_ID, STOCK_QUANTITY, LOW_STOCK_BELOW)
+            SELECT NEW.DRUG_ID, NEW.STOCK_QUANTITY, LOW_STOCK_BELOW FROM (SELECT {stock_below} AS LOW_STOCK_BELOW)
+            WHERE NEW.STOCK_QUANTITY < LOW_STOCK_BELOW;
+            INSERT INTO EXPIRING_SOON (DRUG_ID, EXPIRY_DATE, EXPIRY_WITHIN_DAYS)
+            SELECT NEW.DRUG_ID, NEW.EXPIRY_DATE, EXPIRY_WITHIN_DAYS FROM (SELECT {within_days} AS EXPIRY_WITHIN_DAYS)
+            WHERE {_expiring_sql("NEW.EXPIRY_DATE", "EXPIRY_WITHIN_DAYS", iso_only)};"""
+    remove_old, remove_new = (" ".join(statements) for statements in refresh)
+    rebuild_all = " ".join(_inventory_alert_rebuild_statements(iso_only))
+    statements = [
+        # Named like the full-text sync triggers, so bulk imports suspend them and rebuild in one pass
+        f"CREATE TRIGGER IF NOT EXISTS TRG_INVENTORY_ALERTS_SYNC_INSERT AFTER INSERT ON PHARMACY_INVENTORY BEGIN {remove_new} {insert_new} END;",
+        f"CREATE TRIGGER IF NOT EXISTS TRG_INVENTORY_ALERTS_SYNC_DELETE AFTER DELETE ON PHARMACY_INVENTORY BEGIN {remove_old} END;",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS TRG_INVENTORY_ALERTS_SYNC_UPDATE
+        AFTER UPDATE OF DRUG_ID, FORMULATION, STOCK_QUANTITY, EXPIRY_DATE ON PHARMACY_INVENTORY
+        BEGIN {remove_old} {insert_new} END;
+        """,
+    ]
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS TRG_INVENTORY_ALERT_THRESHOLDS_{event} "
+            f"AFTER {event} ON INVENTORY_ALERT_THRESHOLDS BEGIN {rebuild_all} END;"
+        )
+    return statements
+
+
+def _inventory_alert_statements():
+    """
+    LOW_STOCK and EXPIRING_SOON hold only the drugs that need attention, kept current by triggers on
+    PHARMACY_INVENTORY, so Inventory Insights and the dashboard read a few rows instead of the catalogue.
+    EXPIRING_SOON is as of the last write to each drug; drugs that enter their expiry window without
+    being touched are added by the daily roll-forward in services/inventory_alerts.py.
+    """
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS INVENTORY_ALERT_THRESHOLDS (
+            SCOPE TEXT NOT NULL CHECK (SCOPE IN ('DEFAULT', 'FORMULATION', 'DRUG')),
+            SCOPE_KEY TEXT NOT NULL DEFAULT '' COLLATE NOCASE,  -- '' for DEFAULT, a FORMULATION, or a DRUG_ID
+            LOW_STOCK_BELOW INTEGER,  -- NULL inherits the less specific level
+            EXPIRY_WITHIN_DAYS INTEGER,
+            PRIMARY KEY (SCOPE, SCOPE_KEY)
+        );
+        """,
+        # Same cut-offs Inventory Insights used before: under 50 packs, or expiring within ~6 months
+        "INSERT OR IGNORE INTO INVENTORY_ALERT_THRESHOLDS VALUES ('DEFAULT', '', 50, 182);",
+        """
+        CREATE TABLE IF NOT EXISTS LOW_STOCK (
+            DRUG_ID INTEGER PRIMARY KEY,
+            STOCK_QUANTITY INTEGER NOT NULL,
+            LOW_STOCK_BELOW INTEGER NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS EXPIRING_SOON (
+            DRUG_ID INTEGER PRIMARY KEY,
+            EXPIRY_DATE TEXT NOT NULL,
+            EXPIRY_WITHIN_DAYS INTEGER NOT NULL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS INVENTORY_ALERT_ROLLS (
+            ROLL_DATE TEXT PRIMARY KEY,
+            ROLLED_AT TEXT NOT NULL,
+            DRUGS_ADDED INTEGER NOT NULL
+        );
+        """,
+    ] + _inventory_alert_trigger_statements() + _inventory_alert_rebuild_statements()
+
+
+def _iso_only_alert_statements():
+    """Recreates the alert triggers so only ISO expiry dates enter EXPIRING_SOON, and rebuilds the tables."""
+    drops = [f"DROP TRIGGER IF EXISTS TRG_INVENTORY_ALERTS_SYNC_{event};" for event in ("INSERT", "DELETE", "UPDATE")]
+    drops += [f"DROP TRIGGER IF EXISTS TRG_INVENTORY_ALERT_THRESHOLDS_{event};" for event in ("INSERT", "UPDATE", "DELETE")]
+    return drops + _inventory_alert_trigger_statements(iso_only=True) + _inventory_alert_rebuild_statements(iso_only=True)
+
+
+# One INVOICE_LINES row per cart item in INVOICES.invoice_items_json (malformed carts yield no lines).
+# Each line's GST is its share of the invoice's gst_amount, so lines add up to the header whatever rate
+# was in force.
+_INVOICE_LINES_SELECT = """
+    SELECT I.invoice_id, I.invoice_date, CAST(json_extract(J.value, '$.drug_id') AS INTEGER),
+           json_extract(J.value, '$.drug_name'), CAST(json_extract(J.value, '$.quantity') AS INTEGER),
+           json_extract(J.value, '$.price_per_pack'),
+           ROUND(json_extract(J.value, '$.quantity') * json_extract(J.value, '$.price_per_pack'), 2),
+           CASE WHEN I.subtotal > 0
+                THEN ROUND(json_extract(J.value, '$.quantity') * json_extract(J.value, '$.price_per_pack')
+                           * I.gst_amount / I.subtotal, 2)
+                ELSE 0 END
+    FROM {source} AS I,
+         json_each(CASE WHEN json_valid(I.invoice_items_json) AND json_type(I.invoice_items_json) = 'array'
+                        THEN I.invoice_items_json ELSE '[]' END) AS J
+    WHERE J.type = 'object'
+      AND json_extract(J.value, '$.quantity') IS NOT NULL AND json_extract(J.value, '$.price_per_pack') IS NOT NULL
+"""
+_INVOICE_LINES_INSERT = (
+    "INSERT INTO INVOICE_LINES (invoice_id, invoice_date, drug_id, drug_name, quantity, unit_price, line_total, gst_amount)"
+)
+
+
+def _invoice_lines_rebuild_statements():
+    """Re-derives every INVOICE_LINES row from the invoices' JSON (backfill, and after bulk loads)."""
+    return [
+        "DELETE FROM INVOICE_LINES;",
+        f"{_INVOICE_LINES_INSERT} {_INVOICE_LINES_SELECT.format(source='INVOICES')};",
+    ]
+
+
+def _invoice_lines_statements():
+    """
+    INVOICE_LINES normalizes the cart JSON, so sales by drug or by period are indexed queries the LLM can
+    write. Triggers fill it from invoice_items_json inside the statement that writes the header, so every
+    writer (checkout, NLQ, bulk loads) stays consistent; deleting an invoice cascades to its lines.
+    """
+    # json_each needs a table to read NEW from; a one-row subquery stands in for INVOICES
+    new_invoice = "(SELECT NEW.invoice_id AS invoice_id, NEW.invoice_date AS invoice_date, " \
+                  "NEW.invoice_items_json AS invoice_items_json, NEW.subtotal AS subtotal, NEW.gst_amount AS gst_amount)"
+    insert_new = f"{_INVOICE_LINES_INSERT} {_INVOICE_LINES_SELECT.format(source=new_invoice)};"
+    return [
+        """
+        CREATE TABLE IF NOT EXISTS INVOICE_LINES (
+            line_id INTEGER PRIMARY KEY,
+            invoice_id INTEGER NOT NULL REFERENCES INVOICES (invoice_id) ON DELETE CASCADE,
+            invoice_date TEXT NOT NULL,  -- Copied from the header so date-range sales need no join
+            drug_id INTEGER,  -- No foreign key: sales history outlives drugs removed from the catalogue
+            drug_name TEXT,
+            quantity INTEGER NOT NULL,
+            unit_price REAL NOT NULL,
+            line_total REAL NOT NULL,
+            gst_amount REAL NOT NULL
+        );
+        """,
+        # Covering indexes: sales per drug over time, and all sales in a period grouped by drug
+        "CREATE INDEX IF NOT EXISTS IDX_INVOICE_LINES_DRUG ON INVOICE_LINES (drug_id, invoice_date, quantity, line_total);",
+        "CREATE INDEX IF NOT EXISTS IDX_INVOICE_LINES_DATE ON INVOICE_LINES (invoice_date, drug_id, drug_name, quantity, line_total);",
+        "CREATE INDEX IF NOT EXISTS IDX_INVOICE_LINES_INVOICE ON INVOICE_LINES (invoice_id);",
+        f"CREATE TRIGGER IF NOT EXISTS TRG_INVOICE_LINES_SYNC_INSERT AFTER INSERT ON INVOICES BEGIN {insert_new} END;",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS TRG_INVOICE_LINES_SYNC_UPDATE
+        AFTER UPDATE OF invoice_date, invoice_items_json, subtotal, gst_amount ON INVOICES
+        BEGIN DELETE FROM INVOICE_LINES WHERE invoice_id = OLD.invoice_id; {insert_new} END;
+        """,
+    ] + _invoice_lines_rebuild_statements()
+
+
+DRUG_SEARCH_COLUMNS = ["DRUG_NAME", "GENERIC_NAME", "FORMULATION", "DOSAGE", "SUPPLIER"]
+
+# Full-text indexes per content table. drop_secondary_indexes()/rebuild_indexes() suspend their sync
+# triggers during bulk loads and rebuild them in one pass afterwards.
+SEARCH_INDEXES = {
+    "PHARMACY_INVENTORY": ["DRUG_SEARCH_FTS", "DRUG_SEARCH_TRIGRAM"],
+    "DIAGNOSTIC_DATA": ["DIAGNOSTIC_SEARCH_FTS"],
+}
+
+# Trigger-maintained summary tables per source table, recomputed by rebuild_indexes() after bulk loads
+DERIVED_TABLE_REBUILDS = {
+    "PHARMACY_INVENTORY": _inventory_alert_rebuild_statements(iso_only=True),
+    "INVOICES": _invoice_lines_rebuild_statements(),
+}
+
+# Daily roll-forward: drugs whose expiry window opened since they were last written. The EXPIRY_DATE
+# range (up to the widest configured window) uses IDX_INVENTORY_EXPIRY, so only drugs near expiry are visited.
+EXPIRY_ALERT_ROLL_FORWARD_SQL = f"""
+    INSERT INTO EXPIRING_SOON (DRUG_ID, EXPIRY_DATE, EXPIRY_WITHIN_DAYS)
+    SELECT DRUG_ID, EXPIRY_DATE, EXPIRY_WITHIN_DAYS
+    FROM (
+        SELECT PI.DRUG_ID, PI.EXPIRY_DATE,
+               {_alert_threshold_sql("EXPIRY_WITHIN_DAYS", "PI.DRUG_ID", "PI.FORMULATION")} AS EXPIRY_WITHIN_DAYS
+        FROM PHARMACY_INVENTORY PI
+        WHERE PI.EXPIRY_DATE <= (SELECT {_expiry_cutoff_sql("MAX(EXPIRY_WITHIN_DAYS)")} FROM INVENTORY_ALERT_THRESHOLDS)
+          AND PI.DRUG_ID NOT IN (SELECT DRUG_ID FROM EXPIRING_SOON)
+    )
+    WHERE {_expiring_sql("EXPIRY_DATE", "EXPIRY_WITHIN_DAYS", iso_only=True)};
+"""
+
+# Ordered migration steps: (version, description, list of SQL statements).
+# Append new steps with the next version number; never edit a step that has shipped.
+MIGRATIONS = [
+    (1, "Create INVOICES table", [
+        """
+        CREATE TABLE IF NOT EXISTS INVOICES (
+            invoice_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_date TEXT NOT NULL,
+            customer_name TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            invoice_items_json TEXT NOT NULL,
+            subtotal REAL NOT NULL,
+            gst_amount REAL NOT NULL,
+            grand_total REAL NOT NULL
+        );
+        """,
+    ]),
+    (2, "Normalize EXPIRY_DATE and DIAGNOSIS_DATE to 'YYYY-MM-DD' text",
+        _date_normalization_statements("PHARMACY_INVENTORY", "EXPIRY_DATE", "DRUG_ID")
+        + _date_normalization_statements("DIAGNOSTIC_DATA", "DIAGNOSIS_DATE", "PATIENT_ID")),
+    (3, "Indexes for quick search, inventory insights, patient summary and invoice lookups", [
+        # Exact drug lookups (DRUG_NAME [+ DOSAGE + FORMULATION]) and ORDER BY DRUG_NAME lists.
+        # DRUG_ID is the rowid, so the name lists are answered from the index alone.
+        "CREATE INDEX IF NOT EXISTS IDX_INVENTORY_DRUG_NAME ON PHARMACY_INVENTORY (DRUG_NAME, DOSAGE, FORMULATION);",
+        # Inventory insights: STOCK_QUANTITY < N OR EXPIRY_DATE <= D (multi-index OR)
+        "CREATE INDEX IF NOT EXISTS IDX_INVENTORY_EXPIRY ON PHARMACY_INVENTORY (EXPIRY_DATE, STOCK_QUANTITY);",
+        "CREATE INDEX IF NOT EXISTS IDX_INVENTORY_STOCK ON PHARMACY_INVENTORY (STOCK_QUANTITY, EXPIRY_DATE);",
+        "CREATE INDEX IF NOT EXISTS IDX_INVENTORY_SUPPLIER ON PHARMACY_INVENTORY (SUPPLIER, DRUG_NAME);",
+        # Patient pickers (ORDER BY PATIENT_NAME) and name lookups
+        "CREATE INDEX IF NOT EXISTS IDX_DIAGNOSTIC_PATIENT_NAME ON DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS_DATE);",
+        "CREATE INDEX IF NOT EXISTS IDX_DIAGNOSTIC_DIAGNOSIS ON DIAGNOSTIC_DATA (DIAGNOSIS, DIAGNOSIS_DATE);",
+        "CREATE INDEX IF NOT EXISTS IDX_DIAGNOSTIC_DATE ON DIAGNOSTIC_DATA (DIAGNOSIS_DATE);",
+        # JOIN PHARMACY_INVENTORY ON DRUG_ID = DRUG_ID_PRESCRIBED, and FK checks on drug deletes
+        "CREATE INDEX IF NOT EXISTS IDX_DIAGNOSTIC_DRUG ON DIAGNOSTIC_DATA (DRUG_ID_PRESCRIBED);",
+        "CREATE INDEX IF NOT EXISTS IDX_INVOICES_DATE ON INVOICES (invoice_date);",
+        "ANALYZE;",
+    ]),
+    (4, "Full-text drug search: word/prefix index and trigram index for substrings and typos",
+        # Words with 2- and 3-character prefix indexes, so "lip" or "am 500" match while typing
+        _search_index_statements("DRUG_SEARCH_FTS", "PHARMACY_INVENTORY", "DRUG_ID", DRUG_SEARCH_COLUMNS,
+                                 "unicode61 remove_diacritics 2", ", prefix='2 3'")
+        + _search_index_statements("DRUG_SEARCH_TRIGRAM", "PHARMACY_INVENTORY", "DRUG_ID",
+                                   ["DRUG_NAME", "GENERIC_NAME", "SUPPLIER"], "trigram")),
+    (5, "Full-text search over diagnoses and test results",
+        # Porter stemming so "elevated" also finds "elevation"; prefixes for partial words like "hba"
+        _search_index_statements("DIAGNOSTIC_SEARCH_FTS", "DIAGNOSTIC_DATA", "PATIENT_ID", ["DIAGNOSIS", "TEST_RESULTS"],
+                                 "porter unicode61 remove_diacritics 2", ", prefix='2 3'")),
+    (6, "LOW_STOCK and EXPIRING_SOON alert tables with per-drug / per-formulation thresholds",
+        _inventory_alert_statements()),
+    (7, "INVOICE_LINES: one row per invoice cart item, backfilled from invoice_items_json",
+        _invoice_lines_statements()),
+    (8, "Convert only unambiguous NN/NN/YYYY dates, log invalid dates for review and keep them out of EXPIRING_SOON",
+        _date_review_statements([("PHARMACY_INVENTORY", "EXPIRY_DATE", "DRUG_ID"),
+                                 ("DIAGNOSTIC_DATA", "DIAGNOSIS_DATE", "PATIENT_ID")])
+        + _iso_only_alert_statements()),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Returns the highest applied migration version (0 for a database that predates migrations)."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        );
+    """)
+    row = conn.execute(f"SELECT MAX(version) FROM {SCHEMA_VERSION_TABLE};").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    """
+    Brings the database up to LATEST_SCHEMA_VERSION in place.
+    Each step runs in its own BEGIN IMMEDIATE transaction, so a second process starting at the same
+    time waits for the lock and then sees the step as already applied.
+    Returns the list of versions applied by this call.
+    """
+    applied = []
+    if get_schema_version(conn) >= LATEST_SCHEMA_VERSION:
+        return applied
+
+    for version, description, statements in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, ?);",
+                (version, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            conn.commit()
+            applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+def drop_secondary_indexes(conn, table):
+    """
+    Drops the table's explicit indexes and sync triggers (full-text indexes, alert tables), and returns
+    their CREATE statements for rebuild_indexes().
+    """
+    objects = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+        "AND (type = 'index' OR (type = 'trigger' AND name LIKE 'TRG\\_%\\_SYNC\\_%' ESCAPE '\\'));", (table,)
+    ).fetchall()
+    for object_type, name, _ in objects:
+        conn.execute(f'DROP {object_type.upper()} IF EXISTS "{name}";')
+    conn.commit()
+    return [sql for _, _, sql in objects]
+
+
+def rebuild_indexes(conn, table, index_statements):
+    """
+    Recreates what drop_secondary_indexes() dropped, rebuilds the table's full-text indexes and derived
+    tables in one pass and refreshes the table's statistics.
+    """
+    rebuild_search = any(statement.lstrip().upper().startswith("CREATE TRIGGER") for statement in index_statements)
+    for statement in index_statements:
+        statement = statement.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+        conn.execute(statement.replace("CREATE TRIGGER ", "CREATE TRIGGER IF NOT EXISTS ", 1))
+    if rebuild_search:
+        for fts_table in SEARCH_INDEXES.get(table, []):
+            conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild');")
+        for statement in DERIVED_TABLE_REBUILDS.get(table, []):
+            conn.execute(statement)
+    conn.execute(f"ANALYZE {table};")
+    conn.commit()
@@ -0,0 +1,295 @@
+# services/patient_summaries.py
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from prompts import LLM_PATIENT_SUMMARY_PROMPT
+from services.database_service import NAMED_QUERIES, execute_sql_query, run_named_query
+from services.db_connection import get_connection, get_read_connection
+from services.gemini_client import GEMINI_REQUESTS_PER_MINUTE, is_configured
+from services.gemini_service import get_llm_analysis_from_data
+
+# Kept in its own file like the SQL cache: a batch writes one row per patient, and writes to the main
+# database would invalidate the query result cache for every page while the batch runs.
+PATIENT_SUMMARY_DB = os.path.join("data", "patient_summaries.db")
+# Concurrent Gemini calls. The shared rate limiter (services/gemini_client) still paces them to the
+# project quota; the pool only needs to be wide enough to keep that quota busy while calls are in flight.
+BATCH_SUMMARY_WORKERS = int(os.getenv("BATCH_SUMMARY_WORKERS", "8"))
+BATCH_SUMMARY_ROUNDS = 3  # A failed patient is retried on its own in up to this many rounds in total
+BATCH_RETRY_PAUSE_S = 10  # Pause before a retry round, so a quota dip has time to recover
+
+# STATUS values: done (SUMMARY is current), failed (retryable), blocked (safety filters; not retried)
+BLOCKED_PREFIX = "Error: Analysis blocked"
+
+_initialized = set()
+
+
+def init_patient_summary_db(summary_db=PATIENT_SUMMARY_DB):
+    """Creates the summaries table if it does not exist."""
+    with get_connection(summary_db) as conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS PATIENT_SUMMARIES (
+                PATIENT_ID INTEGER PRIMARY KEY,
+                PATIENT_NAME TEXT,
+                STATUS TEXT NOT NULL,
+                SUMMARY TEXT,
+                ERROR TEXT,
+                HISTORY_HASH TEXT NOT NULL,
+                ATTEMPTS INTEGER NOT NULL DEFAULT 0,
+                BATCH_ID TEXT,
+                UPDATED_AT REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS IDX_PATIENT_SUMMARIES_STATUS ON PATIENT_SUMMARIES (STATUS, PATIENT_ID);
+        """)
+        conn.commit()
+    _initialized.add(summary_db)
+
+
+def _ensure_db(summary_db):
+    if summary_db not in _initialized:
+        init_patient_summary_db(summary_db)
+
+
+def patient_ids_for_diagnosis(diagnosis):
+    """PATIENT_IDs of every record with this exact diagnosis, or an error string."""
+    rows, _ = run_named_query("patient_ids_by_diagnosis", diagnosis=diagnosis)
+    return rows if isinstance(rows, str) else [row[0] for row in rows]
+
+
+def parse_patient_ids(text):
+    """
+    PATIENT_IDs from pasted text or an appointment export, in order and deduplicated. A CSV whose header
+    has a PATIENT_ID column contributes that column only; anything else contributes every integer token.
+    """
+    lines = text.strip().splitlines()
+    if lines and "patient_id" in lines[0].lower():
+        reader = csv.DictReader(lines)
+        column = next((name for name in reader.fieldnames if name and name.strip().lower() == "patient_id"), None)
+        if column:
+            text = " ".join((row.get(column) or "") for row in reader)
+    ids = []
+    for token in text.replace(",", " ").replace(";", " ").split():
+        token = token.strip("\"'")
+        if token.isdigit() and int(token) not in ids:
+            ids.append(int(token))
+    return ids
+
+
+def fetch_patient_histories(patient_ids):
+    """
+    Every selected patient's history in one set-based query. Returns {patient_id: (name, rows)} with
+    rows as the column dicts the single-patient summary sends, or an error string.
+    """
+    rows, columns = execute_sql_query(NAMED_QUERIES["patient_history_batch"], {"patient_ids": json.dumps(list(patient_ids))})
+    if isinstance(rows, str):
+        return rows
+    histories = {}
+    for row in rows:
+        record = dict(zip(columns, row))
+        patient_id = record.pop("PATIENT_ID")
+        histories.setdefault(patient_id, (record["PATIENT_NAME"], []))[1].append(record)
+    return histories
+
+
+def history_hash(rows):
+    """Fingerprint of a patient's history: a stored summary is current while this is unchanged."""
+    return hashlib.sha256(json.dumps(rows, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _current_summaries(patient_ids, summary_db):
+    """{patient_id: HISTORY_HASH} for patients whose stored summary is done."""
+    with get_read_connection(summary_db) as conn:
+        rows = conn.execute(
+            "SELECT PATIENT_ID, HISTORY_HASH FROM PATIENT_SUMMARIES WHERE STATUS = 'done' "
+            "AND PATIENT_ID IN (SELECT value FROM json_each(?));",
+            (json.dumps(list(patient_ids)),),
+        ).fetchall()
+    return dict(rows)
+
+
+def _save_result(summary_db, batch_id, patient_id, name, digest, status, text):
+    with get_connection(summary_db) as conn:
+        conn.execute("""
+            INSERT INTO PATIENT_SUMMARIES (PATIENT_ID, PATIENT_NAME, STATUS, SUMMARY, ERROR, HISTORY_HASH, ATTEMPTS, BATCH_ID, UPDATED_AT)
+            VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT (PATIENT_ID) DO UPDATE SET
+                PATIENT_NAME = excluded.PATIENT_NAME, STATUS = excluded.STATUS, ERROR = excluded.ERROR,
+                -- A failed retry keeps the last good summary for reference; HISTORY_HASH still marks it stale
+                SUMMARY = CASE WHEN excluded.STATUS = 'done' THEN excluded.SUMMARY ELSE SUMMARY END,
+                HISTORY_HASH = excluded.HISTORY_HASH,
+                ATTEMPTS = CASE WHEN BATCH_ID = excluded.BATCH_ID THEN ATTEMPTS + 1 ELSE 1 END,
+                BATCH_ID = excluded.BATCH_ID, UPDATED_AT = excluded.UPDATED_AT;
+        """, (patient_id, name, status, text if status == "done" else None, None if status == "done" else text,
+              digest, batch_id, time.time()))
+        conn.commit()
+
+
+def _summarize_one(patient_id, name, rows):
+    """One Gemini call for one patient. Returns (status, summary or error string)."""
+    # quiet: worker threads have no Streamlit script context, so failures come back in the string only
+    summary = get_llm_analysis_from_data(
+        rows, LLM_PATIENT_SUMMARY_PROMPT, original_request=f"Summarize the health history for {name} (ID: {patient_id})",
+        quiet=True
+    )
+    if not summary:
+        return "failed", "Error: Empty response from the model."
+    if summary.startswith(BLOCKED_PREFIX):
+        return "blocked", summary
+    if summary.startswith("Error:"):
+        return "failed", summary
+    return "done", summary
+
+
+def summarize_patients(patient_ids, workers=BATCH_SUMMARY_WORKERS, rounds=BATCH_SUMMARY_ROUNDS, force=False,
+                       on_progress=None, summary_db=PATIENT_SUMMARY_DB):
+    """
+    Generates and stores summaries for many patients. Histories are read with one query; patients whose
+    stored summary matches their current history are skipped unless force. Gemini calls run on a pool of
+    workers threads, paced by the shared rate limiter, and a patient whose call fails is retried on its own
+    in a later round. on_progress(completed, total, patient_id, status, error) is called from this
+    thread (the caller's, so it may use Streamlit) after each call; status "retrying" means the patient
+    failed and is queued for the next round, and error is the failure's message or None. Returns a report dict, or an error string when nothing could be started.
+    """
+    if not is_configured():
+        return "Error: Gemini API not configured."
+    _ensure_db(summary_db)
+    patient_ids = list(dict.fromkeys(patient_ids))
+    histories = fetch_patient_histories(patient_ids)
+    if isinstance(histories, str):
+        return histories
+
+    started = time.monotonic()
+    batch_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    report = {"batch_id": batch_id, "requested": len(patient_ids), "results": {}, "retried": 0}
+    current = {} if force else _current_summaries(histories, summary_db)
+    pending = []
+    for patient_id in patient_ids:
+        if patient_id not in histories:
+            report["results"][patient_id] = "no_data"
+            continue
+        name, rows = histories[patient_id]
+        digest = history_hash(rows)
+        if current.get(patient_id) == digest:
+            report["results"][patient_id] = "up_to_date"
+        else:
+            pending.append((patient_id, name, rows, digest))
+
+    total, completed = len(pending), 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="patient-summary") as pool:
+        for round_number in range(1, rounds + 1):
+            if not pending:
+                break
+            if round_number > 1:
+                report["retried"] += len(pending)
+                time.sleep(BATCH_RETRY_PAUSE_S)
+            futures = {pool.submit(_summarize_one, patient_id, name, rows): (patient_id, name, rows, digest)
+                       for patient_id, name, rows, digest in pending}
+            pending = []
+            for future in as_completed(futures):
+                patient_id, name, rows, digest = futures[future]
+                try:
+                    status, text = future.result()
+                except Exception as e:  # A bug or DB error in one call must not sink the batch
+                    status, text = "failed", f"Error: {e}"
+                _save_result(summary_db, batch_id, patient_id, name, digest, status, text)
+                report["results"][patient_id] = status
+                error = None if status == "done" else text
+                if status == "failed" and round_number < rounds:
+                    pending.append((patient_id, name, rows, digest))
+                    if on_progress:
+                        on_progress(completed, total, patient_id, "retrying", error)
+                    continue
+                completed += 1
+                if on_progress:
+                    on_progress(completed, total, patient_id, status, error)
+
+    statuses = list(report["results"].values())
+    for status in ("done", "failed", "blocked", "up_to_date", "no_data"):
+        report[status] = statuses.count(status)
+    report["elapsed_s"] = time.monotonic() - started
+    return report
+
+
+def get_patient_summaries(patient_ids=None, status=None, summary_db=PATIENT_SUMMARY_DB):
+    """Stored summaries as dicts (all, or only these PATIENT_IDs / this STATUS), newest first."""
+    _ensure_db(summary_db)
+    query = """
+        SELECT PATIENT_ID, PATIENT_NAME, STATUS, SUMMARY, ERROR, ATTEMPTS, BATCH_ID,
+               datetime(UPDATED_AT, 'unixepoch', 'localtime') AS UPDATED
+        FROM PATIENT_SUMMARIES
+        WHERE (? IS NULL OR PATIENT_ID IN (SELECT value FROM json_each(?))) AND (? IS NULL OR STATUS = ?)
+        ORDER BY UPDATED_AT DESC, PATIENT_ID;
+    """
+    ids_json = None if patient_ids is None else json.dumps(list(patient_ids))
+    with get_read_connection(summary_db) as conn:
+        cursor = conn.execute(query, (ids_json, ids_json, status, status))
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def failed_patient_ids(summary_db=PATIENT_SUMMARY_DB):
+    """PATIENT_IDs whose last attempt failed, for a later retry of just those patients."""
+    return [entry["PATIENT_ID"] for entry in get_patient_summaries(status="failed", summary_db=summary_db)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and store AI patient summaries for many patients at once.")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--diagnosis", help="Every patient with this exact diagnosis")
+    selection.add_argument("--ids", help="Comma-separated PATIENT_IDs")
+    selection.add_argument("--ids-file", help="File with PATIENT_IDs, e.g. tomorrow's appointment list exported as CSV")
+    selection.add_argument("--retry-failed", action="store_true", help="Patients whose last summary attempt failed")
+    parser.add_argument("--workers", type=int, default=BATCH_SUMMARY_WORKERS, help="Concurrent Gemini calls")
+    parser.add_argument("--force", action="store_true", help="Regenerate summaries that are already up to date")
+    parser.add_argument("--export", help="Write the batch's stored summaries to this CSV file")
+    args = parser.parse_args(argv)
+
+    if args.diagnosis:
+        patient_ids = patient_ids_for_diagnosis(args.diagnosis)
+    elif args.ids:
+        patient_ids = parse_patient_ids(args.ids)
+    elif args.ids_file:
+        with open(args.ids_file, encoding="utf-8") as f:
+            patient_ids = parse_patient_ids(f.read())
+    else:
+        patient_ids = failed_patient_ids()
+    if isinstance(patient_ids, str):
+        sys.exit(patient_ids)
+    if not patient_ids:
+        print("No patients selected.")
+        return
+
+    print(f"Summarizing {len(patient_ids)} patients with {args.workers} workers "
+          f"(Gemini paced to {GEMINI_REQUESTS_PER_MINUTE} requests/minute)...")
+
+    def progress(completed, total, patient_id, status, error):
+        print(f"  [{completed}/{total}] patient {patient_id}: {status}" + (f" ({error})" if error else ""), flush=True)
+
+    report = summarize_patients(patient_ids, workers=args.workers, force=args.force, on_progress=progress)
+    if isinstance(report, str):
+        sys.exit(report)
+    print(f"{report['done']} summarized, {report['up_to_date']} already up to date, {report['failed']} failed, "
+          f"{report['blocked']} blocked, {report['no_data']} without records; {report['retried']} retries; "
+          f"{report['elapsed_s']:.1f}s")
+
+    if args.export:
+        summaries = get_patient_summaries(patient_ids)
+        with open(args.export, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["PATIENT_ID", "PATIENT_NAME", "STATUS", "SUMMARY", "ERROR", "ATTEMPTS", "BATCH_ID", "UPDATED"])
+            writer.writeheader()
+            writer.writerows(summaries)
+        print(f"Wrote {len(summaries)} summaries to {args.export}")
+    if report["failed"]:
+        print("Some summaries failed; rerun with --retry-failed to try just those patients.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.patient_summaries --diagnosis "Asthma" [--workers 8] [--export summaries.csv]
+    main()
@@ -0,0 +1,199 @@
+# services/prompt_data.py
+import pandas as pd
+
+from services.gemini_client import estimate_tokens
+
+# Query results are sent to the analysis model as a tab-separated table (header once). When that table
+# would exceed the call's token budget, the model gets statistics computed over every row plus a
+# stratified sample of rows instead, with a note saying so.
+AGG_TOP_N = 10  # Most frequent values listed per text column
+AGG_MAX_GROUPS = 25  # A text column with at most this many distinct values can be the grouping column
+SAMPLE_SEED = 0  # Fixed, so the same result always sends the same sample
+MAX_CELL_CHARS = 300  # Long free text (e.g. test results) is cut to this in the table
+
+_ID_SUFFIXES = ("_ID", "ID", "_id", "id")
+
+
+def _cell(value):
+    """One table cell: no tabs/newlines, compact numbers, empty for NULL."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float):
+        value = round(value, 4)
+        return str(int(value)) if value.is_integer() else str(value)
+    text = " ".join(str(value).split())
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def encode_rows(rows):
+    """
+    List of dicts as a tab-separated table: the header once, then one line per row. A column holding
+    the same value on every row (e.g. the patient's name in a history) is stated once above the table.
+    """
+    if not rows:
+        return "(no rows)"
+    columns = list(rows[0].keys())
+    constant = {}
+    if len(rows) > 1:
+        for column in columns:
+            first = rows[0].get(column)
+            if all(row.get(column) == first for row in rows):
+                constant[column] = first
+    varying = [column for column in columns if column not in constant]
+    lines = []
+    if constant:
+        lines.append("Same on every row: " + "; ".join(f"{column}={_cell(value)}" for column, value in constant.items()))
+    if varying:
+        lines.append("\t".join(varying))
+        lines.extend("\t".join(_cell(row.get(column)) for column in varying) for row in rows)
+    return "\n".join(lines)
+
+
+def _is_id_column(column):
+    return str(column).endswith(_ID_SUFFIXES)
+
+
+def _column_kinds(frame):
+    """Splits columns into numeric measures, dates and text; ID columns are neither summed nor ranked."""
+    numeric, dates, text = [], [], []
+    for column in frame.columns:
+        series = frame[column]
+        if _is_id_column(column):
+            continue
+        if pd.api.types.is_bool_dtype(series):
+            text.append(column)
+        elif pd.api.types.is_numeric_dtype(series):
+            numeric.append(column)
+        else:
+            parsed = pd.to_datetime(series, errors="coerce", format="%Y-%m-%d")
+            if series.notna().any() and parsed.notna().sum() >= 0.9 * series.notna().sum():
+                dates.append(column)
+            else:
+                text.append(column)
+    return numeric, dates, text
+
+
+def _group_column(frame, text_columns):
+    """The first text column with 2..AGG_MAX_GROUPS distinct values, or None."""
+    for column in text_columns:
+        if 2 <= frame[column].nunique(dropna=True) <= AGG_MAX_GROUPS:
+            return column
+    return None
+
+
+def _statistics(frame, top_n, with_groups):
+    """
+    Aggregates over every row: numeric stats, date ranges, top values per text column and, when
+    with_groups, per-group stats. Returns (text, grouping column or None).
+    """
+    numeric, dates, text = _column_kinds(frame)
+    sections = []
+    if numeric:
+        described = frame[numeric].agg(["count", "sum", "mean", "min", "max"]).T
+        sections.append("Numeric columns:\n" + encode_rows(
+            [{"COLUMN": column, **{stat.upper(): value for stat, value in stats.items()}} for column, stats in described.iterrows()]
+        ))
+    for column in dates:
+        parsed = pd.to_datetime(frame[column], errors="coerce", format="%Y-%m-%d")
+        sections.append(f"{column}: {parsed.min():%Y-%m-%d} to {parsed.max():%Y-%m-%d} ({parsed.notna().sum()} dated rows)")
+    for column in text:
+        counts = frame[column].value_counts(dropna=True)
+        if counts.empty:
+            continue
+        if counts.iloc[0] == 1 and len(counts) > top_n:
+            sections.append(f"{column}: {len(counts)} distinct values, none repeated")
+            continue
+        listed = ", ".join(f"{_cell(value)} ({count})" for value, count in counts.head(top_n).items())
+        others = f", and {len(counts) - top_n} other values" if len(counts) > top_n else ""
+        sections.append(f"{column} (most frequent): {listed}{others}")
+    group_column = _group_column(frame, text)
+    if group_column and with_groups:
+        grouped = frame.groupby(group_column, dropna=False)
+        per_group = grouped.size().rename("ROWS").to_frame()
+        for column in numeric:
+            per_group[f"SUM_{column}"] = grouped[column].sum()
+            per_group[f"AVG_{column}"] = grouped[column].mean()
+        per_group = per_group.sort_values("ROWS", ascending=False).reset_index()
+        sections.append(f"Per {group_column}:\n" + encode_rows(per_group.to_dict("records")))
+    return "\n".join(sections), group_column
+
+
+def stratified_sample(frame, size, group_column=None):
+    """
+    About size rows: proportional to each group's share (at least one row per group) when group_column
+    is given, else uniformly at random. Rows keep their original order.
+    """
+    if size >= len(frame):
+        return frame
+    if not group_column:
+        return frame.sample(n=size, random_state=SAMPLE_SEED).sort_index()
+    parts = [
+        group.sample(n=min(len(group), max(1, round(size * len(group) / len(frame)))), random_state=SAMPLE_SEED)
+        for _, group in frame.groupby(group_column, sort=False, dropna=False)
+    ]
+    return pd.concat(parts).sort_index()
+
+
+def _truncate_to_budget(text, token_budget):
+    """Last resort: whole lines up to the budget."""
+    kept, used = [], 0
+    for line in text.split("\n"):
+        used += estimate_tokens(line + "\n")
+        if used > token_budget:
+            kept.append("(truncated to fit the size limit)")
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _summarize(rows, token_budget, table_tokens):
+    """Statistics over all rows plus a sample sized to what is left of the budget."""
+    frame = pd.DataFrame(rows)
+    for top_n, with_groups in ((AGG_TOP_N, True), (AGG_TOP_N // 2, True), (AGG_TOP_N // 2, False)):
+        statistics, group_column = _statistics(frame, top_n, with_groups)
+        if estimate_tokens(statistics) <= token_budget * 0.6:
+            break
+    statistics = _truncate_to_budget(statistics, int(token_budget * 0.6))
+
+    # Sample rows cost about the same as the average full-table row; shrink until the sample fits
+    remaining = token_budget - estimate_tokens(statistics) - 200  # Room for the note and headings
+    size = max(0, int(remaining / (table_tokens / len(rows))))
+    sample_text = ""
+    while size > 0:
+        sample = stratified_sample(frame, size, group_column)
+        sample_text = encode_rows(sample.astype(object).where(sample.notna(), None).to_dict("records"))
+        if estimate_tokens(sample_text) <= remaining:
+            size = len(sample)  # At least one row per group can add a few
+            break
+        size = int(size * 0.8)
+    if size <= 0:
+        sample_text, size = "", 0
+
+    how = f"stratified by {group_column} (proportional to each group's row count)" if group_column else "at random"
+    note = (f"NOTE: The full result has {len(rows):,} rows (about {table_tokens:,} tokens as a table), more than the "
+            f"{token_budget:,}-token limit for this request, so it was summarized before sending. The statistics "
+            f"below were computed over all {len(rows):,} rows"
+            + (f"; the {size:,} sample rows were chosen {how} and are examples only." if size else ".")
+            + " Base totals, counts and rankings on the statistics, not on the sample.")
+    parts = [note, f"Statistics over all {len(rows):,} rows:\n{statistics}"]
+    if size:
+        parts.append(f"Sample rows ({size:,} of {len(rows):,}; tab-separated, header first):\n{sample_text}")
+    return "\n\n".join(parts)
+
+
+def encode_for_prompt(data, token_budget):
+    """
+    Query results for an analysis prompt, within token_budget (estimated locally, see
+    gemini_client.estimate_tokens). Returns (text, summarized): the compact table when it fits, else
+    statistics plus a sample with a note telling the model what was summarized.
+    """
+    if not (isinstance(data, list) and all(isinstance(d, dict) for d in data)):
+        text = str(data)  # Fallback for non-dict data (e.g., simple list of tuples)
+        if estimate_tokens(text) <= token_budget:
+            return text, False
+        return _truncate_to_budget(text, token_budget), True
+    table = encode_rows(data)
+    table_tokens = estimate_tokens(table)
+    if table_tokens <= token_budget:
+        return (f"{len(data):,} rows, tab-separated, header first:\n{table}" if data else table), False
+    return _summarize(data, token_budget, table_tokens), True
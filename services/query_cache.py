@@ -0,0 +1,108 @@
+# services/query_cache.py
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+from services.db_connection import DATABASE_FILE, get_read_connection
+
+QUERY_CACHE_MAX_ENTRIES = 256
+QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Approximate, see _estimate_size()
+
+_cache = OrderedDict()  # (normalized sql, params) -> (data_version, rows, columns, size)
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "bytes": 0}
+
+# A connection that never writes. SQLite changes its PRAGMA data_version whenever any *other*
+# connection commits (pooled connections in this process, CLI tools, other workers), which
+# makes it a cheap global "has anything changed?" check.
+_watcher_conn = None
+_watcher_lock = threading.Lock()
+
+
+def _current_data_version():
+    global _watcher_conn
+    with _watcher_lock:
+        if _watcher_conn is None:
+            _watcher_conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+        return _watcher_conn.execute("PRAGMA data_version;").fetchone()[0]
+
+
+def normalize_sql(query):
+    """Collapses whitespace and drops the trailing semicolon so equivalent SQL shares an entry."""
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+
+def _estimate_size(rows, columns):
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(c) for c in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+def _evict_locked():
+    while _cache and (len(_cache) > QUERY_CACHE_MAX_ENTRIES or _stats["bytes"] > QUERY_CACHE_MAX_BYTES):
+        _, (_, _, _, size) = _cache.popitem(last=False)
+        _stats["bytes"] -= size
+        _stats["evictions"] += 1
+
+
+def cached_select(query, params=()):
+    """
+    Read-through cache for SELECTs on the main database. Returns (rows, columns).
+    An entry is served only while the database's data_version is unchanged, so any committed
+    write (from this process or another) invalidates every cached result.
+    Database errors are raised to the caller and never cached.
+    """
+    key = (normalize_sql(query), tuple(params))
+    data_version = _current_data_version()
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            if entry[0] == data_version:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return list(entry[1]), entry[2]
+            del _cache[key]
+            _stats["bytes"] -= entry[3]
+            _stats["invalidations"] += 1
+        _stats["misses"] += 1
+
+    # data_version was read before the query ran: a commit that lands mid-query leaves this entry
+    # tagged with the older version, so the next lookup misses instead of serving stale rows.
+    with get_read_connection() as conn:
+        cursor = conn.execute(query, params)
+        rows = tuple(cursor.fetchall())
+        columns = [description[0] for description in cursor.description]
+
+    size = _estimate_size(rows, columns)
+    if size <= QUERY_CACHE_MAX_BYTES // 4:  # Don't let one huge result flush the whole cache
+        with _cache_lock:
+            previous = _cache.pop(key, None)
+            if previous is not None:
+                _stats["bytes"] -= previous[3]
+            _cache[key] = (data_version, rows, columns, size)
+            _stats["bytes"] += size
+            _evict_locked()
+    return list(rows), columns
+
+
+def clear_query_cache():
+    """Drops every cached result (statistics are kept)."""
+    with _cache_lock:
+        _cache.clear()
+        _stats["bytes"] = 0
+
+
+def get_query_cache_stats():
+    """Returns hit/miss counters, hit rate, entry count and approximate memory use."""
+    with _cache_lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_cache)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["max_entries"] = QUERY_CACHE_MAX_ENTRIES
+    stats["max_bytes"] = QUERY_CACHE_MAX_BYTES
+    return stats
@@ -0,0 +1,266 @@
+# services/query_guard.py
+import math
+import re
+import sqlite3
+
+from services.db_connection import get_read_connection
+from services.database_service import MAX_RESULT_ROWS, is_select_query
+
+LARGE_TABLE_ROWS = 50000  # Scans, sorts and joins below this many rows are never flagged
+DEFAULT_SEARCH_ROWS = 10  # Rows per index equality lookup when sqlite_stat1 has no figure (SQLite's own default)
+RANGE_SELECTIVITY = 4  # A range constraint keeps ~1/4 of the rows (SQLite's planner heuristic)
+FTS_MATCH_SELECTIVITY = 100  # A full-text MATCH is assumed to hit ~1% of the indexed rows
+
+# Action per issue kind for each role. Actions escalate allow < warn < rewrite < refuse;
+# "rewrite" only applies to missing_limit and is treated as "warn" for anything else.
+# max_cost refuses any statement whose estimated rows visited exceed it (None = no ceiling).
+QUERY_GUARD_POLICIES = {
+    "Admin": {
+        "full_scan": "warn", "cartesian_join": "warn", "missing_limit": "warn", "unindexed_sort": "warn",
+        "max_cost": None,
+    },
+    "Pharmacist": {
+        "full_scan": "warn", "cartesian_join": "refuse", "missing_limit": "rewrite", "unindexed_sort": "warn",
+        "max_cost": 5000000,
+    },
+    "Doctor": {
+        "full_scan": "warn", "cartesian_join": "refuse", "missing_limit": "rewrite", "unindexed_sort": "warn",
+        "max_cost": 5000000,
+    },
+}
+DEFAULT_GUARD_POLICY = {
+    "full_scan": "warn", "cartesian_join": "refuse", "missing_limit": "rewrite", "unindexed_sort": "refuse",
+    "max_cost": 1000000,
+}
+GUARD_ACTIONS = ("allow", "warn", "rewrite", "refuse")
+
+_SQL_KEYWORDS = {
+    "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "NATURAL", "ON", "USING", "GROUP", "ORDER",
+    "LIMIT", "HAVING", "UNION", "EXCEPT", "INTERSECT", "WINDOW", "SET", "VALUES", "SELECT", "AS",
+}
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+# Aggregate calls as they appear in _outer_query(): "(,)" marks arguments with a comma. MIN/MAX with
+# two or more arguments are scalar functions, so only their one-argument form counts.
+_AGGREGATE_CALL = re.compile(r"\b(?:COUNT|SUM|AVG|TOTAL|GROUP_CONCAT)\s*\(,?\)|\b(?:MIN|MAX)\s*\(\)", re.IGNORECASE)
+
+
+def _table_row_counts(conn):
+    """Row counts per table (upper-cased name) from sqlite_stat1, falling back to MAX(rowid)."""
+    counts = {}
+    try:
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1;"):
+            rows = int(stat.split()[0]) if stat else 0
+            counts[table.upper()] = max(counts.get(table.upper(), 0), rows)
+    except sqlite3.Error:
+        pass  # No ANALYZE yet
+    tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%';").fetchall()
+    for table, sql in tables:
+        if table.upper() not in counts and not (sql or "").upper().startswith("CREATE VIRTUAL TABLE"):
+            try:
+                counts[table.upper()] = conn.execute(f'SELECT MAX(rowid) FROM "{table}";').fetchone()[0] or 0
+            except sqlite3.Error:
+                counts[table.upper()] = 0  # WITHOUT ROWID tables
+    # External-content full-text tables index one row per row of their content table
+    for table, sql in tables:
+        content = re.search(r"content\s*=\s*'(\w+)'", sql or "", re.IGNORECASE)
+        if content and table.upper() not in counts:
+            counts[table.upper()] = counts.get(content.group(1).upper(), 0)
+    return counts
+
+
+def _index_rows_per_key(conn):
+    """{INDEX_NAME: [rows per distinct value of the first column, first two columns, ...]} from sqlite_stat1."""
+    per_key = {}
+    try:
+        for index_name, stat in conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL;"):
+            numbers = [int(n) for n in stat.split() if n.isdigit()]
+            per_key[index_name.upper()] = numbers[1:]
+    except sqlite3.Error:
+        pass
+    return per_key
+
+
+def _table_aliases(query):
+    """Maps alias -> table name for FROM/JOIN clauses (EXPLAIN QUERY PLAN reports aliases)."""
+    aliases = {}
+    for table, alias in re.findall(r"(?:\bFROM|\bJOIN|,)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?", query, re.IGNORECASE):
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            aliases[alias.upper()] = table.upper()
+    return aliases
+
+
+def _is_fts_match(detail):
+    """True for an FTS5 lookup driven by a MATCH constraint (idxStr contains 'M')."""
+    return bool(re.search(r"VIRTUAL TABLE INDEX \d+:\S*M", detail))
+
+
+def _loop_rows(detail, table_rows, rows_per_key):
+    """Estimated rows produced by one SCAN/SEARCH loop of the plan."""
+    if _is_fts_match(detail):
+        return max(1, table_rows // FTS_MATCH_SELECTIVITY)
+    if detail.startswith("SCAN"):
+        return table_rows
+    if "INTEGER PRIMARY KEY" in detail:
+        return 1 if "rowid=?" in detail else max(1, table_rows // RANGE_SELECTIVITY)
+    index_match = re.search(r"INDEX (\w+)", detail)
+    constraint_match = re.search(r"\(([^()]*)\)\s*$", detail)
+    constraints = constraint_match.group(1) if constraint_match else ""
+    equalities = len(re.findall(r"(?<![<>])=\?", constraints))
+    has_range = bool(re.search(r"[<>]", constraints))
+    if equalities > 0:
+        stats = rows_per_key.get(index_match.group(1).upper(), []) if index_match else []
+        rows = stats[equalities - 1] if len(stats) >= equalities else DEFAULT_SEARCH_ROWS
+    else:
+        rows = table_rows
+    if has_range:
+        rows = rows // RANGE_SELECTIVITY
+    return max(1, min(rows, table_rows or rows))
+
+
+def _outer_query(statement):
+    """
+    The statement's top level only: string literals emptied and every parenthesised group (subqueries,
+    CTE bodies, function arguments) collapsed to "()", or "(,)" when it has a comma at its own level.
+    """
+    text = _STRING_LITERAL.sub("''", statement)
+    parts, depth, has_comma = [], 0, False
+    for char in text:
+        if char == "(":
+            depth += 1
+            has_comma = has_comma if depth > 1 else False
+        elif char == ")" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                parts.append("(,)" if has_comma else "()")
+        elif depth == 0:
+            parts.append(char)
+        elif depth == 1 and char == ",":
+            has_comma = True
+    return "".join(parts)
+
+
+def _returns_aggregate(statement):
+    """
+    True when the top-level SELECT aggregates: GROUP BY or DISTINCT (one row per group or value), or an
+    aggregate in the select list without GROUP BY (one row). Its output is then far smaller than the
+    rows scanned, so the scan estimate says nothing about the result size.
+    """
+    outer = _outer_query(statement)
+    if re.search(r"\b(?:UNION|EXCEPT|INTERSECT|OVER)\b", outer, re.IGNORECASE):
+        return False  # Compound results add up; window functions keep every row
+    if re.search(r"\bGROUP\s+BY\b|\bSELECT\s+DISTINCT\b", outer, re.IGNORECASE):
+        return True
+    select_list = re.search(r"\bSELECT\b(.*?)(?:\bFROM\b|$)", outer, re.IGNORECASE | re.DOTALL)
+    return bool(select_list and _AGGREGATE_CALL.search(select_list.group(1)))
+
+
+def format_query_plan(plan):
+    """Renders EXPLAIN QUERY PLAN rows as an indented tree (like the sqlite3 shell's .eqp output)."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in plan:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append(f"{'   ' * depth[node_id]}|-- {detail}")
+    return "\n".join(lines)
+
+
+def analyze_query(query, params=()):
+    """
+    Runs EXPLAIN QUERY PLAN for a statement without executing it and looks for expensive shapes:
+    full scans of large tables, cartesian (unindexed nested-loop) joins, large SELECTs without a LIMIT
+    and ORDER BY / GROUP BY / DISTINCT that need a temporary sort. A missing LIMIT is not flagged when
+    the top-level SELECT aggregates, since then the rows scanned say nothing about the rows returned.
+    Returns a dict with plan, plan_text, estimated_cost (rows visited), estimated_rows, issues and error
+    (a "Database Error: ..." string when the statement can't be planned, e.g. a syntax error).
+    """
+    analysis = {"plan": [], "plan_text": "", "estimated_cost": 0, "estimated_rows": 0, "issues": [], "error": None}
+    statement = query.strip().rstrip(";").strip()
+    try:
+        with get_read_connection() as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}", params).fetchall()
+            row_counts = _table_row_counts(conn)
+            rows_per_key = _index_rows_per_key(conn)
+    except sqlite3.Error as e:
+        analysis["error"] = f"Database Error: {e}"
+        return analysis
+
+    analysis["plan"] = [tuple(row) for row in plan]
+    analysis["plan_text"] = format_query_plan(analysis["plan"])
+    aliases = _table_aliases(statement)
+    issues = analysis["issues"]
+    group_rows = {}  # parent node -> rows produced by the nested loops under it so far
+    cost = 0
+
+    for _, parent, _, detail in analysis["plan"]:
+        loop = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)", detail)
+        if loop:
+            name = loop.group(2).upper()
+            table = name if name in row_counts else aliases.get(name, name)
+            table_rows = row_counts.get(table, 0)
+            rows = _loop_rows(detail, table_rows, rows_per_key)
+            outer_rows = group_rows.get(parent)
+            if "AUTOMATIC" in detail:
+                cost += table_rows  # SQLite builds a throwaway index over the whole table first
+
+            is_scan = detail.startswith("SCAN") and not _is_fts_match(detail)
+            if is_scan and "USING" not in detail and table_rows >= LARGE_TABLE_ROWS:
+                issues.append({"kind": "full_scan", "message": f"Reads every row of {table} (~{table_rows:,} rows) without an index."})
+            if outer_rows is not None and is_scan and outer_rows * rows >= LARGE_TABLE_ROWS:
+                issues.append({"kind": "cartesian_join", "message": (
+                    f"Joins {table} without a usable join condition or index: every row is paired with "
+                    f"~{outer_rows:,} outer rows (~{outer_rows * rows:,} combinations).")})
+
+            group_rows[parent] = (outer_rows or 1) * rows
+            cost += group_rows[parent]
+        elif detail.startswith("USE TEMP B-TREE"):
+            sorted_rows = group_rows.get(parent, 0)
+            cost += int(sorted_rows * math.log2(sorted_rows)) if sorted_rows > 1 else 0
+            if sorted_rows >= LARGE_TABLE_ROWS:
+                purpose = detail.replace("USE TEMP B-TREE FOR ", "")
+                issues.append({"kind": "unindexed_sort", "message": f"Sorts ~{sorted_rows:,} rows in a temporary B-tree for {purpose}."})
+
+    analysis["estimated_cost"] = cost
+    analysis["estimated_rows"] = max(group_rows.values(), default=0)
+    has_limit = re.search(r"\bLIMIT\s+\d+(\s*(OFFSET|,)\s*\d+)?\s*$", statement, re.IGNORECASE)
+    if (is_select_query(statement) and not has_limit and analysis["estimated_rows"] >= LARGE_TABLE_ROWS
+            and not _returns_aggregate(statement)):
+        issues.append({"kind": "missing_limit", "message": f"No LIMIT on a query that may return ~{analysis['estimated_rows']:,} rows."})
+    return analysis
+
+
+def add_limit(query, limit=MAX_RESULT_ROWS):
+    """Appends a top-level LIMIT to a SELECT that has none."""
+    return f"{query.strip().rstrip(';').strip()}\nLIMIT {int(limit)};"
+
+
+def guard_query(query, role, params=()):
+    """
+    Analyzes a generated statement and applies the role's policy from QUERY_GUARD_POLICIES.
+    Returns the analysis dict extended with:
+      action: "allow", "warn", "rewrite" or "refuse" (the strictest action any issue triggered)
+      query: the statement to run (with LIMIT injected when rewritten)
+      original_query: the statement as generated
+    Each issue also gets the action taken for it. Statements that can't be planned are allowed through
+    so execution reports the real database error.
+    """
+    policy = QUERY_GUARD_POLICIES.get(role, DEFAULT_GUARD_POLICY)
+    guard = analyze_query(query, params)
+    guard.update({"action": "allow", "query": query, "original_query": query})
+    if guard["error"]:
+        return guard
+
+    if policy["max_cost"] is not None and guard["estimated_cost"] > policy["max_cost"]:
+        guard["issues"].append({"kind": "too_expensive", "message": (
+            f"Estimated ~{guard['estimated_cost']:,} rows visited, above the {policy['max_cost']:,} allowed for your role.")})
+
+    for issue in guard["issues"]:
+        action = "refuse" if issue["kind"] == "too_expensive" else policy.get(issue["kind"], "warn")
+        if action == "rewrite" and issue["kind"] != "missing_limit":
+            action = "warn"
+        issue["action"] = action
+        if GUARD_ACTIONS.index(action) > GUARD_ACTIONS.index(guard["action"]):
+            guard["action"] = action
+
+    if guard["action"] == "rewrite":
+        guard["query"] = add_limit(query)
+    return guard
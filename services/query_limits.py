@@ -0,0 +1,106 @@
+# services/query_limits.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Wall-clock budget per statement, by role. Generated SQL runs on the shared database, so one
+# runaway query must not hold the Streamlit thread (and a read snapshot) indefinitely.
+QUERY_TIME_BUDGETS_MS = {
+    "Admin": 30000,
+    "Pharmacist": 5000,
+    "Doctor": 10000,
+}
+DEFAULT_QUERY_BUDGET_MS = 5000
+PROGRESS_HANDLER_OPS = 1000  # SQLite VM instructions between budget checks (~microseconds)
+
+QUERY_CANCELLED_PREFIX = "Query cancelled"
+CANCELLED_QUERY_LOG = os.path.join("data", "query_logs", "cancelled_queries.jsonl")
+_log_lock = threading.Lock()
+
+
+class QueryCancelled(sqlite3.OperationalError):
+    """Raised when a statement is interrupted by its time budget or a cancel request."""
+
+
+def get_query_budget_ms(role):
+    """Time budget in milliseconds for statements run on behalf of a role."""
+    return QUERY_TIME_BUDGETS_MS.get(role, DEFAULT_QUERY_BUDGET_MS)
+
+
+def _log_cancelled_query(query, reason, elapsed_ms, timeout_ms):
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "reason": reason,
+        "elapsed_ms": round(elapsed_ms),
+        "timeout_ms": timeout_ms,
+        "sql": query.strip(),
+    }
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(CANCELLED_QUERY_LOG), exist_ok=True)
+            with open(CANCELLED_QUERY_LOG, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass  # Logging must never turn a cancellation into a crash
+
+
+@contextmanager
+def time_limited(conn, query, timeout_ms=None, cancel_event=None):
+    """
+    Aborts statements run on conn inside the block once timeout_ms has passed or cancel_event is set.
+    Uses SQLite's progress handler, which interrupts the running statement (and rolls back an
+    uncommitted write). The interruption surfaces as QueryCancelled with a
+    "Query cancelled after N ms ..." message, and the SQL is appended to CANCELLED_QUERY_LOG.
+    """
+    if not timeout_ms and cancel_event is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    deadline = start + timeout_ms / 1000 if timeout_ms else None
+    reason = []
+
+    def check_budget():
+        if cancel_event is not None and cancel_event.is_set():
+            reason.append("cancelled")
+            return 1
+        if deadline is not None and time.perf_counter() > deadline:
+            reason.append("timeout")
+            return 1
+        return 0
+
+    conn.set_progress_handler(check_budget, PROGRESS_HANDLER_OPS)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if not reason or "interrupt" not in str(e):
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _log_cancelled_query(query, reason[-1], elapsed_ms, timeout_ms)
+        if reason[-1] == "timeout":
+            message = f"{QUERY_CANCELLED_PREFIX} after {elapsed_ms:,.0f} ms (time budget {timeout_ms:,} ms). Try a narrower query."
+        else:
+            message = f"{QUERY_CANCELLED_PREFIX} by user after {elapsed_ms:,.0f} ms."
+        raise QueryCancelled(message) from e
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def read_cancelled_queries(limit=20):
+    """Most recent entries of CANCELLED_QUERY_LOG, newest first."""
+    try:
+        with open(CANCELLED_QUERY_LOG, encoding="utf-8") as log_file:
+            lines = log_file.readlines()[-limit:]
+    except OSError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,321 @@
+# services/sql_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from services.db_connection import DATABASE_FILE, get_connection, get_read_connection
+from services.gemini_service import generate_sql_query_from_prompt
+from services.sql_templates import (
+    extract_entities, fill_template, learn_template, match_template, pattern_signature, question_pattern,
+)
+
+# Kept in its own file: hit bookkeeping is a write per lookup, and writes to the main database would
+# bump its data_version and invalidate the query result cache on every question asked.
+SQL_CACHE_DB = os.path.join("data", "sql_cache.db")
+SQL_CACHE_TTL_S = int(os.getenv("SQL_CACHE_TTL_S", str(7 * 24 * 3600)))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "2000"))
+SQL_TEMPLATE_MAX_ENTRIES = int(os.getenv("SQL_TEMPLATE_MAX_ENTRIES", "500"))
+SQL_CACHE_COUNTERS = ("hits", "misses", "expired", "evictions", "discarded", "template_hits", "templates_learned")
+
+_schema_lock = threading.Lock()
+_schema_hash = {}  # db_file -> (PRAGMA schema_version, sha256 of sqlite_master)
+_initialized = set()
+
+
+def init_sql_cache_db(cache_db=SQL_CACHE_DB):
+    """Creates the cache tables if they do not exist."""
+    with get_connection(cache_db) as conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS NL_SQL_CACHE (
+                QUESTION_KEY TEXT NOT NULL,
+                CONTEXT_HASH TEXT NOT NULL,
+                QUESTION TEXT NOT NULL,
+                SQL_QUERY TEXT NOT NULL,
+                CREATED_AT REAL NOT NULL,
+                LAST_USED_AT REAL NOT NULL,
+                HITS INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (QUESTION_KEY, CONTEXT_HASH)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS IDX_NL_SQL_CACHE_LAST_USED ON NL_SQL_CACHE (LAST_USED_AT);
+            -- SQL shapes learned from model answers, with {{SLOT}} placeholders (see services/sql_templates.py)
+            CREATE TABLE IF NOT EXISTS NL_SQL_TEMPLATES (
+                TEMPLATE_ID INTEGER PRIMARY KEY,
+                CONTEXT_HASH TEXT NOT NULL,
+                SIGNATURE TEXT NOT NULL,
+                PATTERN TEXT NOT NULL,
+                CRITICAL TEXT NOT NULL,
+                SQL_TEMPLATE TEXT NOT NULL,
+                EXAMPLE_QUESTION TEXT NOT NULL,
+                CREATED_AT REAL NOT NULL,
+                LAST_USED_AT REAL NOT NULL,
+                USES INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (CONTEXT_HASH, SIGNATURE, PATTERN)
+            );
+            CREATE INDEX IF NOT EXISTS IDX_NL_SQL_TEMPLATES_LAST_USED ON NL_SQL_TEMPLATES (LAST_USED_AT);
+            CREATE TABLE IF NOT EXISTS NL_SQL_CACHE_COUNTERS (
+                NAME TEXT PRIMARY KEY,
+                VALUE INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        conn.executemany("INSERT OR IGNORE INTO NL_SQL_CACHE_COUNTERS (NAME, VALUE) VALUES (?, 0);",
+                         [(name,) for name in SQL_CACHE_COUNTERS])
+        conn.commit()
+    _initialized.add(cache_db)
+
+
+def normalize_question(question):
+    """Case, width, whitespace and trailing punctuation don't change the SQL, so they don't change the key."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" .?!").strip()
+
+
+def _database_schema_hash(db_file):
+    """Hash of the database's table/index definitions, recomputed only when PRAGMA schema_version changes."""
+    with get_read_connection(db_file) as conn:
+        version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+        with _schema_lock:
+            cached = _schema_hash.get(db_file)
+        if cached and cached[0] == version:
+            return cached[1]
+        definitions = conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY name;").fetchall()
+    digest = hashlib.sha256("\n".join(sql for (sql,) in definitions).encode("utf-8")).hexdigest()
+    with _schema_lock:
+        _schema_hash[db_file] = (version, digest)
+    return digest
+
+
+def context_hash(prompt_template, db_file=DATABASE_FILE):
+    """Identifies what a cached translation was generated against: the prompt text and the live schema."""
+    prompt_text = "\n".join(prompt_template) if isinstance(prompt_template, (list, tuple)) else str(prompt_template)
+    payload = f"{prompt_text}\n--\n{_database_schema_hash(db_file)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _bump(conn, name, amount=1):
+    conn.execute("UPDATE NL_SQL_CACHE_COUNTERS SET VALUE = VALUE + ? WHERE NAME = ?;", (amount, name))
+
+
+def lookup_sql(question, prompt_template, cache_db=SQL_CACHE_DB, db_file=DATABASE_FILE):
+    """Cached SQL for the question, or None. An entry older than SQL_CACHE_TTL_S is dropped and counts as a miss."""
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    key = (normalize_question(question), context_hash(prompt_template, db_file))
+    now = time.time()
+    with get_connection(cache_db) as conn:
+        row = conn.execute(
+            "SELECT SQL_QUERY, CREATED_AT FROM NL_SQL_CACHE WHERE QUESTION_KEY = ? AND CONTEXT_HASH = ?;", key
+        ).fetchone()
+        if row is not None and now - row[1] <= SQL_CACHE_TTL_S:
+            conn.execute(
+                "UPDATE NL_SQL_CACHE SET LAST_USED_AT = ?, HITS = HITS + 1 WHERE QUESTION_KEY = ? AND CONTEXT_HASH = ?;",
+                (now, *key),
+            )
+            _bump(conn, "hits")
+            conn.commit()
+            return row[0]
+        if row is not None:
+            conn.execute("DELETE FROM NL_SQL_CACHE WHERE QUESTION_KEY = ? AND CONTEXT_HASH = ?;", key)
+            _bump(conn, "expired")
+        _bump(conn, "misses")
+        conn.commit()
+    return None
+
+
+def store_sql(question, prompt_template, sql_query, cache_db=SQL_CACHE_DB, db_file=DATABASE_FILE):
+    """Caches a translation, then evicts least-recently-used entries beyond SQL_CACHE_MAX_ENTRIES."""
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    key = (normalize_question(question), context_hash(prompt_template, db_file))
+    now = time.time()
+    with get_connection(cache_db) as conn:
+        conn.execute("""
+            INSERT INTO NL_SQL_CACHE (QUESTION_KEY, CONTEXT_HASH, QUESTION, SQL_QUERY, CREATED_AT, LAST_USED_AT)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (QUESTION_KEY, CONTEXT_HASH) DO UPDATE SET
+                QUESTION = excluded.QUESTION, SQL_QUERY = excluded.SQL_QUERY,
+                CREATED_AT = excluded.CREATED_AT, LAST_USED_AT = excluded.LAST_USED_AT;
+        """, (*key, question.strip(), sql_query, now, now))
+        evicted = conn.execute("""
+            DELETE FROM NL_SQL_CACHE WHERE (QUESTION_KEY, CONTEXT_HASH) IN (
+                SELECT QUESTION_KEY, CONTEXT_HASH FROM NL_SQL_CACHE ORDER BY LAST_USED_AT DESC LIMIT -1 OFFSET ?
+            );
+        """, (SQL_CACHE_MAX_ENTRIES,)).rowcount
+        if evicted:
+            _bump(conn, "evictions", evicted)
+        conn.commit()
+
+
+def discard_sql(question, prompt_template, cache_db=SQL_CACHE_DB, db_file=DATABASE_FILE):
+    """Forgets a translation that turned out to be unusable (refused by the query guard or failed to run)."""
+    try:
+        if cache_db not in _initialized:
+            init_sql_cache_db(cache_db)
+        key = (normalize_question(question), context_hash(prompt_template, db_file))
+        with get_connection(cache_db) as conn:
+            removed = conn.execute("DELETE FROM NL_SQL_CACHE WHERE QUESTION_KEY = ? AND CONTEXT_HASH = ?;", key).rowcount
+            # The template that produced (or would produce) this SQL goes too, so it isn't refilled
+            entities = extract_entities(question, db_file)
+            if entities:
+                tokens, slots = question_pattern(question, entities)
+                candidates = _candidate_templates(conn, key[1], pattern_signature(slots))
+                template, _ = match_template(tokens, slots, candidates)
+                if template:
+                    removed += conn.execute("DELETE FROM NL_SQL_TEMPLATES WHERE TEMPLATE_ID = ?;",
+                                            (template["template_id"],)).rowcount
+            if removed:
+                _bump(conn, "discarded", removed)
+            conn.commit()
+    except sqlite3.Error:
+        pass  # The entry expires on its own
+
+
+def _candidate_templates(conn, context, signature):
+    cursor = conn.execute("""
+        SELECT TEMPLATE_ID, PATTERN, CRITICAL, SIGNATURE, SQL_TEMPLATE, USES FROM NL_SQL_TEMPLATES
+        WHERE CONTEXT_HASH = ? AND SIGNATURE = ? AND CREATED_AT >= ?;
+    """, (context, signature, time.time() - SQL_CACHE_TTL_S))
+    columns = ["template_id", "pattern", "critical", "signature", "sql_template", "uses"]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def lookup_template_sql(question, prompt_template, cache_db=SQL_CACHE_DB, db_file=DATABASE_FILE):
+    """
+    SQL for a paraphrase of a question answered before ("sold 3 Metformin packs" after "sell 5 packs of
+    Lipitor"), built by filling the question's drugs, numbers, dates and names into a learned template.
+    Returns None unless a template matches confidently.
+    """
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    entities = extract_entities(question, db_file)
+    if not entities:
+        return None
+    tokens, slots = question_pattern(question, entities)
+    context = context_hash(prompt_template, db_file)
+    with get_connection(cache_db) as conn:
+        template, _ = match_template(tokens, slots, _candidate_templates(conn, context, pattern_signature(slots)))
+        sql_query = fill_template(template["sql_template"], slots, entities) if template else None
+        if sql_query is None:
+            return None
+        conn.execute("UPDATE NL_SQL_TEMPLATES SET USES = USES + 1, LAST_USED_AT = ? WHERE TEMPLATE_ID = ?;",
+                     (time.time(), template["template_id"]))
+        _bump(conn, "template_hits")
+        conn.commit()
+    return sql_query
+
+
+def store_template(question, prompt_template, sql_query, cache_db=SQL_CACHE_DB, db_file=DATABASE_FILE):
+    """Learns an SQL template from a model answer when its entities map cleanly onto the SQL's literals."""
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    template = learn_template(question, sql_query, extract_entities(question, db_file))
+    if template is None:
+        return False
+    now = time.time()
+    with get_connection(cache_db) as conn:
+        conn.execute("""
+            INSERT INTO NL_SQL_TEMPLATES
+                (CONTEXT_HASH, SIGNATURE, PATTERN, CRITICAL, SQL_TEMPLATE, EXAMPLE_QUESTION, CREATED_AT, LAST_USED_AT)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (CONTEXT_HASH, SIGNATURE, PATTERN) DO UPDATE SET
+                CRITICAL = excluded.CRITICAL, SQL_TEMPLATE = excluded.SQL_TEMPLATE,
+                EXAMPLE_QUESTION = excluded.EXAMPLE_QUESTION, CREATED_AT = excluded.CREATED_AT,
+                LAST_USED_AT = excluded.LAST_USED_AT;
+        """, (context_hash(prompt_template, db_file), template["signature"], template["pattern"], template["critical"],
+              template["sql_template"], question.strip(), now, now))
+        _bump(conn, "templates_learned")
+        evicted = conn.execute("""
+            DELETE FROM NL_SQL_TEMPLATES WHERE TEMPLATE_ID IN (
+                SELECT TEMPLATE_ID FROM NL_SQL_TEMPLATES ORDER BY LAST_USED_AT DESC LIMIT -1 OFFSET ?
+            );
+        """, (SQL_TEMPLATE_MAX_ENTRIES,)).rowcount
+        if evicted:
+            _bump(conn, "evictions", evicted)
+        conn.commit()
+    return True
+
+
+def get_sql_for_question(question, prompt_template):
+    """
+    Translates a question to SQL, cheapest source first. Returns (sql, source) where source is
+    "cache" (asked before, word for word), "template" (a paraphrase of an earlier question with
+    different drugs, numbers, dates or names) or "model" (a Gemini round trip).
+    Errors from the model ("Error: ...") are returned as-is and never cached.
+    A cache that can't be read or written is skipped, so the question still goes to the model.
+    """
+    try:
+        sql_query = lookup_sql(question, prompt_template)
+        if sql_query is not None:
+            return sql_query, "cache"
+        sql_query = lookup_template_sql(question, prompt_template)
+        if sql_query is not None:
+            store_sql(question, prompt_template, sql_query)  # The next identical question is an exact hit
+            return sql_query, "template"
+    except sqlite3.Error:
+        pass
+
+    sql_query = generate_sql_query_from_prompt(question, prompt_template)
+    if sql_query and not sql_query.startswith("Error:"):
+        try:
+            store_sql(question, prompt_template, sql_query)
+            store_template(question, prompt_template, sql_query)
+        except sqlite3.Error:
+            pass
+    return sql_query, "model"
+
+
+def purge_sql_cache(expired_only=False, cache_db=SQL_CACHE_DB):
+    """Deletes expired entries and templates (or all of them). Counters are kept. Returns the number removed."""
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    with get_connection(cache_db) as conn:
+        if expired_only:
+            cutoff = time.time() - SQL_CACHE_TTL_S
+            removed = conn.execute("DELETE FROM NL_SQL_CACHE WHERE CREATED_AT < ?;", (cutoff,)).rowcount
+            removed += conn.execute("DELETE FROM NL_SQL_TEMPLATES WHERE CREATED_AT < ?;", (cutoff,)).rowcount
+            _bump(conn, "expired", removed)
+        else:
+            removed = conn.execute("DELETE FROM NL_SQL_CACHE;").rowcount
+            removed += conn.execute("DELETE FROM NL_SQL_TEMPLATES;").rowcount
+        conn.commit()
+    return removed
+
+
+def reset_sql_cache_counters(cache_db=SQL_CACHE_DB):
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    with get_connection(cache_db) as conn:
+        conn.execute("UPDATE NL_SQL_CACHE_COUNTERS SET VALUE = 0;")
+        conn.commit()
+
+
+def get_sql_cache_stats(top=10, cache_db=SQL_CACHE_DB):
+    """Counters, hit rates, entry and template counts, and the most-reused questions and templates."""
+    if cache_db not in _initialized:
+        init_sql_cache_db(cache_db)
+    with get_read_connection(cache_db) as conn:
+        stats = dict(conn.execute("SELECT NAME, VALUE FROM NL_SQL_CACHE_COUNTERS;").fetchall())
+        stats["entries"] = conn.execute("SELECT COUNT(*) FROM NL_SQL_CACHE;").fetchone()[0]
+        stats["templates"] = conn.execute("SELECT COUNT(*) FROM NL_SQL_TEMPLATES;").fetchone()[0]
+        cursor = conn.execute("""
+            SELECT EXAMPLE_QUESTION, USES, SQL_TEMPLATE FROM NL_SQL_TEMPLATES ORDER BY USES DESC, LAST_USED_AT DESC LIMIT ?;
+        """, (top,))
+        columns = [description[0] for description in cursor.description]
+        stats["top_templates"] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor = conn.execute("""
+            SELECT QUESTION, HITS, datetime(LAST_USED_AT, 'unixepoch', 'localtime') AS LAST_USED
+            FROM NL_SQL_CACHE ORDER BY HITS DESC, LAST_USED_AT DESC LIMIT ?;
+        """, (top,))
+        columns = [description[0] for description in cursor.description]
+        stats["top_questions"] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats["hit_rate"] = stats.get("hits", 0) / lookups if lookups else 0.0
+    # Exact misses answered by a template never reached the model
+    stats["model_calls_saved_rate"] = (stats.get("hits", 0) + stats.get("template_hits", 0)) / lookups if lookups else 0.0
+    stats["max_entries"] = SQL_CACHE_MAX_ENTRIES
+    stats["ttl_s"] = SQL_CACHE_TTL_S
+    return stats
@@ -0,0 +1,304 @@
+# services/sql_templates.py
+import re
+
+from services.db_connection import DATABASE_FILE, get_read_connection
+
+# A new question reuses a learned template only when its slot types match exactly, its critical words
+# (comparisons, verbs, aggregates) are identical, and the remaining words overlap at least this much.
+# Templates that write (INSERT/UPDATE/DELETE) need every word to match: a dropped word there changes rows.
+TEMPLATE_MIN_SIMILARITY = 0.75
+MAX_NAME_WORDS = 4  # Longest drug/supplier/patient name looked up, in words
+MAX_QUESTION_WORDS = 40
+
+# Entity lookups, one indexed IN query each. Names are tried as typed, Title Case, lower and upper case.
+NAME_SLOT_LOOKUPS = [
+    ("DRUG", "SELECT DISTINCT DRUG_NAME FROM PHARMACY_INVENTORY WHERE DRUG_NAME IN ({placeholders});"),
+    ("SUPPLIER", "SELECT DISTINCT SUPPLIER FROM PHARMACY_INVENTORY WHERE SUPPLIER IN ({placeholders});"),
+    ("PATIENT", "SELECT DISTINCT PATIENT_NAME FROM DIAGNOSTIC_DATA WHERE PATIENT_NAME IN ({placeholders});"),
+    ("DIAGNOSIS", "SELECT DISTINCT DIAGNOSIS FROM DIAGNOSTIC_DATA WHERE DIAGNOSIS IN ({placeholders});"),
+]
+# String literals a template may keep hard-coded: SQLite date/strftime arguments that never come from
+# the question. Any other literal left in the SQL after slotting makes the pair unsafe to learn.
+FIXED_LITERALS = {
+    "now", "localtime", "utc", "unixepoch", "start of day", "start of month", "start of year",
+    "%y", "%m", "%d", "%y-%m", "%y-%m-%d", "%",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "at", "with", "by", "from", "me", "us", "please", "is", "are",
+    "was", "were", "be", "been", "and", "do", "does", "did", "we", "our", "i", "you", "can", "could", "would", "that",
+    "this", "these", "those", "there", "it", "its", "have", "has", "had",
+}
+# Canonical forms for irregular verbs and synonyms the counter staff use interchangeably
+WORD_FORMS = {
+    "sold": "sell", "sells": "sell", "selling": "sell", "dispense": "sell", "dispensed": "sell",
+    "bought": "buy", "buys": "buy", "restocked": "restock", "restocking": "restock", "received": "restock",
+    "removed": "remove", "deleted": "delete", "added": "add", "inserted": "insert", "updated": "update",
+    "list": "show", "display": "show", "find": "show", "get": "show", "give": "show", "what": "show", "which": "show",
+    "greater": "more", "higher": "more", "above": "more", "over": "more",
+    "fewer": "less", "lower": "less", "below": "less", "under": "less",
+}
+# Words that change the SQL's meaning: two questions must agree on all of them (after WORD_FORMS)
+CRITICAL_WORDS = {
+    "not", "no", "without", "less", "more", "least", "most", "than", "between", "before", "after", "since", "until",
+    "top", "bottom", "min", "minimum", "max", "maximum", "highest", "lowest", "cheapest", "expensive", "latest",
+    "earliest", "oldest", "newest", "first", "last", "sell", "buy", "restock", "remove", "delete", "add", "insert",
+    "update", "set", "increase", "decrease", "change", "count", "many", "much", "number", "sum", "total", "average",
+    "avg", "each", "per", "distinct", "unique", "only", "exactly", "equal", "ascending", "descending", "price",
+    "stock", "revenue", "sales", "expired", "expiring", "expire", "expires", "expiry",
+}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_QUOTED = re.compile(r"(?<!\w)'([^']+)'(?!\w)|\"([^\"]+)\"")  # An apostrophe inside O'Brien doesn't open a quote
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_NUMBER = re.compile(r"(?<![\w.-])\d+(?:\.\d+)?(?![\w.]|-\d)")
+_LIMIT_NUMBER = re.compile(r"\b(?:LIMIT|OFFSET)\s+\d+(?:\s*,\s*\d+)?", re.IGNORECASE)
+_WRITE_STATEMENT = re.compile(r"\b(?:INSERT|UPDATE|DELETE|REPLACE\s+INTO)\b", re.IGNORECASE)
+_WORD = re.compile(r"[\w'-]+")
+_SLOT = re.compile(r"\{\{([A-Z]+_\d+)\}\}")
+
+
+def _name_candidates(question, taken):
+    """Word n-grams (longest first) outside already-claimed spans, as (start, end, text)."""
+    words = [m for m in _WORD.finditer(question) if not any(s < m.end() and m.start() < e for s, e in taken)]
+    words = words[:MAX_QUESTION_WORDS]
+    candidates = []
+    for size in range(MAX_NAME_WORDS, 0, -1):
+        for i in range(len(words) - size + 1):
+            group = words[i:i + size]
+            text = question[group[0].start():group[-1].end()]
+            if re.fullmatch(r"[\w'-]+(?: [\w'-]+)*", text) and not text.isdigit():
+                candidates.append((group[0].start(), group[-1].end(), text))
+    return candidates
+
+
+def extract_entities(question, db_file=DATABASE_FILE):
+    """
+    Slot values found in the question, as (start, end, slot type, canonical value) in question order.
+    Types: TEXT (quoted phrases), DATE, DRUG / SUPPLIER / PATIENT / DIAGNOSIS (names that exist in the
+    database), NUM.
+    Longer matches win, so "Dapaxen 180" is one drug, not a drug and a number.
+    """
+    spans = []
+
+    def claim(start, end, slot_type, value):
+        if not any(s < end and start < e for s, e, _, _ in spans):
+            spans.append((start, end, slot_type, value))
+
+    for match in _QUOTED.finditer(question):
+        claim(match.start(), match.end(), "TEXT", match.group(1) or match.group(2))
+    for match in _DATE.finditer(question):
+        claim(match.start(), match.end(), "DATE", match.group())
+
+    candidates = _name_candidates(question, [(s, e) for s, e, _, _ in spans])
+    if candidates:
+        variants = {}
+        for _, _, text in candidates:
+            for variant in (text, text.title(), text.lower(), text.upper()):
+                variants.setdefault(variant, text.lower())
+        placeholders = ", ".join("?" * len(variants))
+        found = {}  # lower-case text -> (slot type, canonical name); first lookup wins
+        with get_read_connection(db_file) as conn:
+            for slot_type, query in NAME_SLOT_LOOKUPS:
+                for (name,) in conn.execute(query.format(placeholders=placeholders), list(variants)):
+                    found.setdefault(name.lower(), (slot_type, name))
+        for start, end, text in candidates:  # Already longest first
+            if text.lower() in found:
+                claim(start, end, *found[text.lower()])
+
+    for match in _NUMBER.finditer(question):
+        claim(match.start(), match.end(), "NUM", match.group())
+    return sorted(spans)
+
+
+def _canonical(word):
+    word = word.lower().strip("'-")
+    if word in WORD_FORMS:
+        return WORD_FORMS[word]
+    if word in CRITICAL_WORDS:
+        return word
+    for suffix in ("ing", "ed", "es", "s"):  # Light stemming; critical words above are left alone
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def question_pattern(question, entities):
+    """
+    The question with entities replaced by slot tokens and words canonicalised, as a token list,
+    plus its slot names in order (DRUG_0, NUM_0, ...). Stopwords are dropped.
+    """
+    tokens, slots, counts, position = [], [], {}, 0
+    for start, end, slot_type, _ in entities:
+        tokens.extend(_canonical(w) for w in _WORD.findall(question[position:start]))
+        slot = f"{slot_type}_{counts.get(slot_type, 0)}"
+        counts[slot_type] = counts.get(slot_type, 0) + 1
+        tokens.append(f"<{slot_type.lower()}>")
+        slots.append(slot)
+        position = end
+    tokens.extend(_canonical(w) for w in _WORD.findall(question[position:]))
+    return [t for t in tokens if t and t not in STOPWORDS], slots
+
+
+def pattern_signature(slots):
+    """Slot types as a sorted string: only templates with the same signature are compared."""
+    return " ".join(sorted(slot.rsplit("_", 1)[0] for slot in slots))
+
+
+def critical_words(tokens):
+    return " ".join(sorted({t for t in tokens if t in CRITICAL_WORDS}))
+
+
+def _replace_outside_strings(sql, pattern, replacement):
+    """Applies a regex substitution to the SQL outside its string literals. Returns (sql, count)."""
+    parts, total, position = [], 0, 0
+    for literal in _STRING_LITERAL.finditer(sql):
+        text, count = pattern.subn(replacement, sql[position:literal.start()])
+        parts.extend([text, literal.group()])
+        total += count
+        position = literal.end()
+    text, count = pattern.subn(replacement, sql[position:])
+    parts.append(text)
+    return "".join(parts), total + count
+
+
+def _replace_inside_strings(sql, value, replacement):
+    """Replaces value (case-insensitively) inside the SQL's string literals. Returns (sql, count)."""
+    escaped = re.compile(re.escape(value.replace("'", "''")), re.IGNORECASE)
+    total = 0
+
+    def substitute(literal):
+        nonlocal total
+        text, count = escaped.subn(lambda _: replacement, literal.group())
+        total += count
+        return text
+
+    return _STRING_LITERAL.sub(substitute, sql), total
+
+
+def _literals_outside_slots(sql):
+    """The SQL's string literal contents that contain no {{SLOT}} placeholder."""
+    return [literal[1:-1].replace("''", "'") for literal in _STRING_LITERAL.findall(sql) if not _SLOT.search(literal)]
+
+
+def _unslotted_literals(sql_template):
+    """
+    Values still hard-coded in a template: string literals without a placeholder (other than
+    FIXED_LITERALS) and numbers outside strings other than LIMIT/OFFSET counts. A template with any
+    of these would answer a question about a different value with this question's value.
+    """
+    literals = [text for text in _literals_outside_slots(sql_template) if text.lower() not in FIXED_LITERALS]
+    without_limits = _LIMIT_NUMBER.sub(" ", _STRING_LITERAL.sub("''", sql_template))
+    return literals + _NUMBER.findall(without_limits)
+
+
+def _literal_words(sql_template):
+    """Canonical words inside the template's string literals, placeholders removed."""
+    words = set()
+    for literal in _STRING_LITERAL.findall(_SLOT.sub(" ", sql_template)):
+        words.update(_canonical(word) for word in _WORD.findall(literal))
+    return words - STOPWORDS - {""}
+
+
+def learn_template(question, sql_query, entities):
+    """
+    Turns a question/SQL pair into an SQL template with {{SLOT}} placeholders, or None when the pair
+    can't be generalised safely: no entities, two entities with overlapping values, an entity the SQL
+    doesn't contain as a literal (the model reinterpreted it, so a different value might not map the
+    same way), or a value left hard-coded in the SQL that isn't a slot (see _unslotted_literals).
+    """
+    if not entities:
+        return None
+    values = [(slot_type, value.lower()) for _, _, slot_type, value in entities]
+    for i, (type_a, a) in enumerate(values):
+        for type_b, b in values[i + 1:]:
+            # Numbers are matched on word boundaries, so only names and text can collide by containment
+            if a == b or ("NUM" not in (type_a, type_b) and (a in b or b in a)):
+                return None
+    if "{{" in sql_query:
+        return None
+
+    tokens, slots = question_pattern(question, entities)
+    template = sql_query
+    for (_, _, slot_type, value), slot in zip(entities, slots):
+        placeholder = "{{" + slot + "}}"
+        if slot_type == "NUM":
+            number = re.compile(r"(?<![\w.'])" + re.escape(value) + r"(?![\w.])")
+            template, count = _replace_outside_strings(template, number, placeholder)
+        else:
+            template, count = _replace_inside_strings(template, value, placeholder)
+        if count == 0:
+            return None
+    if _unslotted_literals(template):
+        return None
+    return {
+        "pattern": " ".join(tokens),
+        "signature": pattern_signature(slots),
+        "critical": critical_words(tokens),
+        "slots": slots,
+        "sql_template": template,
+    }
+
+
+def _writes(sql_template):
+    """True for INSERT/UPDATE/DELETE templates (including WITH ... UPDATE), ignoring string literals."""
+    return bool(_WRITE_STATEMENT.search(_STRING_LITERAL.sub("''", sql_template)))
+
+
+def _numbered_words(tokens):
+    """Words containing digits that weren't slotted (50mg, 2x10): filters a template would silently drop."""
+    return {token for token in tokens if any(char.isdigit() for char in token)}
+
+
+def template_similarity(tokens, template_tokens):
+    """Jaccard overlap of the canonical word sets."""
+    a, b = set(tokens), set(template_tokens)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def match_template(tokens, slots, templates):
+    """
+    Best template for a question pattern among candidate dicts (pattern, critical, signature, uses, ...).
+    Patterns with repeated slot types must match word for word, since slot order then matters.
+    Words that appear in the template's SQL literals must be used identically by both questions, so
+    "Asthma" and "Migraine" can't swap when a template kept one of them hard-coded. So must words with
+    digits, so "Zoloft 50mg" doesn't lose its strength, and a template that writes needs every word
+    to match (similarity 1.0).
+    Returns (template, similarity) or (None, 0.0).
+    """
+    signature = pattern_signature(slots)
+    repeated = len(set(slots)) != len({slot.rsplit("_", 1)[0] for slot in slots})
+    critical = critical_words(tokens)
+    best, best_score = None, 0.0
+    for template in templates:
+        if template["signature"] != signature or template["critical"] != critical:
+            continue
+        template_tokens = template["pattern"].split()
+        anchored = _literal_words(template["sql_template"])
+        if anchored & set(tokens) != anchored & set(template_tokens):
+            continue
+        if _numbered_words(tokens) != _numbered_words(template_tokens):
+            continue
+        if repeated:
+            score = 1.0 if template_tokens == tokens else 0.0
+        else:
+            score = template_similarity(tokens, template_tokens)
+        min_score = 1.0 if _writes(template["sql_template"]) else TEMPLATE_MIN_SIMILARITY
+        if score >= min_score and (score, template.get("uses", 0)) > (best_score, best.get("uses", 0) if best else -1):
+            best, best_score = template, score
+    return best, best_score
+
+
+def fill_template(sql_template, slots, entities):
+    """Substitutes the question's entity values into the template. Strings are escaped, numbers checked."""
+    values = {}
+    for slot, (_, _, slot_type, value) in zip(slots, entities):
+        if slot_type == "NUM":
+            if not re.fullmatch(r"\d+(?:\.\d+)?", value):
+                return None
+            values[slot] = value
+        else:
+            values[slot] = value.replace("'", "''")  # Placeholders sit inside the template's string literals
+    if set(_SLOT.findall(sql_template)) - set(values):
+        return None
+    return _SLOT.sub(lambda m: values[m.group(1)], sql_template)
@@ -0,0 +1,228 @@
+# services/synthetic_data.py
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+
+from services.db_connection import get_connection
+from services.migrations import drop_secondary_indexes, rebuild_indexes
+
+SYNTHETIC_BATCH_ROWS = 50000  # Rows per executemany()/transaction
+DEFAULT_SEED = 42
+SYNTHETIC_PASSWORD = "synthetic123"  # Every generated user shares this password
+
+# Row counts per table for each --scale preset
+SCALE_PRESETS = {
+    "10k": {"PHARMACY_INVENTORY": 2000, "DIAGNOSTIC_DATA": 10000, "INVOICES": 5000, "users": 50},
+    "100k": {"PHARMACY_INVENTORY": 20000, "DIAGNOSTIC_DATA": 100000, "INVOICES": 50000, "users": 200},
+    "1m": {"PHARMACY_INVENTORY": 100000, "DIAGNOSTIC_DATA": 1000000, "INVOICES": 500000, "users": 1000},
+    "10m": {"PHARMACY_INVENTORY": 500000, "DIAGNOSTIC_DATA": 10000000, "INVOICES": 5000000, "users": 5000},
+}
+
+DRUG_STEMS = [
+    "Amlo", "Atorva", "Ceti", "Clopi", "Dapa", "Doxy", "Empa", "Escita", "Esome", "Fluco", "Gaba", "Glime",
+    "Hydro", "Ibu", "Leve", "Lisino", "Lora", "Losa", "Metfor", "Meto", "Monte", "Napro", "Olme", "Ome",
+    "Panto", "Para", "Predni", "Prega", "Rabe", "Rosu", "Salbu", "Sertra", "Simva", "Tamsu", "Telmi", "Trama",
+]
+DRUG_SUFFIXES = ["pine", "statin", "rizine", "grel", "flozin", "cycline", "pram", "prazole", "conazole", "pentin",
+                 "piride", "sartan", "lukast", "xen", "mol", "sone", "balin", "nolol", "cetam", "mide"]
+FORMULATIONS = ["Tablet", "Capsule", "Syrup", "Injection", "Inhaler", "Cream", "Drops"]
+DOSAGES = ["5mg", "10mg", "20mg", "40mg", "50mg", "100mg", "250mg", "500mg", "1g", "100mcg/puff", "5ml"]
+PACK_SIZES = ["10 tabs", "14 tabs", "30 tabs", "60 tabs", "20 caps", "100ml", "1 vial", "1 inhaler", "15g tube"]
+SUPPLIERS = ["PharmaCorp", "MediSupply", "GenericMeds", "RespiraLabs", "NeuroPharma", "CardioWell", "Sunrise Labs",
+             "HealthBridge", "Apex Remedies", "Nova Biotech", "CityMed Distributors", "Orion Pharma"]
+FIRST_NAMES = ["Aarav", "Alice", "Ananya", "Bob", "Chen", "Diana", "Eve", "Farah", "Frank", "Grace", "Hana", "Henry",
+               "Ishaan", "Jia", "Kavya", "Liam", "Maria", "Noah", "Olivia", "Priya", "Rahul", "Sara", "Tom", "Zoe"]
+LAST_NAMES = ["Adams", "Brown", "Das", "Garcia", "Gupta", "Iyer", "Johnson", "Khan", "Kim", "Lee", "Mehta", "Nair",
+              "Patel", "Prince", "Rao", "Reddy", "Singh", "Smith", "Tan", "White", "Wong", "Yadav"]
+# (diagnosis, typical test result). The list order is also the popularity order.
+DIAGNOSES = [
+    ("Hypertension", "BP consistently high"), ("Diabetes Type 2", "HbA1c elevated"),
+    ("Common Cold", "Runny nose, sore throat"), ("Asthma", "Wheezing, shortness of breath"),
+    ("Hyperlipidemia", "LDL above target"), ("Anxiety Disorder", "Persistent worry, panic attacks"),
+    ("Migraine", "Severe headache, light sensitivity"), ("GERD", "Heartburn after meals"),
+    ("Hypothyroidism", "TSH elevated"), ("Urinary Tract Infection", "Positive urine culture"),
+    ("Osteoarthritis", "Joint space narrowing on X-ray"), ("Depression", "PHQ-9 score 14"),
+    ("Allergic Rhinitis", "Seasonal sneezing, itchy eyes"), ("Anemia", "Hemoglobin 9.8 g/dL"),
+    ("Bronchitis", "Productive cough, mild fever"), ("Dermatitis", "Itchy erythematous rash"),
+]
+PAYMENT_METHODS = ["Cash", "Card", "UPI"]
+PAYMENT_WEIGHTS = [3, 2, 5]
+ROLES = ["Pharmacist", "Doctor", "Admin"]
+ROLE_WEIGHTS = [60, 35, 5]
+
+
+def zipf_cum_weights(n, exponent=1.1):
+    """Cumulative Zipf weights for random.choices(): item i is picked ~1/(i+1)^exponent as often as item 0."""
+    return list(accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _random_date(rng, start, span_days):
+    return (start + timedelta(days=rng.randrange(span_days))).isoformat()
+
+
+def _insert_batches(conn, insert_sql, make_row, total, batch_rows, label, progress):
+    """Writes total generated rows in batch_rows-sized transactions."""
+    written = 0
+    while written < total:
+        size = min(batch_rows, total - written)
+        try:
+            conn.executemany(insert_sql, [make_row() for _ in range(size)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        written += size
+        if progress:
+            progress(label, written, total)
+    return written
+
+
+def _generate_inventory(conn, rng, count, batch_rows, progress):
+    today = date.today()
+    stems_cw = zipf_cum_weights(len(DRUG_STEMS), 0.8)
+    supplier_cw = zipf_cum_weights(len(SUPPLIERS))
+    formulation_cw = zipf_cum_weights(len(FORMULATIONS))
+
+    def make_row():
+        stem = rng.choices(DRUG_STEMS, cum_weights=stems_cw)[0]
+        generic = stem + rng.choice(DRUG_SUFFIXES)
+        # Brand names repeat across strengths and suppliers, like a real catalogue
+        name = f"{generic[:4].capitalize()}{rng.choice(DRUG_SUFFIXES)} {rng.randrange(1, max(2, count // 50))}"
+        # Most lines are well stocked; a long tail is low or out of stock
+        stock = int(rng.paretovariate(1.2) * 20) - 20 if rng.random() < 0.85 else rng.randrange(0, 50)
+        # Expiry from 3 months ago (already expired) up to 3 years ahead
+        expiry = _random_date(rng, today - timedelta(days=90), 3 * 365)
+        return (name, generic, rng.choices(FORMULATIONS, cum_weights=formulation_cw)[0], rng.choice(DOSAGES),
+                rng.choice(PACK_SIZES), round(rng.lognormvariate(2.5, 0.8), 2), min(stock, 100000), expiry,
+                rng.choices(SUPPLIERS, cum_weights=supplier_cw)[0])
+
+    return _insert_batches(conn, """
+        INSERT INTO PHARMACY_INVENTORY (DRUG_NAME, GENERIC_NAME, FORMULATION, DOSAGE, PACK_SIZE, PRICE_PER_PACK, STOCK_QUANTITY, EXPIRY_DATE, SUPPLIER)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+    """, make_row, count, batch_rows, "PHARMACY_INVENTORY", progress)
+
+
+def _popular_drugs(conn, rng):
+    """Returns (drugs, cum_weights) with drugs = [(DRUG_ID, DRUG_NAME, PRICE_PER_PACK)] in a random popularity order."""
+    drugs = conn.execute("SELECT DRUG_ID, DRUG_NAME, PRICE_PER_PACK FROM PHARMACY_INVENTORY;").fetchall()
+    rng.shuffle(drugs)
+    return drugs, zipf_cum_weights(len(drugs))
+
+
+def _generate_diagnostics(conn, rng, count, drugs, drug_cw, batch_rows, progress):
+    today = date.today()
+    # A few thousand recurring patients per 100k visits, so patient-history lookups return several rows
+    patient_pool = [f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {n}" for n in range(max(10, count // 20))]
+    patient_cw = zipf_cum_weights(len(patient_pool), 0.7)
+    diagnosis_cw = zipf_cum_weights(len(DIAGNOSES))
+
+    def make_row():
+        diagnosis, test_result = rng.choices(DIAGNOSES, cum_weights=diagnosis_cw)[0]
+        drug_id = rng.choices(drugs, cum_weights=drug_cw)[0][0] if drugs and rng.random() < 0.8 else None
+        return (rng.choices(patient_pool, cum_weights=patient_cw)[0], diagnosis,
+                _random_date(rng, today - timedelta(days=5 * 365), 5 * 365 + 1), test_result, drug_id)
+
+    return _insert_batches(conn, """
+        INSERT INTO DIAGNOSTIC_DATA (PATIENT_NAME, DIAGNOSIS, DIAGNOSIS_DATE, TEST_RESULTS, DRUG_ID_PRESCRIBED)
+        VALUES (?, ?, ?, ?, ?);
+    """, make_row, count, batch_rows, "DIAGNOSTIC_DATA", progress)
+
+
+def _generate_invoices(conn, rng, count, drugs, drug_cw, batch_rows, progress, gst_rate=0.18):
+    if not drugs:
+        return 0
+    today = date.today()
+
+    def make_row():
+        items = {}
+        for _ in range(min(rng.randrange(1, 4) + int(rng.expovariate(1.0)), 12)):
+            drug_id, drug_name, price = rng.choices(drugs, cum_weights=drug_cw)[0]
+            item = items.setdefault(drug_id, {"drug_id": drug_id, "drug_name": drug_name, "quantity": 0,
+                                              "price_per_pack": price or 0.0})
+            item["quantity"] += rng.randrange(1, 4)
+        items = list(items.values())
+        subtotal = round(sum(item["quantity"] * item["price_per_pack"] for item in items), 2)
+        gst = round(subtotal * gst_rate, 2)
+        invoice_date = f"{_random_date(rng, today - timedelta(days=2 * 365), 2 * 365 + 1)} {rng.randrange(9, 21):02d}:{rng.randrange(60):02d}:00"
+        return (invoice_date, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                rng.choices(PAYMENT_METHODS, weights=PAYMENT_WEIGHTS)[0], json.dumps(items), subtotal, gst,
+                round(subtotal + gst, 2))
+
+    return _insert_batches(conn, """
+        INSERT INTO INVOICES (invoice_date, customer_name, payment_method, invoice_items_json, subtotal, gst_amount, grand_total)
+        VALUES (?, ?, ?, ?, ?, ?, ?);
+    """, make_row, count, batch_rows, "INVOICES", progress)
+
+
+def _generate_users(conn, rng, count, progress):
+    from services.auth_service import hash_password  # bcrypt is only needed when users are generated
+    password_hash = hash_password(SYNTHETIC_PASSWORD)  # One hash for everyone: bcrypt is deliberately slow
+    rows = [(f"synthetic_user_{n:06d}", password_hash, rng.choices(ROLES, weights=ROLE_WEIGHTS)[0]) for n in range(count)]
+    conn.executemany("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?);", rows)
+    conn.commit()
+    if progress:
+        progress("users", count, count)
+    return count
+
+
+def generate_synthetic_data(db_file, counts, seed=DEFAULT_SEED, batch_rows=SYNTHETIC_BATCH_ROWS, progress=None):
+    """
+    Fills db_file with reproducible, skewed data: Zipf-distributed drug popularity, suppliers and diagnoses,
+    recurring patients, a long tail of low-stock and expired lines, and multi-item invoices.
+    counts maps table name to the number of rows to add (see SCALE_PRESETS); the same seed and counts
+    always produce the same rows. Secondary indexes are dropped during the load and rebuilt at the end.
+    progress(label, rows_written, rows_total) is called after every batch. Returns {table: rows_added}.
+    """
+    from services.database_service import init_db
+    init_db(db_file)  # Tables, seed rows and migrations (including INVOICES and the indexes)
+
+    rng = random.Random(seed)
+    added = {}
+    tables = ["PHARMACY_INVENTORY", "DIAGNOSTIC_DATA", "INVOICES"]
+    with get_connection(db_file) as conn:
+        deferred = {table: drop_secondary_indexes(conn, table) for table in tables}
+        try:
+            added["PHARMACY_INVENTORY"] = _generate_inventory(conn, rng, counts.get("PHARMACY_INVENTORY", 0), batch_rows, progress)
+            drugs, drug_cw = _popular_drugs(conn, rng)
+            added["DIAGNOSTIC_DATA"] = _generate_diagnostics(conn, rng, counts.get("DIAGNOSTIC_DATA", 0), drugs, drug_cw, batch_rows, progress)
+            added["INVOICES"] = _generate_invoices(conn, rng, counts.get("INVOICES", 0), drugs, drug_cw, batch_rows, progress)
+            added["users"] = _generate_users(conn, rng, counts.get("users", 0), progress) if counts.get("users") else 0
+        finally:
+            for table in tables:
+                rebuild_indexes(conn, table, deferred[table])
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharmacy database for load testing and benchmarks.")
+    parser.add_argument("--db", required=True, help="Target SQLite file (use a scratch file, not data/pharmacy_db.db)")
+    parser.add_argument("--scale", choices=list(SCALE_PRESETS), default="10k", help="Row-count preset (default: 10k)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed (same seed, same data)")
+    parser.add_argument("--inventory", type=int, help="Override the number of PHARMACY_INVENTORY rows")
+    parser.add_argument("--diagnostics", type=int, help="Override the number of DIAGNOSTIC_DATA rows")
+    parser.add_argument("--invoices", type=int, help="Override the number of INVOICES rows")
+    parser.add_argument("--users", type=int, help="Override the number of users")
+    args = parser.parse_args(argv)
+
+    counts = dict(SCALE_PRESETS[args.scale])
+    for table, override in (("PHARMACY_INVENTORY", args.inventory), ("DIAGNOSTIC_DATA", args.diagnostics),
+                            ("INVOICES", args.invoices), ("users", args.users)):
+        if override is not None:
+            counts[table] = override
+
+    def report(label, written, total):
+        print(f"  {label}: {written:,} / {total:,}", flush=True)
+
+    start = time.perf_counter()
+    added = generate_synthetic_data(args.db, counts, seed=args.seed, progress=report)
+    print(f"Generated {sum(added.values()):,} rows in {time.perf_counter() - start:.1f}s into {args.db}: "
+          + ", ".join(f"{table} {rows:,}" for table, rows in added.items()))
+    print(f"Synthetic users log in with password '{SYNTHETIC_PASSWORD}'.")
+
+
+if __name__ == "__main__":
+    # Usage: python -m services.synthetic_data --db data/bench_1m.db --scale 1m
+    main()
@@ -0,0 +1,48 @@
+# utils/page_registry.py
+import importlib
+
+ALL_ROLES = ("Admin", "Pharmacist", "Doctor")
+
+# Landing page after login. Every role may open it, even where it has no sidebar button.
+DEFAULT_PAGE = "dashboard"
+
+# Sidebar order. Page modules are imported only when the page is first rendered, so heavy
+# dependencies (google.generativeai, pandas, PIL, fpdf) are not loaded at startup.
+PAGES = [
+    {"key": "dashboard", "label": "Dashboard", "module": "pages.dashboard_page", "function": "show_dashboard_page", "roles": ("Admin", "Doctor")},
+    {"key": "quick_drug_search", "label": "Quick Drug Search", "module": "pages.quick_drug_search_page", "function": "show_quick_drug_search_page", "roles": ("Admin", "Pharmacist")},
+    {"key": "add_drug", "label": "Add New Drug", "module": "pages.add_drug_page", "function": "show_add_drug_page", "roles": ("Admin", "Pharmacist")},
+    {"key": "inventory_insights", "label": "Inventory Insights", "module": "pages.inventory_insights_page", "function": "show_inventory_insights_page", "roles": ("Admin", "Pharmacist")},
+    {"key": "billing", "label": "Checkout / Billing", "module": "pages.billing_invoice_page", "function": "show_billing_page", "roles": ("Admin", "Pharmacist")},
+    {"key": "add_diagnostic_record", "label": "Add Diagnostic Record", "module": "pages.add_diagnostic_page", "function": "show_add_diagnostic_page", "roles": ("Admin", "Doctor")},
+    {"key": "patient_summary", "label": "Patient Summary", "module": "pages.patient_summary_page", "function": "show_patient_summary_page", "roles": ("Admin", "Doctor")},
+    {"key": "diagnostic_search", "label": "Diagnostic Notes Search", "module": "pages.diagnostic_search_page", "function": "show_diagnostic_search_page", "roles": ("Admin", "Doctor")},
+    {"key": "chatbot", "label": "AI Chatbot", "module": "pages.chatbot_page", "function": "show_chatbot_page", "roles": ("Admin", "Doctor")},
+    {"key": "image_analysis", "label": "Medical Image Analysis", "module": "pages.image_analysis_page", "function": "show_image_analysis_page", "roles": ("Admin", "Doctor")},
+    {"key": "custom_report", "label": "Custom Data Report", "module": "pages.custom_report_page", "function": "show_custom_report_page", "roles": ("Admin", "Doctor")},
+    {"key": "delete_record", "label": "Delete Record", "module": "pages.delete_record_page", "function": "show_delete_record_page", "roles": ("Admin", "Doctor")},
+    {"key": "bulk_import", "label": "Bulk Import", "module": "pages.bulk_import_page", "function": "show_bulk_import_page", "roles": ("Admin",)},
+    {"key": "natural_language_query", "label": "Natural Language Query", "module": "pages.natural_language_query_page", "function": "show_natural_language_query_page", "roles": ALL_ROLES},
+]
+
+PAGES_BY_KEY = {page["key"]: page for page in PAGES}
+
+
+def get_sidebar_pages(role):
+    """Returns the registry entries a role should see in the sidebar, in display order."""
+    return [page for page in PAGES if role in page["roles"]]
+
+
+def can_access_page(page_key, role):
+    """True if the page exists and the role is allowed to open it."""
+    page = PAGES_BY_KEY.get(page_key)
+    if page is None:
+        return False
+    return page_key == DEFAULT_PAGE or role in page["roles"]
+
+
+def load_page(page_key):
+    """Imports the page's module on first use and returns its render function."""
+    page = PAGES_BY_KEY[page_key]
+    module = importlib.import_module(page["module"])
+    return getattr(module, page["function"])
@@ -0,0 +1,56 @@
+# utils/query_guard_view.py
+import streamlit as st
+
+GUARD_ACTION_LABELS = {
+    "allow": "✅ Allowed",
+    "warn": "⚠️ Allowed with warnings",
+    "rewrite": "✏️ Rewritten",
+    "refuse": "⛔ Refused",
+}
+
+# Where the SQL came from (see services/sql_cache.get_sql_for_question); model answers need no note.
+# "intent" answers (services/intent_parser) are described by show_sql_source itself.
+SQL_SOURCE_LABELS = {
+    "cache": "⚡ SQL served from cache: this exact question was answered before.",
+    "template": "🧩 SQL filled in from a learned template: a similar question was answered before, "
+                "with this question's drugs, names, numbers and dates substituted.",
+}
+
+
+def show_guarded_sql(guard, title="Generated SQL Query:"):
+    """Shows the SQL to run next to its query plan and estimated cost, followed by the guard's findings."""
+    st.subheader(title)
+    sql_col, plan_col = st.columns([3, 2])
+    with sql_col:
+        st.code(guard["query"], language="sql")
+    with plan_col:
+        if guard["error"]:
+            st.caption(f"Query plan unavailable: {guard['error']}")
+        else:
+            st.caption(f"{GUARD_ACTION_LABELS[guard['action']]} · estimated cost ~{guard['estimated_cost']:,} rows visited")
+            st.code(guard["plan_text"] or "(no plan)", language="text")
+
+    for issue in guard["issues"]:
+        if issue["action"] == "refuse":
+            st.error(issue["message"])
+        elif issue["action"] == "rewrite":
+            st.info(f"{issue['message']} A LIMIT was added to the query.")
+        else:
+            st.warning(issue["message"])
+    if guard["action"] == "refuse":
+        st.error("This query was not run because it could slow the database down for everyone. "
+                 "Try narrowing it (filter by name, date or ID) and ask again.")
+
+
+def show_sql_source(source, intent=None):
+    """
+    Notes when the SQL above did not come from a Gemini round trip. For the local intent parser
+    (services/intent_parser.parse_intent) it shows the recognized command, bound values and name corrections.
+    """
+    if source == "intent" and intent:
+        st.caption(f"🎯 Answered by the local intent parser in {intent['elapsed_ms']:.2f} ms, no AI call: "
+                   f"{intent['description']}. Values bound to the ? placeholders: {list(intent['params'])}")
+        if intent["corrections"]:
+            st.caption("Names matched to the database: " + ", ".join(intent["corrections"]))
+    elif source in SQL_SOURCE_LABELS:
+        st.caption(SQL_SOURCE_LABELS[source])
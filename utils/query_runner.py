@@ -0,0 +1,46 @@
+# utils/query_runner.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+POLL_INTERVAL_S = 0.1
+_query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-query")
+
+
+def run_cancellable(state_key, func, *args, **kwargs):
+    """
+    Runs func(*args, cancel_event=<threading.Event>, **kwargs) on a worker thread while the page shows
+    the elapsed time and a Cancel button, and returns func's result.
+    func must not call Streamlit. Clicking Cancel makes Streamlit stop this script run at the next
+    UI update. The finally block then sets cancel_event, and the query's progress handler aborts it.
+    The next run reports the cancellation via show_cancelled_status(state_key).
+    """
+    cancel_event = threading.Event()
+    status = st.empty()
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹️ Cancel query", key=f"{state_key}_cancel_btn")
+    start = time.perf_counter()
+    future = _query_executor.submit(func, *args, cancel_event=cancel_event, **kwargs)
+    try:
+        while not future.done():
+            status.caption(f"⏳ Running query... {(time.perf_counter() - start) * 1000:,.0f} ms")
+            time.sleep(POLL_INTERVAL_S)
+    finally:
+        if not future.done():
+            # Cancel clicked (or the session went away): stop the statement instead of letting it run on
+            cancel_event.set()
+            st.session_state[f"{state_key}_cancelled_ms"] = (time.perf_counter() - start) * 1000
+    status.empty()
+    cancel_slot.empty()
+    return future.result()
+
+
+def show_cancelled_status(state_key):
+    """Reports a query cancelled with the Cancel button during the previous run. Returns True if there was one."""
+    cancelled_ms = st.session_state.pop(f"{state_key}_cancelled_ms", None)
+    if cancelled_ms is None:
+        return False
+    st.warning(f"Query cancelled after {cancelled_ms:,.0f} ms.")
+    return True
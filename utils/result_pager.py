@@ -0,0 +1,117 @@
+# utils/result_pager.py
+import streamlit as st
+from services.database_service import (
+    fetch_query_page, get_query_columns, detect_key_column, estimate_row_count, MAX_RESULT_ROWS
+)
+from utils.query_runner import run_cancellable
+
+RESULT_PAGE_SIZE = 100
+
+
+def build_paged_result(query, params=(), timeout_ms=None, cancel_event=None, analytics=False):
+    """
+    Runs the first page of a SELECT (with ? parameters bound from params) and returns (pager state, None),
+    or (None, error message). Touches only the database, so it can run on a worker thread (see utils.query_runner).
+    """
+    try:
+        columns = get_query_columns(query, params, analytics=analytics)
+    except Exception as e:
+        return None, f"Database Error: {e}"
+    key_column = detect_key_column(query, columns)
+
+    rows, columns, has_more = fetch_query_page(
+        query, params, page_size=RESULT_PAGE_SIZE, key_column=key_column, timeout_ms=timeout_ms, cancel_event=cancel_event,
+        analytics=analytics
+    )
+    if isinstance(rows, str):
+        return None, rows
+
+    if has_more:
+        row_estimate, estimate_exact = estimate_row_count(
+            query, params, timeout_ms=timeout_ms, cancel_event=cancel_event, analytics=analytics
+        )
+    else:
+        row_estimate, estimate_exact = len(rows), True
+    return {
+        "sql": query,
+        "params": tuple(params),
+        "columns": columns,
+        "rows": rows,
+        "key_column": key_column,
+        "has_more": has_more,
+        "row_estimate": row_estimate,
+        "estimate_exact": estimate_exact,
+        "timeout_ms": timeout_ms,
+        "analytics": analytics,
+    }, None
+
+
+def start_paged_result(state_key, query, params=(), timeout_ms=None, cancellable=False, analytics=False):
+    """
+    Runs the first page of a SELECT and keeps the pager state in st.session_state[state_key],
+    so "Load more" keeps working across reruns. timeout_ms and analytics also apply to every later page.
+    With cancellable, the query runs behind a Cancel button. Returns an error message, or None on success.
+    """
+    st.session_state[state_key] = None
+    if cancellable:
+        state, error_message = run_cancellable(
+            state_key, build_paged_result, query, params, timeout_ms=timeout_ms, analytics=analytics
+        )
+    else:
+        state, error_message = build_paged_result(query, params, timeout_ms=timeout_ms, analytics=analytics)
+    st.session_state[state_key] = state
+    return error_message
+
+
+def load_next_page(state_key):
+    """Appends the next page to the stored result, up to MAX_RESULT_ROWS rows in total."""
+    state = st.session_state.get(state_key)
+    if not state or not state["has_more"]:
+        return None
+
+    key_column = state["key_column"]
+    after_key = None
+    if key_column and state["rows"]:
+        after_key = state["rows"][-1][state["columns"].index(key_column)]
+    page_size = min(RESULT_PAGE_SIZE, MAX_RESULT_ROWS - len(state["rows"]))
+    rows, _, has_more = fetch_query_page(
+        state["sql"], state.get("params", ()), page_size=page_size, key_column=key_column, after_key=after_key, offset=len(state["rows"]),
+        timeout_ms=state.get("timeout_ms"), analytics=state.get("analytics", False)
+    )
+    if isinstance(rows, str):
+        return rows
+
+    state["rows"].extend(rows)
+    state["has_more"] = has_more and len(state["rows"]) < MAX_RESULT_ROWS
+    return None
+
+
+def render_paged_result(state_key):
+    """Shows the rows loaded so far, a total-row estimate and a "Load more" control."""
+    state = st.session_state.get(state_key)
+    if not state:
+        return
+
+    if not state["rows"]:
+        st.info("No results found for your query. Check the query and database content, or criteria.")
+        return
+
+    total = state["row_estimate"]
+    if total is None:
+        total_label = "unknown"
+    elif state["estimate_exact"]:
+        total_label = f"{total:,}"
+    else:
+        total_label = f"more than {total:,}"
+    st.caption(f"Showing {len(state['rows']):,} of {total_label} rows.")
+    st.dataframe([dict(zip(state["columns"], row)) for row in state["rows"]])
+
+    if state["has_more"]:
+        if st.button(f"Load {RESULT_PAGE_SIZE} more rows", key=f"{state_key}_load_more"):
+            error_message = load_next_page(state_key)
+            if error_message:
+                st.error(error_message)
+            else:
+                st.rerun()
+    elif len(state["rows"]) >= MAX_RESULT_ROWS:
+        st.warning(f"Showing the first {MAX_RESULT_ROWS:,} rows only. Refine the query to narrow the results.")